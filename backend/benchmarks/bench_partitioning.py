@@ -0,0 +1,164 @@
+"""
+Бенчмарк секционирования: лента с фильтром по магазину и по радиусу и корзина
+(позиции одного заказа) на обычной и секционированной схеме с одинаковыми данными.
+
+Режим схемы выбирается переменной DB_PARTITIONING при импорте моделей, поэтому каждая
+схема строится и замеряется отдельным процессом в своей схеме PostgreSQL (search_path).
+Нужна та же база, что и приложению (DB_HOST, DB_NAME, ...); таблицы в public не трогаются.
+
+Запуск из backend/: python benchmarks/bench_partitioning.py
+"""
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MERCHANTS = 20
+STOCKS_PER_MERCHANT = 5
+PRODUCTS = int(os.getenv("BENCH_PRODUCTS", "20000"))
+STOCKS_PER_PRODUCT = 8
+ORDERS = int(os.getenv("BENCH_ORDERS", "20000"))
+ITEMS_PER_ORDER = 5
+ORDER_MONTHS = 12
+REPEATS = 50
+SEED = 42
+
+LAYOUTS = {"plain": "0", "partitioned": "1"}
+
+
+def copy_rows(cursor, table: str, columns: tuple, rows):
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(str(value) for value in row) + "\n")
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+
+def load(engine):
+    rng = random.Random(SEED)
+    now = datetime(2026, 1, 1)
+    stock_ids = list(range(1, MERCHANTS * STOCKS_PER_MERCHANT + 1))
+
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        copy_rows(cursor, "merchants", ("id", "name", "email", "password"), (
+            (m, f"Магазин {m}", f"m{m}@bench", "-") for m in range(1, MERCHANTS + 1)
+        ))
+        copy_rows(cursor, "stocks", ("id", "address", "lat", "long", "merchant_id"), (
+            (s, f"Склад {s}", 55.55 + rng.random() * 0.4, 37.35 + rng.random() * 0.5, (s - 1) // STOCKS_PER_MERCHANT + 1)
+            for s in stock_ids
+        ))
+        copy_rows(cursor, "products", ("ean", "name", "category", "weight"), (
+            (4600000000000 + i, f"Товар {i}", f"Категория {i % 40}", 0.5) for i in range(PRODUCTS)
+        ))
+        copy_rows(cursor, "products_stock", ("product_ean", "stock_id", "price", "amount"), (
+            (4600000000000 + i, stock_id, round(rng.uniform(10, 2000), 2), rng.randint(0, 500))
+            for i in range(PRODUCTS)
+            for stock_id in rng.sample(stock_ids, STOCKS_PER_PRODUCT)
+        ))
+        copy_rows(cursor, "users", ("id", "username", "email", "password"), [(1, "bench", "u@bench", "-")])
+
+        created = [now - timedelta(days=rng.uniform(0, ORDER_MONTHS * 30)) for _ in range(ORDERS)]
+        copy_rows(cursor, "orders", ("id", "user_id", "created_at", "status"), (
+            (o + 1, 1, created[o].isoformat(), "confirmed") for o in range(ORDERS)
+        ))
+        sku_count = PRODUCTS * STOCKS_PER_PRODUCT
+        copy_rows(cursor, "order_items", ("order_id", "sku_id", "quantity", "order_created_at"), (
+            (o + 1, rng.randint(1, sku_count), rng.randint(1, 3), created[o].isoformat())
+            for o in range(ORDERS) for _ in range(ITEMS_PER_ORDER)
+        ))
+        cursor.execute("ANALYZE")
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def measure(fn) -> float:
+    fn()
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def run_layout(layout: str):
+    """Построить схему в bench_<layout>, заполнить и замерить; результат - JSON в stdout"""
+    from sqlalchemy import event, text
+    from src.database.core import engine, SessionLocal
+
+    schema = f"bench_{layout}"
+
+    @event.listens_for(engine, "connect")
+    def set_search_path(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"SET search_path TO {schema}")
+        cursor.close()
+
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+
+    from src.database.models import Base
+    from src.database.partitions import install_partitions
+    from src.database.changes import install_change_tracking
+    from src.database.repository import ProductFeedRepository, ItemRepository
+
+    Base.metadata.create_all(bind=engine)
+    install_partitions(engine, today=datetime(2026, 1, 1).date())
+    install_change_tracking(engine)
+    load(engine)
+
+    rng = random.Random(SEED)
+    results = {}
+    with SessionLocal() as session:
+        feed = ProductFeedRepository(session)
+        items = ItemRepository(session)
+
+        results["feed, 1 merchant"] = measure(
+            lambda: feed.get_products_feed(limit=20, merchant_ids=[rng.randint(1, MERCHANTS)], sort_by="price")
+        )
+        results["feed, 3 km radius"] = measure(
+            lambda: feed.get_products_feed(
+                limit=20, sort_by="distance", user_lat=55.75, user_long=37.6, max_distance_km=3
+            )
+        )
+        results["cart items"] = measure(lambda: items.get_order_items(rng.randint(1, ORDERS)))
+
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+
+    print(json.dumps(results))
+
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[1] == "--layout":
+        run_layout(sys.argv[2])
+        return
+
+    results = {}
+    for layout, flag in LAYOUTS.items():
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--layout", layout],
+            env={**os.environ, "DB_PARTITIONING": flag}, capture_output=True, text=True, check=True
+        ).stdout
+        results[layout] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"{PRODUCTS * STOCKS_PER_PRODUCT} SKU, {ORDERS * ITEMS_PER_ORDER} order lines, median of {REPEATS}")
+    print(f"{'query':<20} {'plain, ms':>10} {'partitioned, ms':>16} {'speedup':>9}")
+    for name, plain_ms in results["plain"].items():
+        partitioned_ms = results["partitioned"][name]
+        print(f"{name:<20} {plain_ms:>10.2f} {partitioned_ms:>16.2f} {plain_ms / partitioned_ms:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Бенчмарк ранжирования best_value: время на предложение должно оставаться
+примерно постоянным с ростом выдачи (линейная сложность).
+
+Запуск из backend/: python benchmarks/bench_ranking.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.product.ranking import OfferCandidates, score_offers, rank_products, top_products  # noqa: E402
+
+SIZES = (1_000, 10_000, 100_000, 1_000_000)
+OFFERS_PER_PRODUCT = 5
+PAGE_SIZE = 20
+REPEATS = 5
+
+
+def make_candidates(size: int, rng: np.random.Generator) -> OfferCandidates:
+    return OfferCandidates(
+        eans=rng.integers(0, max(size // OFFERS_PER_PRODUCT, 1), size),
+        sku_ids=np.arange(size, dtype=np.int64),
+        prices=rng.uniform(10, 10_000, size),
+        amounts=rng.integers(1, 100, size).astype(np.float64),
+        merchant_ids=rng.integers(1, 50, size),
+        distances=rng.uniform(0, 50, size)
+    )
+
+
+def rank_page(candidates: OfferCandidates):
+    scores = score_offers(candidates)
+    eans, product_scores = rank_products(candidates, scores)
+    return top_products(eans, product_scores, PAGE_SIZE)
+
+
+def main():
+    rng = np.random.default_rng(42)
+    print(f"{'offers':>10} {'ms':>10} {'ns/offer':>10}")
+
+    for size in SIZES:
+        candidates = make_candidates(size, rng)
+        timings = []
+        for _ in range(REPEATS):
+            started = time.perf_counter()
+            rank_page(candidates)
+            timings.append(time.perf_counter() - started)
+
+        best = min(timings)
+        print(f"{size:>10} {best * 1000:>10.2f} {best * 1e9 / size:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
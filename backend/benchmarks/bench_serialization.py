@@ -0,0 +1,104 @@
+"""
+Бенчмарк слоя ответов: прежний путь (валидация моделей при сборке, повторная
+валидация FastAPI по response_model, json из stdlib) против FastJSONResponse
+(доверенные словари, сразу в orjson; response_model только для документации).
+
+Запуск из backend/: python benchmarks/bench_serialization.py
+"""
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import TypeAdapter  # noqa: E402
+from src.orders.model import OrderResponse, OrderItemResponse  # noqa: E402
+from src.responses import dumps  # noqa: E402
+
+CART_SIZES = (10, 100, 1000)
+FEED_SIZES = (20, 100)
+OFFERS_PER_PRODUCT = 10
+REPEATS = 200
+
+order_adapter = TypeAdapter(OrderResponse)
+
+
+def stdlib_dumps(content) -> bytes:
+    # Так сериализует starlette.responses.JSONResponse
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def item_fields(i: int) -> dict:
+    return dict(
+        id=i, order_id=1, sku_id=i, quantity=2, product_name=f"Товар {i}",
+        price=99.9, merchant_name="Магазин", total_price=199.8
+    )
+
+
+def order_fields(items) -> dict:
+    return dict(
+        id=1, user_id=1, created_at=datetime(2025, 1, 1), delivery_method="courier",
+        address="ул. Тверская, 1", status="confirmed", items=items,
+        total_amount=199.8 * len(items), total_items=len(items)
+    )
+
+
+def order_old(size: int) -> bytes:
+    items = [OrderItemResponse(**item_fields(i)) for i in range(size)]
+    order = OrderResponse(**order_fields(items))
+    # FastAPI: проверка по response_model и jsonable-дамп, затем json.dumps
+    validated = order_adapter.validate_python(order, from_attributes=True)
+    return stdlib_dumps(order_adapter.dump_python(validated, mode="json"))
+
+
+def order_new(size: int) -> bytes:
+    items = [item_fields(i) for i in range(size)]
+    return dumps(order_fields(items))
+
+
+def feed_content(size: int) -> dict:
+    offer = {
+        "sku_id": 1, "price": 99.9, "amount": 10, "merchant_id": 1, "merchant_name": "Магазин",
+        "stock_id": 1, "stock_address": "ул. Тверская, 1", "stock_lat": 55.75, "stock_long": 37.61,
+        "distance_km": 1.25
+    }
+    products = [
+        {
+            "ean": 4600000000000 + i, "name": f"Товар {i}", "category": "Молочные продукты", "weight": 0.5,
+            "offers": [dict(offer, sku_id=j) for j in range(OFFERS_PER_PRODUCT)],
+            "best_offer": offer, "min_price": 99.9, "max_price": 99.9
+        }
+        for i in range(size)
+    ]
+    return {"status": "success", "message": "Лента товаров успешно получена",
+            "data": {"products": products, "total_count": size, "offset": 0, "limit": size}}
+
+
+def measure(fn, *args) -> float:
+    started = time.perf_counter()
+    for _ in range(REPEATS):
+        fn(*args)
+    return (time.perf_counter() - started) / REPEATS * 1e6
+
+
+def report(name: str, old_us: float, new_us: float):
+    print(f"{name:<20} {old_us:>10.1f} {new_us:>10.1f} {old_us / new_us:>8.1f}x")
+
+
+def main():
+    print(f"{'response':<20} {'old, us':>10} {'new, us':>10} {'speedup':>9}")
+
+    for size in CART_SIZES:
+        assert json.loads(order_old(size)) == json.loads(order_new(size))
+        report(f"order, {size} items", measure(order_old, size), measure(order_new, size))
+
+    for size in FEED_SIZES:
+        content = feed_content(size)
+        assert json.loads(stdlib_dumps(content)) == json.loads(dumps(content))
+        report(f"feed, {size} products", measure(stdlib_dumps, content), measure(dumps, content))
+
+
+if __name__ == "__main__":
+    main()
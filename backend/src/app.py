@@ -1,7 +1,13 @@
 from fastapi import FastAPI
 from .database.core import engine
 from .database.models import Base
+from .database.search import install_search_indexes
+from .database.summary import rebuild_offer_summary
+from .database.changes import install_change_tracking
+from .database.partitions import install_partitions
 from .routers import register_routers
+from .merchant_api.jobs import ingest_pool
+from .merchant_api.consumer import stock_consumer
 import uvicorn
 from .fill import populate_database
 from fastapi.middleware.cors import CORSMiddleware
@@ -22,10 +28,22 @@ app.add_middleware(
 )
 
 Base.metadata.create_all(bind=engine)
+install_partitions(engine)
+install_search_indexes(engine)
+install_change_tracking(engine)
 populate_database()
 
+with engine.begin() as conn:
+    rebuild_offer_summary(conn)
+
 register_routers(app)
 
+# Задачи загрузки, прерванные остановкой процесса, продолжаются с последнего checkpoint.
+# Пока populate_database пересоздает таблицы при каждом старте, продолжать нечего: вызов
+# нужен для запуска на сохраняемой базе
+ingest_pool.resume_pending()
+stock_consumer.start()
+
 if __name__ == '__main__':
     uvicorn.run(
         app,
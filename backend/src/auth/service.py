@@ -1,6 +1,7 @@
 from starlette.responses import JSONResponse
 from ..database.models import User
 from ..database.repository import UserRepository, MerchantRepository
+from ..cache.reference import reference_cache, MERCHANTS
 from .model import *
 from .utils import *
 from fastapi.exceptions import HTTPException
@@ -66,6 +67,7 @@ class AuthMerchantService:
 
         merchant_data.password = get_password_hash(merchant_data.password)
         merchant = self.merchant_repo.create(dict(merchant_data))
+        reference_cache.invalidate(MERCHANTS)
 
         token = create_access_token({"sub": str(merchant.id), "role": "merchant"})
 
@@ -0,0 +1,104 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..database.core import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Справочники (категории, магазины) меняются редко: свежие TTL секунд,
+# потом еще до MAX_STALE отдаются устаревшими, пока идет фоновое обновление
+REFERENCE_TTL = float(os.getenv("REFERENCE_CACHE_TTL", "300"))
+REFERENCE_MAX_STALE = float(os.getenv("REFERENCE_CACHE_MAX_STALE", "3600"))
+
+CATEGORIES = "categories"
+MERCHANTS = "merchants"
+
+
+class ReferenceCache:
+    """
+    Справочные списки в памяти процесса со stale-while-revalidate.
+    loader(session) получает сессию: запросная при синхронной загрузке,
+    собственная из SessionLocal при фоновом обновлении.
+    """
+
+    def __init__(self, ttl: float, max_stale: float, session_factory: Callable[[], Session] = SessionLocal):
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.session_factory = session_factory
+        self._entries: Dict[str, Tuple[Any, float]] = {}
+        self._refreshing = set()
+        self._generation: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.loads = 0
+
+    def get(self, name: str, session: Session, loader: Callable[[Session], Any]) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                value, loaded_at = entry
+                age = now - loaded_at
+                if age < self.ttl:
+                    self.hits += 1
+                    return value
+                if age < self.ttl + self.max_stale:
+                    self.stale_hits += 1
+                    if name not in self._refreshing:
+                        self._refreshing.add(name)
+                        threading.Thread(target=self._refresh, args=(name, loader), daemon=True).start()
+                    return value
+            generation = self._generation.get(name, 0)
+
+        value = loader(session)
+        self._store(name, value, generation)
+        return value
+
+    def invalidate(self, name: str):
+        """Сбросить список: следующий запрос загрузит его заново, фоновые загрузки старше сброса не сохранятся"""
+        with self._lock:
+            self._entries.pop(name, None)
+            self._generation[name] = self._generation.get(name, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            for name in list(self._entries):
+                self._generation[name] = self._generation.get(name, 0) + 1
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "loads": self.loads
+        }
+
+    def _store(self, name: str, value: Any, generation: int):
+        with self._lock:
+            self.loads += 1
+            if self._generation.get(name, 0) == generation:
+                self._entries[name] = (value, time.monotonic())
+
+    def _refresh(self, name: str, loader: Callable[[Session], Any]):
+        with self._lock:
+            generation = self._generation.get(name, 0)
+        try:
+            with self.session_factory() as session:
+                value = loader(session)
+            self._store(name, value, generation)
+        except Exception:
+            # Остается устаревшее значение, следующий запрос попробует снова
+            logger.exception("Ошибка фонового обновления справочника %s", name)
+        finally:
+            with self._lock:
+                self._refreshing.discard(name)
+
+
+reference_cache = ReferenceCache(REFERENCE_TTL, REFERENCE_MAX_STALE)
@@ -0,0 +1,220 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+import redis
+
+# L1 живет в памяти процесса, поэтому TTL короткий: другие процессы не видят наших инвалидаций
+L1_SIZE = int(os.getenv("CACHE_L1_SIZE", "2048"))
+L1_TTL = float(os.getenv("CACHE_L1_TTL", "5"))
+L2_TTL = int(os.getenv("CACHE_L2_TTL", "60"))
+REDIS_URL = os.getenv("REDIS_URL")
+
+KEY_PREFIX = "catalog:v1:"
+# Тег закэшированных total_count: любое изменение остатков снимает их все
+COUNTS_TAG = "counts"
+
+
+def ean_tag(ean: int) -> str:
+    return f"ean:{ean}"
+
+
+def merchant_tag(merchant_id: int) -> str:
+    return f"merchant:{merchant_id}"
+
+
+class LRUCache:
+    """LRU с TTL и тегами для точечной инвалидации"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[1] < time.monotonic():
+                if item is not None:
+                    self._delete(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key: str, value: bytes, tags: Iterable[str]):
+        tags = tuple(tags)
+        with self._lock:
+            self._delete(key)
+            self._data[key] = (value, time.monotonic() + self.ttl, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._data) > self.maxsize:
+                self._delete(next(iter(self._data)))
+                self.evictions += 1
+
+    def invalidate(self, tags: Iterable[str]) -> int:
+        removed = 0
+        with self._lock:
+            for tag in tags:
+                for key in self._tags.pop(tag, set()):
+                    if self._delete(key):
+                        removed += 1
+            self.evictions += removed
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def _delete(self, key: str) -> bool:
+        item = self._data.pop(key, None)
+        if item is None:
+            return False
+        for tag in item[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+        return True
+
+
+class RedisCache:
+    """L2 в Redis: хэш {body, tags} по ключу + множество ключей на каждый тег"""
+
+    def __init__(self, client: "redis.Redis", ttl: int):
+        self.client = client
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def get(self, key: str) -> Optional[Tuple[bytes, Tuple[str, ...]]]:
+        try:
+            item = self.client.hgetall(KEY_PREFIX + key)
+        except redis.RedisError:
+            self.errors += 1
+            return None
+
+        if not item:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        tags = item.get(b"tags", b"").decode()
+        return item[b"body"], tuple(tags.split(",")) if tags else ()
+
+    def set(self, key: str, value: bytes, tags: Iterable[str]):
+        tags = tuple(tags)
+        try:
+            pipe = self.client.pipeline()
+            pipe.hset(KEY_PREFIX + key, mapping={"body": value, "tags": ",".join(tags)})
+            pipe.expire(KEY_PREFIX + key, self.ttl)
+            for tag in tags:
+                pipe.sadd(KEY_PREFIX + "tag:" + tag, key)
+                pipe.expire(KEY_PREFIX + "tag:" + tag, self.ttl)
+            pipe.execute()
+        except redis.RedisError:
+            self.errors += 1
+
+    def invalidate(self, tags: Iterable[str]) -> int:
+        try:
+            tag_keys = [KEY_PREFIX + "tag:" + tag for tag in tags]
+            keys = set()
+            for tag_key in tag_keys:
+                keys.update(self.client.smembers(tag_key))
+            if keys:
+                self.client.delete(*(KEY_PREFIX + key.decode() for key in keys))
+            if tag_keys:
+                self.client.delete(*tag_keys)
+        except redis.RedisError:
+            self.errors += 1
+            return 0
+
+        self.evictions += len(keys)
+        return len(keys)
+
+
+class TieredCache:
+    """
+    Кэш ответов каталога: L1 (LRU в процессе) перед L2 (Redis, если задан REDIS_URL).
+    Записи помечаются тегами ean:<EAN> и merchant:<id>, запись в склад снимает только их.
+    """
+
+    def __init__(self, l1: LRUCache, l2: Optional[RedisCache] = None):
+        self.l1 = l1
+        self.l2 = l2
+
+    def get(self, key: str) -> Optional[bytes]:
+        value = self.l1.get(key)
+        if value is not None or self.l2 is None:
+            return value
+
+        item = self.l2.get(key)
+        if item is None:
+            return None
+
+        value, tags = item
+        self.l1.set(key, value, tags)
+        return value
+
+    def set(self, key: str, value: bytes, tags: Iterable[str]):
+        tags = tuple(tags)
+        self.l1.set(key, value, tags)
+        if self.l2 is not None:
+            self.l2.set(key, value, tags)
+
+    def invalidate(self, eans: Iterable[int] = (), merchant_ids: Iterable[int] = (), tags: Iterable[str] = ()):
+        tags = [ean_tag(ean) for ean in eans] + [merchant_tag(merchant_id) for merchant_id in merchant_ids] + list(tags)
+        if not tags:
+            return
+        self.l1.invalidate(tags)
+        if self.l2 is not None:
+            self.l2.invalidate(tags)
+
+    def clear(self):
+        self.l1.clear()
+
+    def stats(self) -> Dict:
+        stats = {
+            "l1": {
+                "size": len(self.l1),
+                "hits": self.l1.hits,
+                "misses": self.l1.misses,
+                "evictions": self.l1.evictions,
+            },
+            "l2": None,
+        }
+        if self.l2 is not None:
+            stats["l2"] = {
+                "hits": self.l2.hits,
+                "misses": self.l2.misses,
+                "evictions": self.l2.evictions,
+                "errors": self.l2.errors,
+            }
+        return stats
+
+
+def create_cache(redis_client: Optional["redis.Redis"] = None) -> TieredCache:
+    if redis_client is None and REDIS_URL:
+        redis_client = redis.Redis.from_url(REDIS_URL, socket_timeout=0.05)
+
+    l2 = RedisCache(redis_client, L2_TTL) if redis_client is not None else None
+    return TieredCache(LRUCache(L1_SIZE, L1_TTL), l2)
+
+
+catalog_cache = create_cache()
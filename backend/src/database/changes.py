@@ -0,0 +1,48 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+# Номер транзакции монотонен в отличие от nextval(): значение последовательности выдается
+# до commit, и строка с меньшим номером может стать видна позже уже выданного токена
+CHANGE_SEQ_FUNCTION = """
+CREATE OR REPLACE FUNCTION products_stock_touch() RETURNS trigger AS $$
+BEGIN
+    NEW.change_seq := pg_current_xact_id()::text::bigint;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def install_change_tracking(engine: Engine):
+    """
+    Триггер, проставляющий change_seq на каждую вставку и изменение products_stock.
+    Колонка и индексы добавляются и в уже созданную таблицу: create_all их не добавит.
+    """
+    with engine.begin() as conn:
+        conn.execute(text(
+            "ALTER TABLE products_stock ADD COLUMN IF NOT EXISTS change_seq bigint NOT NULL DEFAULT 0"
+        ))
+        conn.execute(text(
+            "ALTER TABLE products_stock ADD COLUMN IF NOT EXISTS queue_seq bigint NOT NULL DEFAULT 0"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_products_stock_stock_sku ON products_stock (stock_id, sku_id)"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_products_stock_stock_change "
+            "ON products_stock (stock_id, change_seq, sku_id)"
+        ))
+        conn.execute(text(CHANGE_SEQ_FUNCTION))
+        conn.execute(text(
+            "CREATE OR REPLACE TRIGGER products_stock_change_seq "
+            "BEFORE INSERT OR UPDATE ON products_stock "
+            "FOR EACH ROW EXECUTE FUNCTION products_stock_touch()"
+        ))
+
+
+def change_horizon(session) -> int:
+    """
+    Все транзакции с номером меньше возвращенного завершены к началу снимка:
+    изменения, не попавшие в текущую выгрузку, будут иметь change_seq не меньше него
+    """
+    return session.scalar(text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint"))
@@ -1,9 +1,15 @@
 from sqlalchemy.orm import declarative_base, relationship
-from sqlalchemy import Column, String, Integer, ForeignKey, Float, DateTime, BigInteger
+from sqlalchemy import Column, String, Integer, ForeignKey, Float, DateTime, BigInteger, Computed, Index, UniqueConstraint
+from sqlalchemy.dialects.postgresql import TSVECTOR, ARRAY, JSONB
 from datetime import datetime, UTC
+import os
 
 Base = declarative_base()
 
+# Секционированная схема: products_stock по складу (HASH), order_items по месяцу заказа (RANGE).
+# Выбирается при создании базы; секции создает database/partitions.py
+PARTITIONED = os.getenv("DB_PARTITIONING", "0") == "1"
+
 class User(Base):
     __tablename__ = 'users'
 
@@ -22,30 +28,69 @@ class Products(Base):
     name = Column(String)
     category = Column(String)
     weight = Column(Float)
-
+    search_vector = Column(
+        TSVECTOR,
+        Computed("to_tsvector('russian', coalesce(name, '') || ' ' || coalesce(category, ''))", persisted=True)
+    )
 
     stocks = relationship("ProductsStock", back_populates="product")
 
+    __table_args__ = (
+        Index('ix_products_search_vector', 'search_vector', postgresql_using='gin'),
+    )
+
 
 class ProductsStock(Base):
     __tablename__ = "products_stock"
 
     sku_id = Column(Integer, primary_key=True, autoincrement=True)
     product_ean = Column(BigInteger, ForeignKey("products.ean"))
-    stock_id = Column(Integer, ForeignKey("stocks.id"))
+    # Ключ секционирования обязан входить в первичный ключ секционированной таблицы
+    stock_id = Column(Integer, ForeignKey("stocks.id"), primary_key=PARTITIONED)
     price = Column(Float)
     amount = Column(Integer)
+    # Транзакция последнего изменения строки (xid8), выставляется триггером из database/changes.py
+    change_seq = Column(BigInteger, nullable=False, server_default='0')
+    # Номер последнего примененного сообщения очереди остатков: более старое сообщение строку не перепишет
+    queue_seq = Column(BigInteger, nullable=False, server_default='0')
 
     product = relationship("Products", back_populates="stocks")
     stock = relationship("Stocks", back_populates="products")
 
+    __table_args__ = (
+        # Одна строка на товар в складе: повторная отправка обновляет цену и остаток
+        UniqueConstraint('product_ean', 'stock_id', name='uq_products_stock_ean_stock'),
+        # Постраничная выгрузка склада и изменений с change token
+        Index('ix_products_stock_stock_sku', 'stock_id', 'sku_id'),
+        Index('ix_products_stock_stock_change', 'stock_id', 'change_seq', 'sku_id'),
+        {'postgresql_partition_by': 'HASH (stock_id)'} if PARTITIONED else {},
+    )
+    __mapper_args__ = {"primary_key": [sku_id]}
+
+
+class ProductOfferSummary(Base):
+    """Сводка предложений в наличии по товару, обновляется при записи в products_stock"""
+    __tablename__ = 'product_offer_summary'
+
+    ean = Column(BigInteger, ForeignKey('products.ean'), primary_key=True)
+    offer_count = Column(Integer)
+    min_price = Column(Float)
+    max_price = Column(Float)
+    cheapest_sku_id = Column(Integer)
+    merchant_ids = Column(ARRAY(Integer))
+    updated_at = Column(DateTime)
+
+    __table_args__ = (
+        Index('ix_product_offer_summary_min_price', 'min_price', 'ean'),
+    )
+
 
 class Orders(Base):
     __tablename__ = 'orders'
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('users.id'))
-    created_at = Column(DateTime, default=datetime.now(UTC))
+    created_at = Column(DateTime, default=lambda: datetime.now(UTC))
     delivery_method = Column(String)
     address = Column(String)
     status = Column(String, default="unconfirmed")
@@ -60,11 +105,20 @@ class OrderItem(Base):
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     order_id = Column(Integer, ForeignKey('orders.id'))
-    sku_id = Column(Integer, ForeignKey('products_stock.sku_id'))
+    # Внешний ключ на секционированную products_stock потребовал бы (sku_id, stock_id)
+    sku_id = Column(Integer) if PARTITIONED else Column(Integer, ForeignKey('products_stock.sku_id'))
     quantity = Column(Integer, default=1)
+    # Копия orders.created_at: по ней секционируется таблица и отсекаются секции в запросах по заказу
+    order_created_at = Column(DateTime, primary_key=PARTITIONED)
 
     order = relationship("Orders", back_populates="items")
-    product_stock = relationship("ProductsStock")
+    product_stock = relationship("ProductsStock", primaryjoin="foreign(OrderItem.sku_id) == ProductsStock.sku_id")
+
+    __table_args__ = (
+        Index('ix_order_items_order', 'order_id'),
+        {'postgresql_partition_by': 'RANGE (order_created_at)'} if PARTITIONED else {},
+    )
+    __mapper_args__ = {"primary_key": [id]}
 
 
 class Merchants(Base):
@@ -88,4 +142,39 @@ class Stocks(Base):
     merchant_id = Column(Integer, ForeignKey('merchants.id'))
 
     merchant = relationship("Merchants", back_populates="stocks")
-    products = relationship("ProductsStock", back_populates="stock")
\ No newline at end of file
+    products = relationship("ProductsStock", back_populates="stock")
+
+
+class IngestJob(Base):
+    """Фоновая загрузка файла остатков; checkpoint_offset - байт после последней зафиксированной пачки"""
+    __tablename__ = 'ingest_jobs'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    merchant_id = Column(Integer, ForeignKey('merchants.id'))
+    stock_id = Column(Integer, ForeignKey('stocks.id'))
+    file_path = Column(String)
+    file_format = Column(String)
+    file_size = Column(BigInteger)
+    status = Column(String, default="queued")
+    checkpoint_offset = Column(BigInteger, default=0)
+    checkpoint_line = Column(Integer, default=0)
+    rows_processed = Column(Integer, default=0)
+    inserted = Column(Integer, default=0)
+    updated = Column(Integer, default=0)
+    rejected = Column(Integer, default=0)
+    errors = Column(JSONB, default=list)
+    error = Column(String)
+    created_at = Column(DateTime)
+    started_at = Column(DateTime)
+    heartbeat_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+
+class MerchantSyncState(Base):
+    """Последняя примененная версия delta-синхронизации остатков мерчанта"""
+    __tablename__ = 'merchant_sync_state'
+
+    merchant_id = Column(Integer, ForeignKey('merchants.id'), primary_key=True)
+    version = Column(BigInteger, nullable=False)
+    updated_at = Column(DateTime)
+
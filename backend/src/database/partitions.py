@@ -0,0 +1,52 @@
+import os
+from datetime import date
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from .models import PARTITIONED
+
+# Число HASH-секций products_stock; меняется только пересозданием таблицы
+STOCK_PARTITIONS = int(os.getenv("DB_STOCK_PARTITIONS", "8"))
+# Месячные секции order_items создаются с запасом назад и вперед от текущего месяца
+ORDER_MONTHS_BACK = int(os.getenv("DB_ORDER_MONTHS_BACK", "12"))
+ORDER_MONTHS_AHEAD = int(os.getenv("DB_ORDER_MONTHS_AHEAD", "3"))
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def install_partitions(engine: Engine, today: date = None):
+    """
+    Создать недостающие секции в секционированной схеме. Вызывается при каждом старте:
+    так появляются секции order_items на ближайшие месяцы. Заказы вне диапазона
+    попадают в секцию по умолчанию.
+    В обычной схеме только заполняет order_created_at у строк, созданных до появления колонки.
+    """
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE order_items ADD COLUMN IF NOT EXISTS order_created_at timestamp"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_order_items_order ON order_items (order_id)"))
+
+        if not PARTITIONED:
+            conn.execute(text(
+                "UPDATE order_items i SET order_created_at = o.created_at "
+                "FROM orders o WHERE o.id = i.order_id AND i.order_created_at IS NULL"
+            ))
+            return
+
+        for remainder in range(STOCK_PARTITIONS):
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS products_stock_p{remainder} PARTITION OF products_stock "
+                f"FOR VALUES WITH (MODULUS {STOCK_PARTITIONS}, REMAINDER {remainder})"
+            ))
+
+        first = _add_months((today or date.today()).replace(day=1), -ORDER_MONTHS_BACK)
+        for offset in range(ORDER_MONTHS_BACK + ORDER_MONTHS_AHEAD + 1):
+            start = _add_months(first, offset)
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS order_items_{start:%Y_%m} PARTITION OF order_items "
+                f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{_add_months(start, 1):%Y-%m-%d}')"
+            ))
+        conn.execute(text("CREATE TABLE IF NOT EXISTS order_items_default PARTITION OF order_items DEFAULT"))
@@ -1,9 +1,31 @@
 from .models import *
+from .search import search_filter, search_rank
+from .summary import refresh_offer_summary
+from .changes import change_horizon
+from ..search.engine import search_engine
+from ..search.suggest import suggest_index
+from ..cache.tiered import catalog_cache, COUNTS_TAG
+from ..cache.reference import reference_cache, CATEGORIES
+from ..geo.stocks import stock_locations
+from ..product.ranking import OfferCandidates, score_offers, rank_products, top_products, sort_offers
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, or_, func, text, delete
-from sqlalchemy import and_, update
-import math
-from typing import List, Optional, Tuple, Dict
+from sqlalchemy import and_, or_, func, text, delete, select, true, tuple_, bindparam, cast, null, values, column, update
+from sqlalchemy import any_, literal
+from sqlalchemy import BigInteger as BigIntegerType, Float as FloatType, Integer as IntegerType
+from sqlalchemy.dialects.postgresql import aggregate_order_by, ARRAY, insert
+from typing import List, Optional, Tuple, Dict, Iterable
+import numpy as np
+import json
+import io
+
+# Ключ сортировки по расстоянию для товаров, у складов которых нет координат
+UNKNOWN_DISTANCE_KM = 1e9
+# Границы корзин гистограммы цен в фасетах ленты
+PRICE_BUCKETS = (100, 250, 500, 1000, 2500, 5000)
+# Строк каталога в одном INSERT ... ON CONFLICT при массовой загрузке
+CATALOG_CHUNK_ROWS = 2000
+# Сколько изменений delta-синхронизации уходит в один UPDATE ... FROM (VALUES ...)
+SYNC_BATCH_SIZE = 1000
 
 
 class Repository:
@@ -56,21 +78,365 @@ class ProductRepository(Repository):
         self.session.add(product)
         self.session.commit()
 
+        search_engine.add_product(product.ean, product.name, product.category)
+        suggest_index.add_product(product.ean, product.name, product.category)
+        reference_cache.invalidate(CATEGORIES)
+
         return product
 
+    def bulk_upsert_products(self, rows: List) -> Dict[int, str]:
+        """
+        Вставить или обновить товары каталога (line, ean, name, category, weight) пачками
+        INSERT ... ON CONFLICT одной транзакцией. EAN в rows должны быть уникальны.
+        Возвращает исход по EAN: inserted, updated или unchanged (строка в базе уже такая).
+        """
+        stmt = insert(Products)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Products.ean],
+            set_={"name": stmt.excluded.name, "category": stmt.excluded.category, "weight": stmt.excluded.weight},
+            where=tuple_(Products.name, Products.category, Products.weight).is_distinct_from(
+                tuple_(stmt.excluded.name, stmt.excluded.category, stmt.excluded.weight)
+            )
+        ).returning(Products.ean, text("(xmax = 0) AS inserted"))
+
+        # executemany через Core: SQLAlchemy склеивает параметры в многострочные INSERT по
+        # CATALOG_CHUNK_ROWS, а скомпилированный запрос берет из кэша вместо сборки VALUES на каждую пачку
+        connection = self.session.connection(execution_options={"insertmanyvalues_page_size": CATALOG_CHUNK_ROWS})
+        outcomes = {row.ean: "unchanged" for row in rows}
+        if rows:
+            upserted = connection.execute(stmt, [
+                {"ean": row.ean, "name": row.name, "category": row.category, "weight": row.weight}
+                for row in rows
+            ])
+            for ean, inserted in upserted:
+                outcomes[ean] = "inserted" if inserted else "updated"
+
+        self.session.commit()
+
+        changed = [row for row in rows if outcomes[row.ean] != "unchanged"]
+        for row in changed:
+            search_engine.add_product(row.ean, row.name, row.category)
+            # Подсказки дополняются только новыми товарами: переименованные обновятся при пересборке
+            if outcomes[row.ean] == "inserted":
+                suggest_index.add_product(row.ean, row.name, row.category)
+
+        if changed:
+            reference_cache.invalidate(CATEGORIES)
+            catalog_cache.invalidate(eans=[row.ean for row in changed if outcomes[row.ean] == "updated"])
+
+        return outcomes
+
     def add_to_stock(self, stock_id: int, product_data: dict) -> ProductsStock:
-        product_stock = ProductsStock(stock_id=stock_id, **product_data)
-        self.session.add(product_stock)
+        """Добавить товар на склад; если он там уже есть - обновить цену и остаток"""
+        stmt = (
+            insert(ProductsStock)
+            .values(stock_id=stock_id, **product_data)
+            .on_conflict_do_update(
+                constraint='uq_products_stock_ean_stock',
+                set_={'price': product_data['price'], 'amount': product_data['amount']}
+            )
+            .returning(ProductsStock)
+        )
+        product_stock = self.session.scalars(stmt, execution_options={"populate_existing": True}).one()
+        refresh_offer_summary(self.session, [product_stock.product_ean])
         self.session.commit()
 
+        self._invalidate_catalog([product_stock.product_ean], stock_id)
+
         return product_stock
 
     def update_product(self, sku_id: int, data: dict):
+        current = self.session.get(ProductsStock, sku_id)
+        eans = [current.product_ean] if current else []
+
         stmt = update(ProductsStock).values(**data).filter(ProductsStock.sku_id == sku_id)
 
+        if 'product_ean' in data:
+            eans.append(data['product_ean'])
+
         self.session.execute(stmt)
+        refresh_offer_summary(self.session, eans)
+        self.session.commit()
+
+        if current:
+            self._invalidate_catalog(eans, current.stock_id)
+
+    def bulk_upsert_stock(self, stock_id: int, rows: Iterable) -> Dict:
+        """
+        Загрузить строки остатков (line, product_ean, price, amount) в склад одной транзакцией:
+        COPY во временную таблицу, затем upsert по (product_ean, stock_id).
+        Неизвестные EAN и повторы EAN (кроме последнего) не загружаются, их номера строк возвращаются.
+        """
+        result = self.upsert_stock_rows(stock_id, rows)
+        self.session.commit()
+        self.invalidate_stock(stock_id, result["eans"])
+
+        return result
+
+    def upsert_stock_rows(self, stock_id: int, rows: Iterable) -> Dict:
+        """Upsert строк остатков через COPY без commit: вызывающий фиксирует транзакцию вместе со своими изменениями"""
+        unknown, duplicates = self._load_stock_staging(rows)
+
+        upserted = self._upsert_from_staging(stock_id, only_changed=False)
+
+        eans = [row.product_ean for row in upserted]
+        refresh_offer_summary(self.session, eans)
+        self.session.execute(text("DROP TABLE stock_staging"))
+
+        return {
+            "inserted": sum(1 for row in upserted if row.inserted),
+            "updated": sum(1 for row in upserted if not row.inserted),
+            "unknown_lines": unknown,
+            "duplicate_lines": duplicates,
+            "eans": eans
+        }
+
+    def upsert_queued_stock(self, stock_id: int, rows: List[Tuple[int, float, int, int]]) -> Dict:
+        """
+        Upsert строк (product_ean, price, amount, seq) из очереди без commit. Строка склада
+        меняется, только если seq новее примененного: повторно доставленное старое сообщение
+        не откатывает более позднее значение.
+        """
+        known = set(self.session.scalars(
+            select(Products.ean).where(Products.ean.in_([row[0] for row in rows]))
+        )) if rows else set()
+
+        stmt = insert(ProductsStock)
+        stmt = stmt.on_conflict_do_update(
+            constraint='uq_products_stock_ean_stock',
+            set_={'price': stmt.excluded.price, 'amount': stmt.excluded.amount, 'queue_seq': stmt.excluded.queue_seq},
+            where=ProductsStock.queue_seq < stmt.excluded.queue_seq
+        ).returning(ProductsStock.product_ean)
+
+        params = [
+            {"product_ean": ean, "stock_id": stock_id, "price": price, "amount": amount, "queue_seq": seq}
+            for ean, price, amount, seq in rows if ean in known
+        ]
+        eans = list(self.session.connection().execute(stmt, params).scalars()) if params else []
+        refresh_offer_summary(self.session, eans)
+
+        return {
+            "eans": eans,
+            "unknown": len(rows) - len(params),
+            "stale": len(params) - len(eans)
+        }
+
+    def replace_stock(self, stock_id: int, rows: Iterable) -> Dict:
+        """
+        Заменить содержимое склада снимком одной транзакцией: вставить новые позиции, обновить
+        изменившиеся и обнулить остаток тех, кого нет в снимке. Совпадающие строки не пишутся.
+        """
+        # Две замены одного склада выполняются по очереди, иначе их разницы перемешаются
+        self.session.execute(select(Stocks.id).where(Stocks.id == stock_id).with_for_update())
+        unknown, duplicates = self._load_stock_staging(rows)
+        snapshot_size = self.session.scalar(text(
+            "SELECT count(DISTINCT s.product_ean) FROM stock_staging s JOIN products p ON p.ean = s.product_ean"
+        ))
+        if not snapshot_size:
+            # Ни одного известного EAN: снимок обнулил бы весь склад
+            self.session.rollback()
+            raise ValueError("В снимке нет ни одного известного товара, склад не изменен")
+
+        upserted = self._upsert_from_staging(stock_id, only_changed=True)
+
+        zeroed = self.session.scalars(text(
+            "UPDATE products_stock ps SET amount = 0 "
+            "WHERE ps.stock_id = :stock_id AND ps.amount <> 0 "
+            "AND NOT EXISTS (SELECT 1 FROM stock_staging s WHERE s.product_ean = ps.product_ean) "
+            "RETURNING ps.product_ean"
+        ), {"stock_id": stock_id}).all()
+
+        eans = [row.product_ean for row in upserted] + list(zeroed)
+        refresh_offer_summary(self.session, eans)
+        self.session.execute(text("DROP TABLE stock_staging"))
+        self.session.commit()
+
+        self.invalidate_stock(stock_id, eans)
+
+        return {
+            "inserted": sum(1 for row in upserted if row.inserted),
+            "updated": sum(1 for row in upserted if not row.inserted),
+            "zeroed": len(zeroed),
+            "unchanged": snapshot_size - len(upserted),
+            "unknown_lines": unknown,
+            "duplicate_lines": duplicates
+        }
+
+    def _upsert_from_staging(self, stock_id: int, only_changed: bool) -> List:
+        """
+        Upsert последней строки каждого известного EAN из stock_staging в склад.
+        Вставка от обновления отличается по строкам склада до upsert: CTE existing читает
+        тот же снимок, что и INSERT. xmax для этого не годится - секционированная
+        products_stock не отдает системные колонки в RETURNING.
+        """
+        guard = (
+            "WHERE (products_stock.price, products_stock.amount) IS DISTINCT FROM (excluded.price, excluded.amount) "
+            if only_changed else ""
+        )
+        return self.session.execute(text(
+            "WITH existing AS ("
+            "  SELECT ps.product_ean FROM products_stock ps "
+            "  WHERE ps.stock_id = :stock_id AND ps.product_ean IN (SELECT product_ean FROM stock_staging)"
+            "), upserted AS ("
+            "  INSERT INTO products_stock (product_ean, stock_id, price, amount) "
+            "  SELECT DISTINCT ON (s.product_ean) s.product_ean, :stock_id, s.price, s.amount "
+            "  FROM stock_staging s JOIN products p ON p.ean = s.product_ean "
+            "  ORDER BY s.product_ean, s.line DESC "
+            "  ON CONFLICT ON CONSTRAINT uq_products_stock_ean_stock "
+            "  DO UPDATE SET price = excluded.price, amount = excluded.amount "
+            f"  {guard}"
+            "  RETURNING product_ean"
+            ") "
+            "SELECT u.product_ean, e.product_ean IS NULL AS inserted "
+            "FROM upserted u LEFT JOIN existing e ON e.product_ean = u.product_ean"
+        ), {"stock_id": stock_id}).all()
+
+    def _load_stock_staging(self, rows: Iterable) -> Tuple[List[int], List[int]]:
+        """
+        COPY строк (line, product_ean, price, amount) во временную stock_staging.
+        Возвращает номера строк с неизвестным EAN и строк, перекрытых более поздним повтором EAN.
+        """
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write(f"{row.line}\t{row.product_ean}\t{row.price!r}\t{row.amount}\n")
+        buffer.seek(0)
+
+        self.session.execute(text(
+            "CREATE TEMP TABLE IF NOT EXISTS stock_staging "
+            "(line integer, product_ean bigint, price double precision, amount integer) ON COMMIT DROP"
+        ))
+        cursor = self.session.connection().connection.dbapi_connection.cursor()
+        try:
+            cursor.copy_expert("COPY stock_staging (line, product_ean, price, amount) FROM STDIN", buffer)
+        finally:
+            cursor.close()
+
+        unknown = self.session.scalars(text(
+            "SELECT s.line FROM stock_staging s "
+            "WHERE NOT EXISTS (SELECT 1 FROM products p WHERE p.ean = s.product_ean) ORDER BY s.line"
+        )).all()
+        duplicates = self.session.scalars(text(
+            "SELECT line FROM ("
+            "  SELECT line, row_number() OVER (PARTITION BY product_ean ORDER BY line DESC) AS rn FROM stock_staging"
+            ") ranked WHERE rn > 1 ORDER BY line"
+        )).all()
+
+        return list(unknown), list(duplicates)
+
+    def invalidate_stock(self, stock_id: int, eans: List):
+        """Сбросить кэши каталога после зафиксированной записи в склад"""
+        if eans:
+            self._invalidate_catalog(eans, stock_id)
+
+    def _invalidate_catalog(self, eans: List, stock_id: int):
+        """
+        Снять из кэша каталога ответы с этими товарами, ленты с фильтром
+        по магазину склада и все закэшированные total_count
+        """
+        merchant_id = self.session.scalar(select(Stocks.merchant_id).where(Stocks.id == stock_id))
+        catalog_cache.invalidate(
+            eans=[int(ean) for ean in eans],
+            merchant_ids=[merchant_id] if merchant_id is not None else [],
+            tags=[COUNTS_TAG]
+        )
+
+    def get_merchant_stock_ids(self, merchant_id: int) -> List[int]:
+        return list(self.session.scalars(select(Stocks.id).where(Stocks.merchant_id == merchant_id)))
+
+    def sync_stock(self, merchant_id: int, version: int, changes: List[Tuple[int, int, float, int]]) -> Dict:
+        """
+        Применить delta-синхронизацию (product_ean, stock_id, price, amount) с версией version.
+        Версия сдвигается compare-and-set'ом в той же транзакции, что и UPDATE: повтор уже
+        примененной версии ничего не меняет, версия ниже текущей отклоняется.
+        """
+        stmt = insert(MerchantSyncState).values(merchant_id=merchant_id, version=version, updated_at=func.now())
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[MerchantSyncState.merchant_id],
+            set_={'version': stmt.excluded.version, 'updated_at': stmt.excluded.updated_at},
+            where=MerchantSyncState.version < stmt.excluded.version
+        ).returning(MerchantSyncState.version)
+
+        if self.session.scalar(stmt) is None:
+            current = self.session.scalar(
+                select(MerchantSyncState.version).where(MerchantSyncState.merchant_id == merchant_id)
+            )
+            self.session.rollback()
+            return {"status": "duplicate" if current == version else "stale", "version": current}
+
+        # Внутри одной версии последнее изменение ключа побеждает
+        latest = {}
+        for ean, stock_id, price, amount in changes:
+            latest[(ean, stock_id)] = (ean, stock_id, price, amount)
+        rows = list(latest.values())
+
+        applied = set()
+        for start in range(0, len(rows), SYNC_BATCH_SIZE):
+            batch = values(
+                column('ean', BigIntegerType), column('stock_id', IntegerType),
+                column('price', FloatType), column('amount', IntegerType),
+                name='v'
+            ).data(rows[start:start + SYNC_BATCH_SIZE])
+            updated = self.session.execute(
+                update(ProductsStock)
+                .values(price=batch.c.price, amount=batch.c.amount)
+                .where(ProductsStock.product_ean == batch.c.ean, ProductsStock.stock_id == batch.c.stock_id)
+                .returning(ProductsStock.product_ean, ProductsStock.stock_id)
+            )
+            applied.update((row.product_ean, row.stock_id) for row in updated)
+
+        refresh_offer_summary(self.session, list({ean for ean, _ in applied}))
         self.session.commit()
 
+        by_stock = {}
+        for ean, stock_id in applied:
+            by_stock.setdefault(stock_id, []).append(ean)
+        for stock_id, eans in by_stock.items():
+            self.invalidate_stock(stock_id, eans)
+
+        return {
+            "status": "applied",
+            "version": version,
+            "applied": len(applied),
+            "not_found": [
+                {"product_ean": ean, "stock_id": stock_id}
+                for ean, stock_id, _, _ in rows if (ean, stock_id) not in applied
+            ]
+        }
+
+    def get_stock_inventory(self, stock_id: int, limit: int, after: Optional[List] = None,
+                            since: Optional[int] = None) -> Tuple[List[Dict], Optional[List], int]:
+        """
+        Страница строк склада по ключу (sku_id), либо при since - изменений с change_seq >= since
+        по ключу (change_seq, sku_id). Горизонт изменений читается до страницы, поэтому все, что
+        в нее не попало, вернется в выгрузке изменений с этого горизонта.
+        """
+        horizon = change_horizon(self.session)
+
+        query = select(
+            ProductsStock.sku_id, ProductsStock.product_ean, ProductsStock.price,
+            ProductsStock.amount, ProductsStock.change_seq
+        ).where(ProductsStock.stock_id == stock_id)
+
+        if since is None:
+            if after is not None:
+                query = query.where(ProductsStock.sku_id > after[0])
+            query = query.order_by(ProductsStock.sku_id)
+        else:
+            query = query.where(ProductsStock.change_seq >= since)
+            if after is not None:
+                query = query.where(tuple_(ProductsStock.change_seq, ProductsStock.sku_id) > tuple_(*after))
+            query = query.order_by(ProductsStock.change_seq, ProductsStock.sku_id)
+
+        rows = self.session.execute(query.limit(limit + 1)).all()
+        items = [row._asdict() for row in rows[:limit]]
+
+        next_key = None
+        if len(rows) > limit:
+            last = items[-1]
+            next_key = [last["sku_id"]] if since is None else [last["change_seq"], last["sku_id"]]
+
+        return items, next_key, horizon
+
     def get_product_by_sku_id(self, sku_id: int):
         product = (
             self.session.query(ProductsStock)
@@ -80,6 +446,9 @@ class ProductRepository(Repository):
         )
         return product
 
+    def product_exists(self, ean: int) -> bool:
+        return self.session.get(Products, ean) is not None
+
     def get_products_by_skus(self, sku_ids: List[int]) -> List[ProductsStock]:
         """Получить информацию о товарах по списку SKU"""
         products = (
@@ -95,155 +464,554 @@ class ProductRepository(Repository):
         return products
 
 
-class ProductFeedRepository(Repository):
+class IngestJobRepository(Repository):
+    def create(self, job_data: dict) -> IngestJob:
+        job = IngestJob(**job_data, created_at=func.now())
+        self.session.add(job)
+        self.session.commit()
+
+        return job
+
+    def get(self, job_id: int) -> Optional[IngestJob]:
+        return self.session.get(IngestJob, job_id)
+
+    def claim(self, job_id: int, lease_seconds: int) -> Optional[IngestJob]:
+        """
+        Взять задачу в работу: новую или брошенную упавшим воркером (heartbeat старше lease).
+        Условный UPDATE не дает двум воркерам обрабатывать одну задачу.
+        """
+        stale = func.now() - func.make_interval(0, 0, 0, 0, 0, 0, lease_seconds)
+        claimed = self.session.scalar(
+            update(IngestJob)
+            .where(
+                IngestJob.id == job_id,
+                or_(
+                    IngestJob.status == 'queued',
+                    and_(IngestJob.status == 'running', IngestJob.heartbeat_at < stale)
+                )
+            )
+            .values(
+                status='running',
+                started_at=func.coalesce(IngestJob.started_at, func.now()),
+                heartbeat_at=func.now()
+            )
+            .returning(IngestJob.id)
+        )
+        self.session.commit()
 
-    def calculate_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-        """Рассчитать расстояние между двумя точками в км (формула Haversine)"""
-        R = 6371  # Радиус Земли в км
+        return self.get(claimed) if claimed is not None else None
 
-        dlat = math.radians(lat2 - lat1)
-        dlon = math.radians(lon2 - lon1)
+    def expired_failed_jobs(self, retention_seconds: int) -> List[IngestJob]:
+        """Упавшие задачи, файл которых хранится дольше retention_seconds"""
+        expired = func.now() - func.make_interval(0, 0, 0, 0, 0, 0, retention_seconds)
+        return list(self.session.scalars(
+            select(IngestJob)
+            .where(IngestJob.status == 'failed', IngestJob.file_path.isnot(None), IngestJob.finished_at < expired)
+        ))
 
-        a = (math.sin(dlat / 2) * math.sin(dlat / 2) +
-             math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
-             math.sin(dlon / 2) * math.sin(dlon / 2))
+    def resumable_job_ids(self, lease_seconds: int) -> List[int]:
+        stale = func.now() - func.make_interval(0, 0, 0, 0, 0, 0, lease_seconds)
+        return list(self.session.scalars(
+            select(IngestJob.id)
+            .where(or_(
+                IngestJob.status == 'queued',
+                and_(IngestJob.status == 'running', IngestJob.heartbeat_at < stale)
+            ))
+            .order_by(IngestJob.id)
+        ))
 
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-        distance = R * c
 
-        return distance
+class ProductFeedRepository(Repository):
 
-    def get_products_feed(
+    def attach_distances(
+            self,
+            offer_lists: List[List[Dict]],
+            user_lat: Optional[float],
+            user_long: Optional[float]
+    ):
+        """Проставить distance_km всем предложениям страницы одним векторным расчетом"""
+        offers = [offer for offer_list in offer_lists for offer in offer_list]
+
+        if not (user_lat and user_long):
+            for offer in offers:
+                offer['distance_km'] = None
+            return
+
+        distances = stock_locations.offer_distances(
+            self.session, user_lat, user_long, [offer['stock_id'] for offer in offers]
+        )
+        for offer, distance in zip(offers, distances):
+            offer['distance_km'] = distance
+
+    def _offers_query(
             self,
-            offset: int = 0,
-            limit: int = 20,
             search: Optional[str] = None,
             category: Optional[str] = None,
             merchant_ids: Optional[List[int]] = None,
-            sort_by: str = "price",
-            user_lat: Optional[float] = None,
-            user_long: Optional[float] = None
-    ) -> Tuple[List[Dict], int]:
+            eans: Optional[List[int]] = None,
+            stock_distances: Optional[Tuple[List[int], List[Optional[float]]]] = None
+    ):
+        """
+        Отфильтрованные предложения в наличии (одна строка на SKU).
+        stock_distances - расстояния до складов, посчитанные в NumPy; склады вне списка отсекаются.
+        """
+        if stock_distances is not None:
+            distances = func.unnest(
+                bindparam('distance_stock_ids', stock_distances[0], type_=ARRAY(Integer)),
+                bindparam('distance_km', stock_distances[1], type_=ARRAY(Float))
+            ).table_valued('stock_id', 'distance_km').render_derived(name='stock_distances')
+            distance_km = distances.c.distance_km
+        else:
+            distance_km = cast(null(), Float)
 
-        subquery = (
-            self.session.query(Products.ean)
-            .join(ProductsStock, Products.ean == ProductsStock.product_ean)
+        query = (
+            select(
+                ProductsStock.product_ean.label('ean'),
+                Products.category,
+                ProductsStock.sku_id,
+                ProductsStock.price,
+                ProductsStock.amount,
+                Stocks.merchant_id,
+                Merchants.name.label('merchant_name'),
+                ProductsStock.stock_id,
+                Stocks.address.label('stock_address'),
+                Stocks.lat.label('stock_lat'),
+                Stocks.long.label('stock_long'),
+                distance_km.label('distance_km')
+            )
+            .join(Products, Products.ean == ProductsStock.product_ean)
             .join(Stocks, ProductsStock.stock_id == Stocks.id)
+            .join(Merchants, Stocks.merchant_id == Merchants.id)
+            .where(ProductsStock.amount > 0)
         )
 
-        # Применяем фильтры
+        if stock_distances is not None:
+            query = query.join(distances, distances.c.stock_id == ProductsStock.stock_id)
+
         if search:
-            search_filter = or_(
-                Products.name.ilike(f"%{search}%"),
-                Products.category.ilike(f"%{search}%")
-            )
-            subquery = subquery.filter(search_filter)
+            query = query.where(search_filter(search))
 
         if category:
-            subquery = subquery.filter(Products.category.ilike(f"%{category}%"))
+            query = query.where(Products.category.ilike(f"%{category}%"))
 
+        # Склады списком констант, а не через join со stocks: по ним планировщик
+        # оставляет только нужные секции products_stock
         if merchant_ids:
-            subquery = subquery.filter(Stocks.merchant_id.in_(merchant_ids))
+            query = query.where(Stocks.merchant_id.in_(merchant_ids))
+            query = query.where(ProductsStock.stock_id.in_(self._merchant_stock_ids(merchant_ids)))
 
-        # Получаем уникальные EAN с пагинацией
-        unique_eans = subquery.distinct().offset(offset).limit(limit).all()
-        unique_eans = [ean[0] for ean in unique_eans]
+        if stock_distances is not None:
+            query = query.where(ProductsStock.stock_id.in_(stock_distances[0]))
 
-        # Получаем общее количество
-        total_count = subquery.distinct().count()
+        if eans is not None:
+            query = query.where(ProductsStock.product_ean == any_(literal(eans, ARRAY(BigIntegerType))))
 
-        if not unique_eans:
-            return [], total_count
+        return query
 
-        # Теперь получаем полные данные для этих EAN
-        query = (
-            self.session.query(Products)
-            .options(
-                joinedload(Products.stocks)
-                .joinedload(ProductsStock.stock)
-                .joinedload(Stocks.merchant)
+    def _merchant_stock_ids(self, merchant_ids: List[int]) -> List[int]:
+        return list(self.session.scalars(select(Stocks.id).where(Stocks.merchant_id.in_(merchant_ids))))
+
+    def get_products_feed(
+            self,
+            offset: int = 0,
+            limit: int = 20,
+            search: Optional[str] = None,
+            category: Optional[str] = None,
+            merchant_ids: Optional[List[int]] = None,
+            sort_by: str = "price",
+            user_lat: Optional[float] = None,
+            user_long: Optional[float] = None,
+            after: Optional[List] = None,
+            eans: Optional[List[int]] = None,
+            max_distance_km: Optional[float] = None,
+            count_mode: str = "exact"
+    ) -> Tuple[List[Dict], int, Optional[List]]:
+        """
+        Страница ленты одним SQL-запросом: товары, их предложения (json_agg),
+        min/max цена и общее количество товаров. Сортировка и LIMIT идут по
+        легкому агрегату (без json), предложения собираются только для страницы.
+
+        after - ключ сортировки последнего товара предыдущей страницы (keyset),
+        при нем offset не применяется. Третьим элементом возвращается ключ
+        для следующей страницы или None, если страница последняя.
+
+        eans - ограничить ленту этими товарами (результат поискового движка);
+        сортировка relevance тогда идет в порядке списка.
+
+        max_distance_km - оставить только склады в этом радиусе от пользователя;
+        дальние склады отсекаются пространственным индексом до выборки предложений.
+
+        sort_by=distance с координатами - товары по ближайшему предложению в наличии.
+
+        sort_by=best_value ранжируется по всей отфильтрованной выдаче (product.ranking),
+        ключ keyset - (скор, ean); SQL собирает только товары выбранной страницы.
+
+        count_mode: exact - точный count в том же запросе; cached - точный count
+        кэшируется по нормализованному фильтру до записи в остатки; estimate -
+        оценка планировщика (EXPLAIN), count не выполняется.
+        """
+        if eans is not None and not eans:
+            return [], 0, None
+
+        has_location = bool(user_lat and user_long)
+        stock_distances = None
+        if has_location:
+            stock_distances = stock_locations.stock_distances(self.session, user_lat, user_long, max_distance_km)
+            if not stock_distances[0]:
+                return [], 0, None
+
+        offer_scores = None
+        if sort_by == "best_value":
+            ranked = self._rank_best_value(
+                offset, limit, search, category, merchant_ids, eans, stock_distances, after
+            )
+            eans, offer_scores, ranked_total, ranked_next_key = ranked
+            if not eans:
+                return [], ranked_total, None
+            offset, after = 0, None
+            limit = len(eans)
+
+        offers = self._offers_query(search, category, merchant_ids, eans, stock_distances).cte('offers')
+
+        # Без фильтра по магазинам и расстояниям список и сортировка идут по сводке,
+        # products_stock читается только для предложений страницы
+        if not merchant_ids and stock_distances is None:
+            grouped = self._summary_query(search, category, eans).cte('grouped')
+        else:
+            grouped = (
+                select(
+                    offers.c.ean,
+                    func.min(offers.c.price).label('min_price'),
+                    func.max(offers.c.price).label('max_price'),
+                    func.min(offers.c.distance_km).label('min_distance')
+                )
+                .group_by(offers.c.ean)
+                .cte('grouped')
             )
-            .filter(Products.ean.in_(unique_eans))
-        )
 
-        # Сортируем результат
+        # Первичный ключ сортировки; по релевантности - по убыванию, через отрицание
+        ranked = None
         if sort_by == "price":
-            # Для сортировки по цене нам нужно присоединить ProductsStock
-            query = (
-                query.join(ProductsStock, Products.ean == ProductsStock.product_ean)
-                .order_by(ProductsStock.price.asc(), Products.ean)
+            sort_value = grouped.c.min_price
+        elif sort_by == "distance" and has_location:
+            sort_value = func.coalesce(grouped.c.min_distance, UNKNOWN_DISTANCE_KM)
+        elif sort_by in ("relevance", "best_value") and eans is not None:
+            # Позиция в списке через unnest WITH ORDINALITY: array_position на каждую строку
+            # квадратичен по числу найденных товаров
+            ranked = (
+                func.unnest(literal(eans, ARRAY(BigIntegerType)))
+                .table_valued('ean', with_ordinality='position')
+                .render_derived(name='ranked')
             )
-        elif sort_by == "name":
-            query = query.order_by(Products.name.asc())
+            sort_value = ranked.c.position
+        elif sort_by == "relevance":
+            sort_value = -search_rank(search)
+        else:
+            sort_value = Products.name
+
+        # ORDER BY ... LIMIT k по неиндексированному ключу Postgres выполняет
+        # ограниченной кучей (top-N heapsort), не сортируя все товары-кандидаты
+        page = (
+            select(
+                Products.ean,
+                Products.name,
+                Products.category,
+                Products.weight,
+                grouped.c.min_price,
+                grouped.c.max_price,
+                sort_value.label('sort_value')
+            )
+            .join(grouped, grouped.c.ean == Products.ean)
+            .order_by(sort_value.asc(), Products.ean.asc())
+        )
+        if ranked is not None:
+            page = page.join(ranked, ranked.c.ean == Products.ean)
+
+        if after is not None:
+            page = page.where(tuple_(sort_value, Products.ean) > tuple_(*after))
         else:
-            query = query.order_by(Products.name.asc())
+            page = page.offset(offset)
+
+        # Лишняя строка показывает, есть ли следующая страница
+        page = page.limit(limit + 1).subquery('page')
 
-        products = query.all()
+        if sort_by == "distance" and has_location:
+            offer_order = (offers.c.distance_km.asc().nulls_last(), offers.c.price.asc(), offers.c.sku_id.asc())
+        else:
+            offer_order = (offers.c.price.asc(), offers.c.sku_id.asc())
+
+        offer_json = func.json_build_object(
+            'sku_id', offers.c.sku_id,
+            'price', offers.c.price,
+            'amount', offers.c.amount,
+            'merchant_id', offers.c.merchant_id,
+            'merchant_name', offers.c.merchant_name,
+            'stock_id', offers.c.stock_id,
+            'stock_address', offers.c.stock_address,
+            'stock_lat', offers.c.stock_lat,
+            'stock_long', offers.c.stock_long,
+            'distance_km', offers.c.distance_km
+        )
+        page_offers = (
+            select(func.json_agg(aggregate_order_by(offer_json, *offer_order)))
+            .where(offers.c.ean == page.c.ean)
+            .scalar_subquery()
+        )
 
-        # Обрабатываем результаты
-        processed_products = []
-        for product in products:
-            product_data = self._process_product(
-                product, user_lat, user_long, sort_by
+        total = select(func.count().label('total_count')).select_from(grouped).subquery('total')
+
+        total_count = None
+        count_key = None
+        if count_mode == "cached":
+            count_key = self._count_cache_key(search, category, merchant_ids, eans, user_lat, user_long, max_distance_km)
+            cached = catalog_cache.get(count_key)
+            if cached is not None:
+                total_count = int(cached)
+
+        if count_mode == "exact" or (count_mode == "cached" and total_count is None):
+            # LEFT JOIN к однострочному total: количество приходит даже для пустой страницы
+            stmt = (
+                select(total.c.total_count, page, page_offers.label('offers'))
+                .select_from(total.outerjoin(page, true()))
+                .order_by(page.c.sort_value.asc(), page.c.ean.asc())
             )
-            if product_data:
-                processed_products.append(product_data)
+            rows = self.session.execute(stmt).mappings().all()
+            total_count = rows[0]['total_count'] if rows else 0
+            rows = [row for row in rows if row['ean'] is not None]
 
-        return processed_products, total_count
+            if count_key is not None:
+                catalog_cache.set(count_key, str(total_count).encode(), [COUNTS_TAG])
+        else:
+            stmt = (
+                select(page, page_offers.label('offers'))
+                .order_by(page.c.sort_value.asc(), page.c.ean.asc())
+            )
+            rows = self.session.execute(stmt).mappings().all()
 
+        if total_count is None:
+            # Оценка не должна быть меньше уже увиденного
+            total_count = max(self._estimate_rows(select(grouped.c.ean)), offset + len(rows))
 
-    def _process_product(
-            self,
-            product: Products,
+        next_key = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_key = [last['sort_value'], last['ean']]
+
+        products = [self._build_feed_item(row, offer_scores) for row in rows]
+
+        if offer_scores is not None:
+            # Количество и ключ следующей страницы уже посчитаны при ранжировании
+            return products, ranked_total, ranked_next_key
+
+        return products, total_count, next_key
+
+    @staticmethod
+    def _summary_query(
+            search: Optional[str] = None,
+            category: Optional[str] = None,
+            eans: Optional[List[int]] = None
+    ):
+        """Товары с предложениями в наличии и их min/max цены из product_offer_summary"""
+        query = (
+            select(
+                ProductOfferSummary.ean,
+                ProductOfferSummary.min_price,
+                ProductOfferSummary.max_price,
+                cast(null(), Float).label('min_distance')
+            )
+            .join(Products, Products.ean == ProductOfferSummary.ean)
+            .where(ProductOfferSummary.offer_count > 0)
+        )
+
+        if search:
+            query = query.where(search_filter(search))
+
+        if category:
+            query = query.where(Products.category.ilike(f"%{category}%"))
+
+        if eans is not None:
+            query = query.where(ProductOfferSummary.ean == any_(literal(eans, ARRAY(BigIntegerType))))
+
+        return query
+
+    @staticmethod
+    def _count_cache_key(
+            search: Optional[str],
+            category: Optional[str],
+            merchant_ids: Optional[List[int]],
+            eans: Optional[List[int]],
             user_lat: Optional[float],
             user_long: Optional[float],
-            sort_by: str
-    ) -> Optional[Dict]:
-        """Обработать продукт и его предложения"""
-
-        offers = []
-        for stock in product.stocks:
-            if stock.amount > 0:  # Только товары в наличии
-                offer = {
-                    'sku_id': stock.sku_id,
-                    'price': stock.price,
-                    'amount': stock.amount,
-                    'merchant_id': stock.stock.merchant.id,
-                    'merchant_name': stock.stock.merchant.name,
-                    'stock_id': stock.stock_id,
-                    'stock_lat': stock.stock.lat,
-                    'stock_long': stock.stock.long,
-                    'distance_km': None
-                }
-
-                # Рассчитываем расстояние если есть координаты пользователя
-                if user_lat and user_long:
-                    distance = self.calculate_distance(
-                        user_lat, user_long,
-                        stock.stock.lat, stock.stock.long
-                    )
-                    offer['distance_km'] = round(distance, 2)
-
-                offers.append(offer)
+            max_distance_km: Optional[float]
+    ) -> str:
+        """Ключ total_count: только то, что влияет на набор товаров. Координаты важны лишь вместе с радиусом"""
+        params = {
+            "search": search.strip().lower() if search else None,
+            "category": category.strip().lower() if category else None,
+            "merchant_ids": sorted(set(merchant_ids)) if merchant_ids else None,
+            "eans": sorted(set(eans)) if eans is not None else None
+        }
+        if max_distance_km is not None and user_lat and user_long:
+            params["location"] = [user_lat, user_long, max_distance_km]
+        return "count:" + json.dumps(params, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+
+    def _estimate_rows(self, stmt) -> int:
+        """Оценка количества строк запроса планировщиком Postgres без его выполнения"""
+        compiled = stmt.compile(dialect=self.session.bind.dialect, compile_kwargs={"render_postcompile": True})
+        plan = self.session.connection().exec_driver_sql(
+            "EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params
+        ).scalar()
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    def _rank_best_value(
+            self,
+            offset: int,
+            limit: int,
+            search: Optional[str],
+            category: Optional[str],
+            merchant_ids: Optional[List[int]],
+            eans: Optional[List[int]],
+            stock_distances: Optional[Tuple[List[int], List[Optional[float]]]],
+            after: Optional[List]
+    ) -> Tuple[List[int], Dict[int, float], int, Optional[List]]:
+        """
+        Ранжировать best_value по всем отфильтрованным предложениям: легкие столбцы
+        без json, нормализация и скоры в NumPy, отбор страницы без полной сортировки.
+        Возвращает EAN страницы по порядку, скоры их предложений, общее количество и ключ следующей страницы.
+        """
+        offers = self._offers_query(search, category, merchant_ids, eans, stock_distances).subquery('offers')
+        rows = self.session.execute(
+            select(
+                offers.c.ean,
+                offers.c.sku_id,
+                offers.c.price,
+                offers.c.amount,
+                offers.c.merchant_id,
+                offers.c.distance_km
+            )
+        ).all()
 
-        if not offers:
-            return None
+        candidates = OfferCandidates.from_rows(
+            [(ean, sku_id, price, amount, merchant_id, float('nan') if distance is None else distance)
+             for ean, sku_id, price, amount, merchant_id, distance in rows]
+        )
+        scores = score_offers(candidates)
+        product_eans, product_scores = rank_products(candidates, scores)
+
+        page_eans, page_scores = top_products(product_eans, product_scores, limit + 1, offset, after)
+
+        next_key = None
+        if len(page_eans) > limit:
+            page_eans, page_scores = page_eans[:limit], page_scores[:limit]
+            next_key = [page_scores[-1], page_eans[-1]]
+
+        on_page = np.isin(candidates.eans, page_eans)
+        offer_scores = dict(zip(candidates.sku_ids[on_page].tolist(), scores[on_page].tolist()))
 
-        # Сортируем предложения внутри товара
-        sorted_offers = self._sort_product_offers(offers, sort_by, user_lat, user_long)
+        return page_eans, offer_scores, len(product_eans), next_key
 
-        # Лучшее предложение - первое в отсортированном списке
-        best_offer = sorted_offers[0] if sorted_offers else None
+    def get_feed_facets(
+            self,
+            search: Optional[str] = None,
+            category: Optional[str] = None,
+            merchant_ids: Optional[List[int]] = None,
+            user_lat: Optional[float] = None,
+            user_long: Optional[float] = None,
+            eans: Optional[List[int]] = None,
+            max_distance_km: Optional[float] = None
+    ) -> Dict:
+        """
+        Фасеты ленты для тех же фильтров: количество товаров по категориям,
+        магазинам и корзинам цен. Один проход агрегата с GROUPING SETS.
+        """
+        facets = {'categories': [], 'merchants': [], 'price_buckets': []}
+
+        if eans is not None and not eans:
+            return facets
+
+        stock_distances = None
+        if user_lat and user_long:
+            stock_distances = stock_locations.stock_distances(self.session, user_lat, user_long, max_distance_km)
+            if not stock_distances[0]:
+                return facets
+
+        offers = self._offers_query(search, category, merchant_ids, eans, stock_distances).subquery('offers')
+        rows = (
+            select(
+                offers.c.ean,
+                offers.c.category,
+                offers.c.merchant_id,
+                offers.c.merchant_name,
+                func.width_bucket(
+                    offers.c.price, bindparam('price_buckets', list(PRICE_BUCKETS), type_=ARRAY(Float))
+                ).label('price_bucket')
+            )
+            .subquery('facet_rows')
+        )
+
+        # grouping() - битовая маска свернутых столбцов, по ней понятно, к какому набору относится строка
+        facet = func.grouping(rows.c.category, rows.c.merchant_id, rows.c.price_bucket)
+        stmt = (
+            select(
+                facet.label('facet'),
+                rows.c.category,
+                rows.c.merchant_id,
+                rows.c.merchant_name,
+                rows.c.price_bucket,
+                func.count(rows.c.ean.distinct()).label('count')
+            )
+            .group_by(func.grouping_sets(
+                tuple_(rows.c.category),
+                tuple_(rows.c.merchant_id, rows.c.merchant_name),
+                tuple_(rows.c.price_bucket)
+            ))
+        )
+
+        for row in self.session.execute(stmt).mappings():
+            if row['facet'] == 0b011:
+                facets['categories'].append({'category': row['category'], 'count': row['count']})
+            elif row['facet'] == 0b101:
+                facets['merchants'].append({
+                    'merchant_id': row['merchant_id'],
+                    'merchant_name': row['merchant_name'],
+                    'count': row['count']
+                })
+            elif row['price_bucket'] is not None:
+                # Предложения без цены в гистограмму цен не попадают
+                bucket = row['price_bucket']
+                facets['price_buckets'].append({
+                    'min_price': PRICE_BUCKETS[bucket - 1] if bucket > 0 else None,
+                    'max_price': PRICE_BUCKETS[bucket] if bucket < len(PRICE_BUCKETS) else None,
+                    'count': row['count']
+                })
+
+        facets['categories'].sort(key=lambda item: (-item['count'], item['category'] or ''))
+        facets['merchants'].sort(key=lambda item: (-item['count'], item['merchant_id']))
+        facets['price_buckets'].sort(key=lambda item: item['min_price'] or 0)
+
+        return facets
+
+    def _build_feed_item(self, row, offer_scores: Optional[Dict[int, float]] = None) -> Dict:
+        """
+        Собрать товар ленты из строки агрегата. Предложения уже отсортированы в SQL
+        по цене или расстоянию; для best_value - по скорам ранжирования.
+        """
+
+        offers = row['offers']
+
+        if offer_scores is not None:
+            offers = sorted(offers, key=lambda offer: (offer_scores[offer['sku_id']], offer['sku_id']))
 
         return {
-            'ean': product.ean,
-            'name': product.name,
-            'category': product.category,
-            'weight': product.weight,
-            'offers': sorted_offers,
-            'best_offer': best_offer,
-            'min_price': min(offer['price'] for offer in offers),
-            'max_price': max(offer['price'] for offer in offers)
+            'ean': row['ean'],
+            'name': row['name'],
+            'category': row['category'],
+            'weight': row['weight'],
+            'offers': offers,
+            'best_offer': offers[0] if offers else None,
+            'min_price': row['min_price'],
+            'max_price': row['max_price']
         }
 
     def _sort_product_offers(
@@ -270,34 +1038,8 @@ class ProductFeedRepository(Repository):
                 return sorted(offers, key=lambda x: x['price'])
 
         elif sort_by == "best_value":
-            # Лучшее соотношение цены и расстояния для одного товара
-            if user_lat and user_long:
-                offers_with_distance = [o for o in offers if o['distance_km'] is not None]
-                if offers_with_distance:
-                    # Взвешенная оценка - 70% цена 30% расстояние
-                    def value_score(offer):
-                        # Нормализация
-                        prices = [o['price'] for o in offers_with_distance]
-                        distances = [o['distance_km'] for o in offers_with_distance]
-
-                        max_price = max(prices)
-                        max_distance = max(distances)
-
-                        # Избегаем деления на ноль
-                        if max_price == 0:
-                            price_norm = 0
-                        else:
-                            price_norm = offer['price'] / max_price
-
-                        if max_distance == 0:
-                            distance_norm = 0
-                        else:
-                            distance_norm = offer['distance_km'] / max_distance
-
-                        return 0.7 * price_norm + 0.3 * distance_norm
-
-                    return sorted(offers_with_distance, key=value_score)
-
+            # Взвешенная оценка (по умолчанию 70% цена, 30% расстояние) с одной нормализацией на набор
+            return sort_offers(offers)
 
         return sorted(offers, key=lambda x: x['price'])
 
@@ -311,10 +1053,9 @@ class ProductFeedRepository(Repository):
         return [cat[0] for cat in categories if cat[0]]
 
     def get_merchants(self) -> List[Dict]:
-        merchants = (
-            self.session.query(Merchants)
-            .all()
-        )
+        merchants = self.session.execute(
+            select(Merchants.id, Merchants.name).order_by(Merchants.id)
+        ).all()
         return [
             {
                 'id': merchant.id,
@@ -323,6 +1064,88 @@ class ProductFeedRepository(Repository):
             for merchant in merchants
         ]
 
+    def iter_catalog(self, category: Optional[str] = None, batch_size: int = 1000):
+        """
+        Все товары с предложениями (LEFT JOIN: товар без предложений - одна строка с пустым SKU)
+        в порядке ean, sku_id. Строки читаются серверным курсором пачками по batch_size,
+        память не зависит от размера каталога.
+        """
+        stmt = (
+            select(
+                Products.ean,
+                Products.name,
+                Products.category,
+                Products.weight,
+                ProductsStock.sku_id,
+                ProductsStock.price,
+                ProductsStock.amount,
+                Stocks.merchant_id,
+                Merchants.name.label('merchant_name'),
+                ProductsStock.stock_id,
+                Stocks.address.label('stock_address'),
+                Stocks.lat.label('stock_lat'),
+                Stocks.long.label('stock_long')
+            )
+            .outerjoin(ProductsStock, ProductsStock.product_ean == Products.ean)
+            .outerjoin(Stocks, ProductsStock.stock_id == Stocks.id)
+            .outerjoin(Merchants, Stocks.merchant_id == Merchants.id)
+            .order_by(Products.ean, ProductsStock.sku_id)
+            .execution_options(stream_results=True, yield_per=batch_size)
+        )
+
+        if category:
+            stmt = stmt.where(Products.category.ilike(f"%{category}%"))
+
+        yield from self.session.execute(stmt).mappings()
+
+    def get_products_with_offers(self, eans: List[int]) -> Dict[int, Dict]:
+        """
+        Товары и их предложения в наличии одним запросом (LEFT JOIN).
+        Ключ - EAN; товаров, которых нет в каталоге, в ответе нет.
+        """
+        rows = self.session.execute(
+            select(
+                Products.ean,
+                Products.name,
+                Products.category,
+                ProductsStock.sku_id,
+                ProductsStock.price,
+                ProductsStock.amount,
+                Stocks.merchant_id,
+                Merchants.name.label('merchant_name'),
+                ProductsStock.stock_id,
+                Stocks.address.label('stock_address'),
+                Stocks.lat.label('stock_lat'),
+                Stocks.long.label('stock_long')
+            )
+            .select_from(Products)
+            .outerjoin(ProductsStock, and_(ProductsStock.product_ean == Products.ean, ProductsStock.amount > 0))
+            .outerjoin(Stocks, ProductsStock.stock_id == Stocks.id)
+            .outerjoin(Merchants, Stocks.merchant_id == Merchants.id)
+            .where(Products.ean.in_(eans))
+        ).mappings()
+
+        products = {}
+        for row in rows:
+            product = products.setdefault(row['ean'], {
+                'product': {'ean': row['ean'], 'name': row['name'], 'category': row['category']},
+                'offers': []
+            })
+            if row['sku_id'] is not None:
+                product['offers'].append({
+                    'sku_id': row['sku_id'],
+                    'price': row['price'],
+                    'amount': row['amount'],
+                    'merchant_id': row['merchant_id'],
+                    'merchant_name': row['merchant_name'],
+                    'stock_id': row['stock_id'],
+                    'stock_address': row['stock_address'],
+                    'stock_lat': row['stock_lat'],
+                    'stock_long': row['stock_long']
+                })
+
+        return products
+
     def get_product_with_offers(self, ean: int) -> Optional[Products]:
         product = (
             self.session.query(Products)
@@ -343,7 +1166,8 @@ class ItemRepository(Repository):
             item = OrderItem(
                 order_id=order_id,
                 sku_id=sku_id,
-                quantity=quantity
+                quantity=quantity,
+                order_created_at=self._order_created_at(order_id)
             )
             self.session.add(item)
             self.session.commit()
@@ -386,7 +1210,7 @@ class ItemRepository(Repository):
                 .joinedload(ProductsStock.stock)
                 .joinedload(Stocks.merchant)
             )
-            .filter(OrderItem.order_id == order_id)
+            .filter(OrderItem.order_id == order_id, OrderItem.order_created_at == self._order_created_at(order_id))
             .all()
         )
         return items
@@ -404,7 +1228,10 @@ class ItemRepository(Repository):
 
     def clear_order_items(self, order_id: int) -> bool:
         try:
-            stmt = delete(OrderItem).where(OrderItem.order_id == order_id)
+            stmt = delete(OrderItem).where(
+                OrderItem.order_id == order_id,
+                OrderItem.order_created_at == self._order_created_at(order_id)
+            )
             result = self.session.execute(stmt)
             self.session.commit()
 
@@ -417,11 +1244,23 @@ class ItemRepository(Repository):
     def get_items_by_sku(self, order_id: int, sku_id: int) -> List[OrderItem]:
         items = (
             self.session.query(OrderItem)
-            .filter(OrderItem.order_id == order_id, OrderItem.sku_id == sku_id)
+            .filter(
+                OrderItem.order_id == order_id,
+                OrderItem.sku_id == sku_id,
+                OrderItem.order_created_at == self._order_created_at(order_id)
+            )
             .all()
         )
         return items
 
+    @staticmethod
+    def _order_created_at(order_id: int):
+        """
+        Дата создания заказа подзапросом: в секционированной схеме ее значение известно
+        до чтения order_items, и PostgreSQL читает только секцию месяца заказа
+        """
+        return select(Orders.created_at).where(Orders.id == order_id).scalar_subquery()
+
 
 class OrderRepository(Repository):
     def create_cart(self, user_id: int) -> Orders:
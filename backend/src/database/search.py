@@ -0,0 +1,65 @@
+import logging
+from typing import Optional
+from sqlalchemy import text, func, literal, or_
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from .models import Products
+
+logger = logging.getLogger(__name__)
+
+TS_CONFIG = 'russian'
+
+# Выставляется install_search_indexes: есть ли в базе расширение pg_trgm
+trgm_enabled = False
+
+
+def install_search_indexes(engine: Engine) -> bool:
+    """
+    Подключить pg_trgm и построить триграммные GIN-индексы для подстрочного поиска.
+    Если расширение недоступно, поиск работает только по tsvector.
+    """
+    global trgm_enabled
+
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_products_name_trgm "
+                "ON products USING gin (name gin_trgm_ops)"
+            ))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_products_category_trgm "
+                "ON products USING gin (category gin_trgm_ops)"
+            ))
+        trgm_enabled = True
+    except SQLAlchemyError:
+        logger.warning("pg_trgm недоступен, подстрочный поиск работает без триграммного индекса")
+        trgm_enabled = False
+
+    return trgm_enabled
+
+
+def search_filter(search: str):
+    """Условие поиска: полнотекстовое совпадение или подстрока в названии/категории"""
+    query = func.websearch_to_tsquery(TS_CONFIG, search)
+    pattern = f"%{search}%"
+
+    return or_(
+        Products.search_vector.op('@@')(query),
+        Products.name.ilike(pattern),
+        Products.category.ilike(pattern)
+    )
+
+
+def search_rank(search: Optional[str]):
+    """Релевантность товара запросу: ранг tsvector плюс триграммная схожесть названия"""
+    if not search:
+        return literal(0.0)
+
+    query = func.websearch_to_tsquery(TS_CONFIG, search)
+    rank = func.ts_rank_cd(Products.search_vector, query)
+
+    if trgm_enabled:
+        rank = rank + func.word_similarity(search, Products.name)
+
+    return rank
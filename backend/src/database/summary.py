@@ -0,0 +1,82 @@
+from typing import Iterable, Optional
+from sqlalchemy import select, delete, func, text, Integer
+from sqlalchemy.dialects.postgresql import insert, aggregate_order_by, ARRAY
+from .models import ProductsStock, Stocks, ProductOfferSummary
+
+
+def _summary_rows(eans: Optional[list]):
+    """Сводка по предложениям в наличии, сгруппированная по EAN"""
+    cheapest = func.array_agg(
+        aggregate_order_by(ProductsStock.sku_id, ProductsStock.price.asc(), ProductsStock.sku_id.asc()),
+        type_=ARRAY(Integer)
+    )[1]
+
+    query = (
+        select(
+            ProductsStock.product_ean,
+            func.count(),
+            func.min(ProductsStock.price),
+            func.max(ProductsStock.price),
+            cheapest,
+            func.array_agg(Stocks.merchant_id.distinct()),
+            func.now()
+        )
+        .join(Stocks, ProductsStock.stock_id == Stocks.id)
+        .where(ProductsStock.amount > 0)
+        .group_by(ProductsStock.product_ean)
+    )
+
+    if eans is not None:
+        query = query.where(ProductsStock.product_ean.in_(eans))
+
+    return query
+
+
+def _upsert(conn, eans: Optional[list]):
+    stmt = insert(ProductOfferSummary).from_select(
+        ['ean', 'offer_count', 'min_price', 'max_price', 'cheapest_sku_id', 'merchant_ids', 'updated_at'],
+        _summary_rows(eans)
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ProductOfferSummary.ean],
+        set_={
+            column: stmt.excluded[column]
+            for column in ('offer_count', 'min_price', 'max_price', 'cheapest_sku_id', 'merchant_ids', 'updated_at')
+        }
+    )
+    conn.execute(stmt)
+
+
+def refresh_offer_summary(conn, eans: Iterable[int]):
+    """
+    Пересчитать сводку только для этих товаров. Вызывается в той же транзакции,
+    что и запись в products_stock; товар без предложений в наличии удаляется из сводки.
+    """
+    eans = sorted({int(ean) for ean in eans if ean is not None})
+    if not eans:
+        return
+
+    # Две транзакции, пересчитывающие один EAN, идут по очереди: иначе более поздний пересчет
+    # может не увидеть незакоммиченную запись соседа и сводка останется устаревшей.
+    # Блокировки берутся по возрастанию EAN, чтобы встречные пересчеты не взаимоблокировались
+    conn.execute(
+        text("SELECT pg_advisory_xact_lock(ean) FROM unnest(CAST(:eans AS bigint[])) AS ean ORDER BY ean"),
+        {"eans": eans}
+    )
+
+    _upsert(conn, eans)
+
+    in_stock = (
+        select(ProductsStock.product_ean)
+        .where(ProductsStock.product_ean.in_(eans), ProductsStock.amount > 0)
+    )
+    conn.execute(
+        delete(ProductOfferSummary)
+        .where(ProductOfferSummary.ean.in_(eans), ProductOfferSummary.ean.not_in(in_stock))
+    )
+
+
+def rebuild_offer_summary(conn):
+    """Полностью пересобрать сводку (старт приложения, заливка данных)"""
+    conn.execute(delete(ProductOfferSummary))
+    _upsert(conn, None)
@@ -132,7 +132,7 @@ def generate_random_products(num_products=50):
     products = []
 
     for i in range(num_products):
-        ean = f'{random.randint(1000000000000, 9999999999999)}'
+        ean = random.randint(1000000000000, 9999999999999)
         category = random.choice(categories)
         product_name = random.choice(product_names)
         brand = random.choice(brands)
@@ -164,7 +164,6 @@ def generate_random_product_stocks(products, available_stock_ids):
     """Генерирует случайные записи о запасах продуктов"""
 
     product_stocks = []
-    sku_counter = 1
 
     for product in products:
         # Для каждого продукта создаем записи в случайных складах из доступных
@@ -182,8 +181,8 @@ def generate_random_product_stocks(products, available_stock_ids):
 
             amount = random.randint(0, 500)
 
+            # sku_id выдает последовательность: явные значения оставили бы ее на 1
             product_stock = ProductsStock(
-                sku_id=sku_counter,
                 product_ean=product.ean,
                 stock_id=stock_id,  # Используем только существующие stock_id
                 price=price,
@@ -191,7 +190,6 @@ def generate_random_product_stocks(products, available_stock_ids):
             )
 
             product_stocks.append(product_stock)
-            sku_counter += 1
 
     return product_stocks
 
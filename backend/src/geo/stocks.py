@@ -0,0 +1,186 @@
+import os
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from ..database.models import Stocks
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.2
+# Размер ячейки сетки в градусах (~5.5 км по широте)
+GRID_CELL_DEG = 0.05
+# Сколько секунд живут загруженные координаты: так подхватываются склады, добавленные
+# или перенесенные в обход этого процесса
+STOCK_LOCATIONS_TTL = float(os.getenv("STOCK_LOCATIONS_TTL", "60"))
+
+
+class StockArrays(NamedTuple):
+    ids: np.ndarray
+    lat: np.ndarray
+    lon: np.ndarray
+    cos_lat: np.ndarray
+    # (ячейка по широте, ячейка по долготе) -> позиции складов в массивах
+    grid: Dict[Tuple[int, int], np.ndarray]
+
+
+class StockLocations:
+    """
+    Координаты всех складов в массивах NumPy (в радианах).
+
+    Расстояния от пользователя до всех складов считаются одним векторным
+    вызовом haversine, предложения сопоставляются с ними по stock_id.
+    Массивы заменяются целиком, поэтому читатели всегда видят согласованный снимок.
+    Снимок перечитывается после STOCK_LOCATIONS_TTL и сбрасывается при записи складов через ORM.
+    """
+
+    def __init__(self, ttl: float = STOCK_LOCATIONS_TTL):
+        self.ttl = ttl
+        self._arrays: Optional[StockArrays] = None
+        self._loaded_at = 0.0
+
+    def load(self, session: Session) -> StockArrays:
+        rows = session.execute(select(Stocks.id, Stocks.lat, Stocks.long).order_by(Stocks.id)).all()
+
+        # Склады без координат остаются в массиве с NaN - расстояние до них None
+        lat_deg = np.array([row[1] for row in rows], dtype=np.float64)
+        lon_deg = np.array([row[2] for row in rows], dtype=np.float64)
+        lat = np.radians(lat_deg)
+
+        self._arrays = StockArrays(
+            ids=np.array([row[0] for row in rows], dtype=np.int64),
+            lat=lat,
+            lon=np.radians(lon_deg),
+            cos_lat=np.cos(lat),
+            grid=self._build_grid(lat_deg, lon_deg)
+        )
+        self._loaded_at = time.monotonic()
+        return self._arrays
+
+    @staticmethod
+    def _build_grid(lat_deg: np.ndarray, lon_deg: np.ndarray) -> Dict[Tuple[int, int], np.ndarray]:
+        cells: Dict[Tuple[int, int], List[int]] = {}
+        located = ~(np.isnan(lat_deg) | np.isnan(lon_deg))
+        cell_lat = np.floor(lat_deg[located] / GRID_CELL_DEG).astype(np.int64)
+        cell_lon = np.floor(lon_deg[located] / GRID_CELL_DEG).astype(np.int64)
+
+        for position, cell in zip(np.flatnonzero(located).tolist(), zip(cell_lat.tolist(), cell_lon.tolist())):
+            cells.setdefault(cell, []).append(position)
+
+        return {cell: np.array(positions, dtype=np.int64) for cell, positions in cells.items()}
+
+    def arrays(self, session: Session) -> StockArrays:
+        arrays = self._arrays
+        if arrays is None or time.monotonic() - self._loaded_at > self.ttl:
+            return self.load(session)
+        return arrays
+
+    def invalidate(self):
+        self._arrays = None
+
+    @staticmethod
+    def distances(arrays: StockArrays, user_lat: float, user_long: float) -> np.ndarray:
+        """Расстояния (км) от точки до каждого склада, в порядке arrays.ids"""
+        lat = np.radians(user_lat)
+        lon = np.radians(user_long)
+
+        a = (np.sin((arrays.lat - lat) / 2) ** 2
+             + np.cos(lat) * arrays.cos_lat * np.sin((arrays.lon - lon) / 2) ** 2)
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    def stock_distances(self, session: Session, user_lat: float, user_long: float,
+                        radius_km: Optional[float] = None) -> Tuple[List[int], List[Optional[float]]]:
+        """
+        (stock_id, расстояние в км до 10 м) для всех складов или только для складов
+        в радиусе radius_km. Кандидаты в радиусе берутся из ячеек сетки, покрывающих
+        окружность, точное расстояние считается только для них.
+        """
+        arrays = self.arrays(session)
+
+        if radius_km is not None:
+            candidates = self._grid_candidates(arrays, user_lat, user_long, radius_km)
+            arrays = StockArrays(
+                ids=arrays.ids[candidates],
+                lat=arrays.lat[candidates],
+                lon=arrays.lon[candidates],
+                cos_lat=arrays.cos_lat[candidates],
+                grid={}
+            )
+
+        distances = np.round(self.distances(arrays, user_lat, user_long), 2)
+        ids = arrays.ids
+
+        if radius_km is not None:
+            inside = distances <= radius_km
+            ids, distances = ids[inside], distances[inside]
+
+        return ids.tolist(), [None if np.isnan(distance) else distance for distance in distances.tolist()]
+
+    def stocks_within(self, session: Session, user_lat: float, user_long: float,
+                      radius_km: float) -> List[int]:
+        """Склады не дальше radius_km от точки"""
+        ids, _ = self.stock_distances(session, user_lat, user_long, radius_km)
+        return sorted(ids)
+
+    @staticmethod
+    def _grid_candidates(arrays: StockArrays, user_lat: float, user_long: float,
+                         radius_km: float) -> np.ndarray:
+        dlat = radius_km / KM_PER_DEGREE
+        dlon = radius_km / (KM_PER_DEGREE * max(np.cos(np.radians(user_lat)), 0.01))
+        lat_cells = range(int(np.floor((user_lat - dlat) / GRID_CELL_DEG)),
+                          int(np.floor((user_lat + dlat) / GRID_CELL_DEG)) + 1)
+        lon_cells = range(int(np.floor((user_long - dlon) / GRID_CELL_DEG)),
+                          int(np.floor((user_long + dlon) / GRID_CELL_DEG)) + 1)
+
+        if len(lat_cells) * len(lon_cells) >= len(arrays.grid):
+            # Круг шире, чем занятые ячейки - дешевле проверить все склады
+            found = list(arrays.grid.values())
+        else:
+            found = [
+                arrays.grid[(lat_cell, lon_cell)]
+                for lat_cell in lat_cells
+                for lon_cell in lon_cells
+                if (lat_cell, lon_cell) in arrays.grid
+            ]
+
+        return np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+    def offer_distances(self, session: Session, user_lat: float, user_long: float,
+                        stock_ids: List[int]) -> List[Optional[float]]:
+        """Расстояния (км, до 10 м) для списка stock_id: одно векторное вычисление на все склады"""
+        if not stock_ids:
+            return []
+
+        arrays = self.arrays(session)
+        wanted = np.asarray(stock_ids, dtype=np.int64)
+        positions, known = self._positions_of(arrays, wanted)
+        if not known.all():
+            # Появился новый склад - перечитываем координаты
+            arrays = self.load(session)
+            positions, known = self._positions_of(arrays, wanted)
+
+        distances = np.round(self.distances(arrays, user_lat, user_long), 2)[positions]
+        distances[~known] = np.nan
+
+        return [None if np.isnan(distance) else distance for distance in distances.tolist()]
+
+    @staticmethod
+    def _positions_of(arrays: StockArrays, wanted: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Позиции stock_id в массивах (ids отсортированы - ищем векторно) и маска найденных"""
+        if not len(arrays.ids):
+            return np.zeros(len(wanted), dtype=np.int64), np.zeros(len(wanted), dtype=bool)
+
+        positions = np.minimum(np.searchsorted(arrays.ids, wanted), len(arrays.ids) - 1)
+        return positions, arrays.ids[positions] == wanted
+
+
+stock_locations = StockLocations()
+
+
+@event.listens_for(Stocks, "after_insert")
+@event.listens_for(Stocks, "after_update")
+@event.listens_for(Stocks, "after_delete")
+def _invalidate_stock_locations(mapper, connection, target):
+    stock_locations.invalidate()
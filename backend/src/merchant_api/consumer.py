@@ -0,0 +1,194 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.exc import DataError, IntegrityError
+
+from ..database.core import SessionLocal
+from ..database.models import Stocks
+from ..database.repository import ProductRepository
+from .ingest import validate_row
+from .queue import Message, StockQueue, create_stock_queue
+
+logger = logging.getLogger(__name__)
+
+# Окно, за которое сообщения собираются в одну транзакцию, и предельный размер пачки
+STOCK_BATCH_WINDOW_MS = int(os.getenv("STOCK_BATCH_WINDOW_MS", "200"))
+STOCK_BATCH_MAX = int(os.getenv("STOCK_BATCH_MAX", "5000"))
+
+
+class StockUpdateConsumer:
+    """
+    Потребитель обновлений остатков {merchant_id, stock_id, product_ean, price, amount}.
+    Сообщения за окно склеиваются по SKU (склад, EAN) - побеждает последнее - и пишутся
+    одной транзакцией. Ack отправляется только после commit: при временной ошибке пачка придет
+    снова, возможно после более новых сообщений, поэтому строка склада помнит номер примененного
+    сообщения и старое значение отбрасывается. Строку, которую отвергает сама база, пачка
+    подтверждает как отклоненную.
+    """
+
+    def __init__(self, queue: StockQueue, session_factory=SessionLocal,
+                 window_ms: int = STOCK_BATCH_WINDOW_MS, max_batch: int = STOCK_BATCH_MAX):
+        self.queue = queue
+        self.session_factory = session_factory
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.messages = 0
+        self.rows_applied = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.stale = 0
+        self.batches = 0
+        self.failures = 0
+        self.last_batch_size = 0
+        self.last_batch_ms = 0.0
+
+    def poll_once(self) -> int:
+        """Собрать пачку за окно и применить ее; возвращает число прочитанных сообщений"""
+        batch: List[Message] = []
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            batch += self.queue.read(self.max_batch - len(batch), block_ms=int(remaining * 1000) + 1)
+
+        if batch:
+            self.apply(batch)
+        return len(batch)
+
+    def apply(self, batch: List[Message]):
+        started = time.perf_counter()
+
+        latest: Dict = {}
+        valid = rejected = 0
+        for message_id, message in batch:
+            try:
+                row = validate_row(0, message)
+                key = (int(message["stock_id"]), row.product_ean)
+            except (ValueError, KeyError, TypeError):
+                rejected += 1
+                continue
+            valid += 1
+            # Повторно доставленное сообщение может прийти позже нового: побеждает больший номер, а не порядок чтения
+            seq = self.queue.sequence(message_id)
+            if key not in latest or latest[key][2] < seq:
+                latest[key] = (int(message["merchant_id"]), row, seq)
+
+        try:
+            try:
+                written, skipped, stale = self._write(latest)
+            except (DataError, IntegrityError):
+                # Пачку не принимает база из-за конкретной строки (например, остаток вне int4):
+                # пишем по одному SKU, отклоненные строки подтверждаются вместе с пачкой,
+                # иначе они возвращались бы снова и держали всю очередь
+                written, skipped, stale = {}, 0, 0
+                for key, value in latest.items():
+                    try:
+                        part, part_skipped, part_stale = self._write({key: value})
+                    except (DataError, IntegrityError):
+                        logger.warning("Обновление остатка склада %s, EAN %s отклонено базой", *key)
+                        skipped += 1
+                        continue
+                    for stock_id, eans in part.items():
+                        written.setdefault(stock_id, []).extend(eans)
+                    skipped += part_skipped
+                    stale += part_stale
+
+        except Exception:
+            # Без ack: сообщения вернутся после STOCK_QUEUE_CLAIM_IDLE_MS
+            self.failures += 1
+            logger.exception("Пачка обновлений остатков из %s сообщений не применена", len(batch))
+            return
+
+        self.queue.ack([message_id for message_id, _ in batch])
+
+        self.messages += len(batch)
+        self.rows_applied += sum(len(eans) for eans in written.values())
+        self.coalesced += valid - len(latest)
+        self.stale += stale
+        self.rejected += rejected + skipped
+        self.batches += 1
+        self.last_batch_size = len(batch)
+        self.last_batch_ms = (time.perf_counter() - started) * 1000
+
+    def _write(self, latest: Dict):
+        """
+        Записать склеенные строки одной транзакцией; возвращает записанные EAN по складам,
+        число отклоненных (чужой склад, неизвестный EAN) и устаревших строк
+        """
+        with self.session_factory() as session:
+            products = ProductRepository(session)
+            stock_ids = {stock_id for stock_id, _ in latest}
+            owners = dict(session.execute(
+                select(Stocks.id, Stocks.merchant_id).where(Stocks.id.in_(stock_ids))
+            ).all()) if stock_ids else {}
+
+            rejected = 0
+            by_stock: Dict[int, list] = {}
+            for (stock_id, _), (merchant_id, row, seq) in latest.items():
+                if owners.get(stock_id) != merchant_id:
+                    rejected += 1
+                    continue
+                by_stock.setdefault(stock_id, []).append((row.product_ean, row.price, row.amount, seq))
+
+            written = {}
+            stale = 0
+            for stock_id, rows in by_stock.items():
+                result = products.upsert_queued_stock(stock_id, rows)
+                rejected += result["unknown"]
+                stale += result["stale"]
+                written[stock_id] = result["eans"]
+            session.commit()
+
+            for stock_id, eans in written.items():
+                products.invalidate_stock(stock_id, eans)
+
+        return written, rejected, stale
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="stock-consumer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+            except Exception:
+                logger.exception("Ошибка чтения очереди обновлений остатков")
+                self._stop.wait(1)
+
+    def stats(self) -> Dict:
+        return {
+            "running": self._thread is not None,
+            "messages": self.messages,
+            "rows_applied": self.rows_applied,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "stale": self.stale,
+            "batches": self.batches,
+            "failures": self.failures,
+            "last_batch_size": self.last_batch_size,
+            "last_batch_ms": round(self.last_batch_ms, 3),
+            "lag": self.queue.lag(),
+            "pending": self.queue.pending(),
+        }
+
+
+stock_queue = create_stock_queue()
+stock_consumer = StockUpdateConsumer(stock_queue)
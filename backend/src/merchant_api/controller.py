@@ -1,5 +1,7 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Request
+from starlette.concurrency import run_in_threadpool
 from .service import *
+from .jobs import FILE_FORMATS, save_upload
 from .model import *
 from ..dependencies import get_merchant_product_service
 
@@ -17,8 +19,148 @@ def add_product_to_stock(
     merchant.add_product_to_stock(stock_id, product)
 
 
+@merchant_router.post("/bulk/product/stock/{stock_id}",
+                      response_model=IngestResponse,
+                      summary="Массовая загрузка остатков склада",
+                      description="JSON-массив или CSV (product_ean,price,amount); существующие товары склада обновляются"
+)
+async def bulk_upsert_stock(
+        stock_id: int,
+        request: Request,
+        merchant: MerchantProductService = Depends(get_merchant_product_service)):
+
+    body = await request.body()
+    return await run_in_threadpool(
+        merchant.bulk_upsert_stock, stock_id, body, request.headers.get("content-type", "")
+    )
 
 
+@merchant_router.put("/stocks/{stock_id}/inventory",
+                     response_model=ReplaceResponse,
+                     summary="Полная замена остатков склада",
+                     description="Ночной снимок склада (JSON-массив или CSV): новые позиции вставляются, изменившиеся "
+                                 "обновляются, отсутствующие в снимке обнуляются - все одной транзакцией"
+)
+async def replace_stock(
+        stock_id: int,
+        request: Request,
+        merchant: MerchantProductService = Depends(get_merchant_product_service)):
+
+    body = await request.body()
+    return await run_in_threadpool(
+        merchant.replace_stock, stock_id, body, request.headers.get("content-type", "")
+    )
+
+
+@merchant_router.post("/bulk/products",
+                      response_model=CatalogIngestResponse,
+                      summary="Массовая регистрация товаров каталога",
+                      description="JSON-массив {ean, name, category, weight}; товар с существующим EAN обновляется, "
+                                  "повтор EAN в запросе - применяется последняя строка"
+)
+async def bulk_upsert_products(
+        request: Request,
+        merchant: MerchantProductService = Depends(get_merchant_product_service)):
+
+    body = await request.body()
+    return await run_in_threadpool(merchant.bulk_upsert_products, body)
+
+
+@merchant_router.put("/stock/{stock_id}/product/{sku_id}",
+                     summary="Изменение товара на складе",
+                     description="Цена, остаток или EAN одной позиции склада"
+)
+def update_product(
+        stock_id: int,
+        sku_id: int,
+        product: ProductToStock,
+        merchant: MerchantProductService = Depends(get_merchant_product_service)):
+
+    return merchant.update_product(stock_id, sku_id, product)
+
+
+@merchant_router.post("/sync",
+                      response_model=StockSyncResponse,
+                      summary="Delta-синхронизация остатков",
+                      description="Только изменившиеся позиции (product_ean, stock_id, price, amount) с возрастающей версией; "
+                                  "повтор примененной версии ничего не меняет, версия ниже текущей отклоняется с 409"
+)
+def sync_stock(
+        request: StockSyncRequest,
+        merchant: MerchantProductService = Depends(get_merchant_product_service)):
+
+    return merchant.sync_stock(request)
 
 
+@merchant_router.post("/stock/updates",
+                      status_code=202,
+                      summary="Изменения остатков через очередь",
+                      description="Изменения публикуются в очередь и применяются потребителем пачками: "
+                                  "повторы одного SKU за окно склеиваются, запись - одна транзакция на пачку"
+)
+def queue_stock_updates(
+        request: StockUpdatesRequest,
+        merchant: MerchantProductService = Depends(get_merchant_product_service)):
+
+    return merchant.queue_stock_updates(request)
+
+
+@merchant_router.get("/stock/updates/stats",
+                     summary="Статистика очереди остатков",
+                     description="Прочитанные, склеенные и отклоненные сообщения, размер пачек и отставание потребителя"
+)
+def get_stock_queue_stats(merchant: MerchantProductService = Depends(get_merchant_product_service)):
+    return merchant.get_stock_queue_stats()
+
+
+@merchant_router.post("/jobs/stock/{stock_id}",
+                      status_code=202,
+                      response_model=IngestJobResponse,
+                      summary="Фоновая загрузка файла остатков",
+                      description="CSV (product_ean,price,amount) или NDJSON; файл обрабатывается пачками в фоне, "
+                                  "состояние - GET /merchant/jobs/{id}"
+)
+async def create_ingest_job(
+        stock_id: int,
+        request: Request,
+        merchant: MerchantProductService = Depends(get_merchant_product_service)):
+
+    file_format = FILE_FORMATS.get(request.headers.get("content-type", "").split(";")[0].strip())
+    if file_format is None:
+        raise HTTPException(
+            status_code=415,
+            detail=f"Поддерживаются Content-Type: {', '.join(FILE_FORMATS)}"
+        )
+
+    await run_in_threadpool(merchant.check_stock_id, stock_id)
+    file_path, file_size = await save_upload(request.stream(), file_format)
+
+    return await run_in_threadpool(merchant.create_ingest_job, stock_id, file_path, file_format, file_size)
+
+
+@merchant_router.get("/jobs/{job_id}",
+                     response_model=IngestJobResponse,
+                     summary="Состояние фоновой загрузки",
+                     description="Прогресс по байтам файла, скорость, счетчики и ошибки по строкам"
+)
+def get_ingest_job(
+        job_id: int,
+        merchant: MerchantProductService = Depends(get_merchant_product_service)):
+
+    return merchant.get_ingest_job(job_id)
+
+
+@merchant_router.get("/stocks/{stock_id}/inventory",
+                     response_model=InventoryResponse,
+                     summary="Остатки склада глазами платформы",
+                     description="Keyset-страницы по sku_id; с since=<change_token> - только строки, измененные после "
+                                 "выдачи токена. Строки не удаляются: снятый товар приходит с amount=0"
+)
+def get_stock_inventory(
+        stock_id: int,
+        limit: int = Query(500, ge=1, le=5000, description="Строк на странице"),
+        cursor: Optional[str] = Query(None, description="next_cursor предыдущей страницы"),
+        since: Optional[str] = Query(None, description="change_token прошлой выгрузки"),
+        merchant: MerchantProductService = Depends(get_merchant_product_service)):
 
+    return merchant.get_stock_inventory(stock_id, limit, cursor, since)
@@ -0,0 +1,178 @@
+import csv
+import io
+import json
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+# Сколько ошибок по строкам возвращается в отчете (счетчик rejected - по всем)
+MAX_REPORTED_ERRORS = 100
+CSV_COLUMNS = ('product_ean', 'price', 'amount')
+# Границы колонок products_stock (bigint EAN, integer остаток): больше не принимает база
+BIGINT_MAX = 2 ** 63 - 1
+INT_MAX = 2 ** 31 - 1
+
+
+class StockRow(NamedTuple):
+    line: int
+    product_ean: int
+    price: float
+    amount: int
+
+
+class ProductRow(NamedTuple):
+    line: int
+    ean: int
+    name: str
+    category: str
+    weight: Optional[float]
+
+
+class IngestReport:
+    """Итог загрузки остатков: счетчики и первые MAX_REPORTED_ERRORS ошибок по строкам"""
+
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.rejected = 0
+        self.errors = []
+
+    def reject(self, line: int, reason: str):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": reason})
+
+    def as_dict(self) -> Dict:
+        return {
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "rejected": self.rejected,
+            "errors": sorted(self.errors, key=lambda error: error["line"])
+        }
+
+
+def iter_json_rows(body: bytes) -> Iterator[Tuple[int, Dict]]:
+    """Строки JSON-массива объектов; номер строки - позиция в массиве с 1"""
+    try:
+        rows = json.loads(body)
+    except ValueError:
+        raise ValueError("Тело запроса не является JSON")
+
+    if not isinstance(rows, list):
+        raise ValueError("Ожидается JSON-массив строк остатков")
+
+    for line, row in enumerate(rows, start=1):
+        yield line, row
+
+
+def iter_csv_rows(body: bytes) -> Iterator[Tuple[int, Dict]]:
+    """Строки CSV с заголовком product_ean,price,amount; номер строки - строка файла"""
+    try:
+        text = body.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise ValueError("CSV должен быть в кодировке UTF-8")
+
+    reader = csv.DictReader(io.StringIO(text))
+    missing = set(CSV_COLUMNS) - set(reader.fieldnames or ())
+    if missing:
+        raise ValueError(f"В CSV нет колонок: {', '.join(sorted(missing))}")
+
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_csv_header(raw: bytes) -> List[str]:
+    """Колонки из первой строки CSV-файла"""
+    try:
+        columns = next(csv.reader([raw.decode('utf-8-sig')]), [])
+    except UnicodeDecodeError:
+        raise ValueError("CSV должен быть в кодировке UTF-8")
+
+    columns = [column.strip() for column in columns]
+    missing = set(CSV_COLUMNS) - set(columns)
+    if missing:
+        raise ValueError(f"В CSV нет колонок: {', '.join(sorted(missing))}")
+
+    return columns
+
+
+def parse_file_line(raw: bytes, file_format: str, columns: Optional[List[str]] = None):
+    """Одна строка файла задачи (CSV по колонкам заголовка или NDJSON); None для пустой строки"""
+    try:
+        text = raw.decode('utf-8').strip()
+    except UnicodeDecodeError:
+        raise ValueError("строка не в кодировке UTF-8")
+
+    if not text:
+        return None
+
+    if file_format == 'csv':
+        return dict(zip(columns, next(csv.reader([text]))))
+
+    try:
+        return json.loads(text)
+    except ValueError:
+        raise ValueError("строка не является JSON")
+
+
+def validate_row(line: int, row) -> StockRow:
+    """Проверить и привести одну строку; ValueError с причиной, если строка отклоняется"""
+    if not isinstance(row, dict):
+        raise ValueError("строка должна быть объектом")
+
+    try:
+        product_ean = int(str(row.get('product_ean', '')).strip())
+    except ValueError:
+        raise ValueError("некорректный product_ean")
+
+    try:
+        price = float(row.get('price'))
+    except (TypeError, ValueError):
+        raise ValueError("некорректная цена")
+
+    try:
+        amount = int(str(row.get('amount', '')).strip())
+    except ValueError:
+        raise ValueError("некорректный остаток")
+
+    if not 0 < product_ean <= BIGINT_MAX:
+        raise ValueError("некорректный product_ean")
+    if not price >= 0 or price == float('inf'):
+        raise ValueError("цена должна быть неотрицательным числом")
+    if amount < 0:
+        raise ValueError("остаток не может быть отрицательным")
+    if amount > INT_MAX:
+        raise ValueError(f"остаток не может быть больше {INT_MAX}")
+
+    return StockRow(line, product_ean, price, amount)
+
+
+def validate_product(line: int, row) -> ProductRow:
+    """Проверить строку каталога: EAN, непустые название и категория, неотрицательный вес"""
+    if not isinstance(row, dict):
+        raise ValueError("строка должна быть объектом")
+
+    try:
+        ean = int(str(row.get('ean', '')).strip())
+    except ValueError:
+        raise ValueError("некорректный ean")
+    if not 0 < ean <= BIGINT_MAX:
+        raise ValueError("некорректный ean")
+
+    name = str(row.get('name') or '').strip()
+    category = str(row.get('category') or '').strip()
+    if not name:
+        raise ValueError("не указано название")
+    if not category:
+        raise ValueError("не указана категория")
+
+    weight = row.get('weight')
+    if weight is not None and weight != '':
+        try:
+            weight = float(weight)
+        except (TypeError, ValueError):
+            raise ValueError("некорректный вес")
+        if not weight >= 0 or weight == float('inf'):
+            raise ValueError("вес должен быть неотрицательным числом")
+    else:
+        weight = None
+
+    return ProductRow(line, ean, name, category, weight)
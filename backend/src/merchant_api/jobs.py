@@ -0,0 +1,200 @@
+import logging
+import os
+import tempfile
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import AsyncIterator, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.exc import DBAPIError, OperationalError
+
+from ..database.core import SessionLocal
+from ..database.repository import IngestJobRepository, ProductRepository
+from .ingest import MAX_REPORTED_ERRORS, read_csv_header, parse_file_line, validate_row
+
+logger = logging.getLogger(__name__)
+
+INGEST_DIR = os.getenv("INGEST_DIR", os.path.join(tempfile.gettempdir(), "t-products-ingest"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+# Строк в одной транзакции: после каждой пачки фиксируется checkpoint, с него задача продолжится после падения
+INGEST_CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", "5000"))
+# Задача в статусе running без heartbeat дольше этого считается брошенной упавшим воркером
+INGEST_LEASE_SECONDS = int(os.getenv("INGEST_LEASE_SECONDS", "300"))
+# Через сколько повторить задачу после временной ошибки базы (взаимоблокировка, обрыв соединения)
+INGEST_RETRY_SECONDS = float(os.getenv("INGEST_RETRY_SECONDS", "5"))
+# Сколько хранится файл упавшей задачи, чтобы ее можно было разобрать
+INGEST_FAILED_RETENTION_SECONDS = int(os.getenv("INGEST_FAILED_RETENTION_SECONDS", str(7 * 24 * 3600)))
+
+# Content-Type загрузки -> формат файла задачи
+FILE_FORMATS = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+
+async def save_upload(chunks: AsyncIterator[bytes], suffix: str) -> Tuple[str, int]:
+    """Записать тело запроса в INGEST_DIR по частям, не держа файл в памяти"""
+    os.makedirs(INGEST_DIR, exist_ok=True)
+    path = os.path.join(INGEST_DIR, f"{uuid.uuid4().hex}.{suffix}")
+    size = 0
+    with open(path, 'wb') as file:
+        async for chunk in chunks:
+            file.write(chunk)
+            size += len(chunk)
+
+    return path, size
+
+
+def remove_upload(path: str):
+    """Удалить файл задачи, продолжать которую больше не нужно"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def is_transient(error: Exception) -> bool:
+    """Ошибка, после которой задачу можно продолжить с checkpoint: взаимоблокировка, конфликт сериализации, обрыв соединения"""
+    return isinstance(error, OperationalError) or (isinstance(error, DBAPIError) and error.connection_invalidated)
+
+
+def run_ingest_job(job_id: int, session_factory=SessionLocal, chunk_rows: int = INGEST_CHUNK_ROWS) -> bool:
+    """
+    Обработать файл задачи пачками по chunk_rows строк. Каждая пачка - одна транзакция:
+    upsert остатков и сдвиг checkpoint фиксируются вместе, поэтому перезапуск не теряет
+    и не задваивает строки. Возвращает False, если задача возвращена в очередь после
+    временной ошибки и ее нужно повторить.
+    """
+    with session_factory() as session:
+        jobs = IngestJobRepository(session)
+        job = jobs.claim(job_id, INGEST_LEASE_SECONDS)
+        if job is None:
+            return True
+
+        products = ProductRepository(session)
+        try:
+            with open(job.file_path, 'rb') as file:
+                columns = None
+                if job.file_format == 'csv':
+                    header = file.readline()
+                    columns = read_csv_header(header)
+                    if job.checkpoint_offset == 0:
+                        job.checkpoint_offset, job.checkpoint_line = file.tell(), 1
+
+                file.seek(job.checkpoint_offset)
+                line = job.checkpoint_line
+
+                while True:
+                    rows, errors = [], []
+                    for raw in file:
+                        line += 1
+                        try:
+                            row = parse_file_line(raw, job.file_format, columns)
+                            if row is None:
+                                continue
+                            rows.append(validate_row(line, row))
+                        except ValueError as e:
+                            errors.append({"line": line, "error": str(e)})
+                        if len(rows) + len(errors) >= chunk_rows:
+                            break
+
+                    if not rows and not errors:
+                        break
+
+                    read = len(rows) + len(errors)
+                    result = products.upsert_stock_rows(job.stock_id, rows)
+                    unknown = set(result["unknown_lines"])
+                    errors += [{"line": n, "error": "товар с таким EAN не найден"} for n in sorted(unknown)]
+                    errors += [
+                        {"line": n, "error": "EAN повторяется ниже, применена последняя строка"}
+                        for n in result["duplicate_lines"] if n not in unknown
+                    ]
+
+                    job.rows_processed += read
+                    job.inserted += result["inserted"]
+                    job.updated += result["updated"]
+                    job.rejected += len(errors)
+                    job.errors = (job.errors + sorted(errors, key=lambda error: error["line"]))[:MAX_REPORTED_ERRORS]
+                    job.checkpoint_offset, job.checkpoint_line = file.tell(), line
+                    job.heartbeat_at = func.now()
+                    session.commit()
+
+                    products.invalidate_stock(job.stock_id, result["eans"])
+
+            job.status = 'done'
+            job.finished_at = func.now()
+            session.commit()
+            remove_upload(job.file_path)
+
+        except Exception as e:
+            session.rollback()
+            if is_transient(e):
+                # Зафиксированные пачки остаются, задача продолжится с checkpoint. Если не удастся
+                # записать и статус, задача останется running и ее заберет lease
+                logger.warning("Задача загрузки %s прервана временной ошибкой базы, повтор с checkpoint", job_id)
+                job.status = 'queued'
+                session.commit()
+                return False
+
+            # Файл упавшей задачи хранится до sweep_failed_uploads
+            logger.exception("Задача загрузки %s завершилась с ошибкой", job_id)
+            job.status = 'failed'
+            job.error = str(e)
+            job.finished_at = func.now()
+            session.commit()
+
+    return True
+
+
+def sweep_failed_uploads(retention_seconds: int = INGEST_FAILED_RETENTION_SECONDS) -> int:
+    """Удалить файлы упавших задач старше срока хранения; возвращает число задач"""
+    with SessionLocal() as session:
+        jobs = IngestJobRepository(session)
+        expired = jobs.expired_failed_jobs(retention_seconds)
+        for job in expired:
+            remove_upload(job.file_path)
+            job.file_path = None
+        session.commit()
+
+    return len(expired)
+
+
+class IngestWorkerPool:
+    """Пул воркеров загрузки в процессе приложения; потоки создаются при первой задаче"""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def submit(self, job_id: int) -> Future:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingest")
+        return self._executor.submit(self._run, job_id)
+
+    def _run(self, job_id: int):
+        if run_ingest_job(job_id):
+            sweep_failed_uploads()
+            return
+
+        retry = threading.Timer(INGEST_RETRY_SECONDS, self.submit, args=(job_id,))
+        retry.daemon = True
+        retry.start()
+
+    def resume_pending(self):
+        """Поставить в очередь новые и брошенные задачи, например после перезапуска процесса"""
+        sweep_failed_uploads()
+        with SessionLocal() as session:
+            job_ids = IngestJobRepository(session).resumable_job_ids(INGEST_LEASE_SECONDS)
+
+        for job_id in job_ids:
+            self.submit(job_id)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+ingest_pool = IngestWorkerPool(INGEST_WORKERS)
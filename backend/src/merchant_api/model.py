@@ -1,4 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import datetime
+from .ingest import BIGINT_MAX, INT_MAX
 
 
 class Product(BaseModel):
@@ -14,3 +17,133 @@ class ProductToStock(BaseModel):
     amount: int
 
 
+class IngestError(BaseModel):
+    line: int
+    error: str
+
+
+class IngestReportData(BaseModel):
+    inserted: int
+    updated: int
+    rejected: int
+    errors: List[IngestError]
+
+
+class IngestResponse(BaseModel):
+    status: str = "success"
+    message: str
+    data: IngestReportData
+
+
+class ReplaceReportData(IngestReportData):
+    zeroed: int
+    unchanged: int
+
+
+class ReplaceResponse(BaseModel):
+    status: str = "success"
+    message: str
+    data: ReplaceReportData
+
+
+class CatalogRowResult(BaseModel):
+    line: int
+    ean: Optional[int] = None
+    outcome: str = Field(description="inserted, updated, unchanged, duplicate или rejected")
+    error: Optional[str] = None
+
+
+class CatalogIngestData(BaseModel):
+    inserted: int
+    updated: int
+    unchanged: int
+    duplicate: int
+    rejected: int
+    rows: List[CatalogRowResult]
+
+
+class CatalogIngestResponse(BaseModel):
+    status: str = "success"
+    message: str
+    data: CatalogIngestData
+
+
+class IngestJobData(BaseModel):
+    id: int
+    stock_id: int
+    status: str
+    file_format: str
+    file_size: int
+    processed_bytes: int
+    progress: float
+    rows_processed: int
+    inserted: int
+    updated: int
+    rejected: int
+    rows_per_second: Optional[float] = None
+    errors: List[IngestError]
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class IngestJobResponse(BaseModel):
+    status: str = "success"
+    message: str
+    data: IngestJobData
+
+
+class StockChange(BaseModel):
+    product_ean: int = Field(gt=0, le=BIGINT_MAX)
+    stock_id: int = Field(le=INT_MAX)
+    price: float = Field(ge=0)
+    amount: int = Field(ge=0, le=INT_MAX)
+
+
+class StockSyncRequest(BaseModel):
+    version: int = Field(ge=1, le=BIGINT_MAX, description="Версия синхронизации мерчанта, строго возрастает")
+    changes: List[StockChange]
+
+
+class StockUpdatesRequest(BaseModel):
+    changes: List[StockChange] = Field(min_length=1)
+
+
+class StockChangeKey(BaseModel):
+    product_ean: int
+    stock_id: int
+
+
+class StockSyncData(BaseModel):
+    version: int
+    applied: int
+    duplicate: bool = False
+    not_found: List[StockChangeKey] = []
+
+
+class StockSyncResponse(BaseModel):
+    status: str = "success"
+    message: str
+    data: StockSyncData
+
+
+class InventoryItem(BaseModel):
+    sku_id: int
+    product_ean: int
+    price: float
+    amount: int
+    change_seq: int
+
+
+class InventoryData(BaseModel):
+    items: List[InventoryItem]
+    next_cursor: Optional[str] = None
+    has_more: bool
+    change_token: str = Field(description="Передается в since после последней страницы, чтобы получить только изменения")
+
+
+class InventoryResponse(BaseModel):
+    status: str = "success"
+    message: str
+    data: InventoryData
@@ -0,0 +1,174 @@
+import os
+from abc import ABC, abstractmethod
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import orjson
+import redis
+
+STOCK_QUEUE_URL = os.getenv("STOCK_QUEUE_URL")
+STOCK_QUEUE_STREAM = os.getenv("STOCK_QUEUE_STREAM", "stock-updates")
+STOCK_QUEUE_GROUP = os.getenv("STOCK_QUEUE_GROUP", "stock-consumers")
+# Сообщение, взятое потребителем и не подтвержденное за это время, выдается повторно
+STOCK_QUEUE_CLAIM_IDLE_MS = int(os.getenv("STOCK_QUEUE_CLAIM_IDLE_MS", "30000"))
+
+Message = Tuple[str, Dict]
+
+
+class StockQueue(ABC):
+    """
+    Очередь обновлений остатков с доставкой at-least-once: прочитанное сообщение
+    остается в ожидающих до ack и выдается снова, если потребитель не подтвердил его вовремя
+    """
+
+    @abstractmethod
+    def publish(self, messages: List[Dict]) -> List[str]:
+        """Опубликовать сообщения; возвращает их id"""
+
+    @abstractmethod
+    def read(self, count: int, block_ms: int) -> List[Message]:
+        """Выдать до count сообщений, ожидая до block_ms; сюда же попадают неподтвержденные вовремя"""
+
+    @abstractmethod
+    def sequence(self, message_id: str) -> int:
+        """Порядковый номер сообщения: у опубликованного позже он больше"""
+
+    @abstractmethod
+    def ack(self, message_ids: List[str]):
+        """Подтвердить обработанные сообщения"""
+
+    @abstractmethod
+    def lag(self) -> Optional[int]:
+        """Сколько сообщений еще не выдано потребителям"""
+
+    @abstractmethod
+    def pending(self) -> int:
+        """Сколько выданных сообщений ждут подтверждения"""
+
+
+class MemoryStockQueue(StockQueue):
+    """Очередь в памяти процесса: для тестов и запуска без Redis"""
+
+    def __init__(self, claim_idle_ms: int = STOCK_QUEUE_CLAIM_IDLE_MS):
+        self.claim_idle = claim_idle_ms / 1000
+        self._cond = threading.Condition()
+        self._queue: "deque[Message]" = deque()
+        self._pending: Dict[str, Tuple[Dict, float]] = {}
+        self._last_id = 0
+
+    def publish(self, messages: List[Dict]) -> List[str]:
+        with self._cond:
+            ids = []
+            for _ in messages:
+                # Номер от часов, а не с единицы: после перезапуска процесса он продолжает расти
+                self._last_id = max(self._last_id + 1, time.time_ns())
+                ids.append(str(self._last_id))
+            self._queue.extend(zip(ids, messages))
+            self._cond.notify_all()
+        return ids
+
+    def read(self, count: int, block_ms: int) -> List[Message]:
+        with self._cond:
+            now = time.monotonic()
+            stale = [
+                message_id for message_id, (_, delivered_at) in self._pending.items()
+                if now - delivered_at >= self.claim_idle
+            ][:count]
+            if stale:
+                for message_id in stale:
+                    self._pending[message_id] = (self._pending[message_id][0], now)
+                return [(message_id, self._pending[message_id][0]) for message_id in stale]
+
+            if not self._queue:
+                self._cond.wait(block_ms / 1000)
+
+            batch = []
+            while self._queue and len(batch) < count:
+                message_id, message = self._queue.popleft()
+                self._pending[message_id] = (message, time.monotonic())
+                batch.append((message_id, message))
+            return batch
+
+    def sequence(self, message_id: str) -> int:
+        return int(message_id)
+
+    def ack(self, message_ids: List[str]):
+        with self._cond:
+            for message_id in message_ids:
+                self._pending.pop(message_id, None)
+
+    def lag(self) -> Optional[int]:
+        return len(self._queue)
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+
+class RedisStockQueue(StockQueue):
+    """Redis Stream с группой потребителей; неподтвержденные сообщения забираются XAUTOCLAIM"""
+
+    def __init__(self, client: "redis.Redis", stream: str = STOCK_QUEUE_STREAM, group: str = STOCK_QUEUE_GROUP,
+                 consumer: Optional[str] = None, claim_idle_ms: int = STOCK_QUEUE_CLAIM_IDLE_MS):
+        self.client = client
+        self.stream = stream
+        self.group = group
+        self.consumer = consumer or f"{os.uname().nodename}-{os.getpid()}"
+        self.claim_idle_ms = claim_idle_ms
+
+        try:
+            self.client.xgroup_create(stream, group, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def publish(self, messages: List[Dict]) -> List[str]:
+        pipe = self.client.pipeline(transaction=False)
+        for message in messages:
+            pipe.xadd(self.stream, {"data": orjson.dumps(message)})
+        return [message_id.decode() for message_id in pipe.execute()]
+
+    def read(self, count: int, block_ms: int) -> List[Message]:
+        _, claimed, *_ = self.client.xautoclaim(
+            self.stream, self.group, self.consumer, min_idle_time=self.claim_idle_ms, start_id="0-0", count=count
+        )
+        entries = claimed
+        if not entries:
+            response = self.client.xreadgroup(
+                self.group, self.consumer, {self.stream: ">"}, count=count, block=max(block_ms, 1)
+            )
+            entries = response[0][1] if response else []
+
+        return [(message_id.decode(), orjson.loads(fields[b"data"])) for message_id, fields in entries if fields]
+
+    def sequence(self, message_id: str) -> int:
+        # Идентификатор записи потока "<мс>-<номер>" монотонен; в масштабе наносекунд, как у MemoryStockQueue
+        milliseconds, number = message_id.split("-")
+        return int(milliseconds) * 1_000_000 + int(number)
+
+    def ack(self, message_ids: List[str]):
+        if not message_ids:
+            return
+        # Поток читает одна группа: подтвержденные записи удаляются, чтобы он не рос
+        pipe = self.client.pipeline(transaction=False)
+        pipe.xack(self.stream, self.group, *message_ids)
+        pipe.xdel(self.stream, *message_ids)
+        pipe.execute()
+
+    def lag(self) -> Optional[int]:
+        for group in self.client.xinfo_groups(self.stream):
+            name = group["name"]
+            if (name.decode() if isinstance(name, bytes) else name) == self.group:
+                return group.get("lag")
+        return None
+
+    def pending(self) -> int:
+        return self.client.xpending(self.stream, self.group)["pending"]
+
+
+def create_stock_queue(redis_client: Optional["redis.Redis"] = None) -> StockQueue:
+    if redis_client is None and STOCK_QUEUE_URL:
+        redis_client = redis.Redis.from_url(STOCK_QUEUE_URL)
+
+    return RedisStockQueue(redis_client) if redis_client is not None else MemoryStockQueue()
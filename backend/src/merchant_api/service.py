@@ -1,6 +1,13 @@
 from ..database.repository import *
+from ..responses import FastJSONResponse
 from .model import *
+from .ingest import IngestReport, iter_json_rows, iter_csv_rows, validate_row, validate_product
+from .jobs import ingest_pool
+from .consumer import stock_queue, stock_consumer
+from ..product.cursor import encode_cursor, decode_cursor
 from fastapi.exceptions import HTTPException
+from sqlalchemy.exc import IntegrityError
+from psycopg2 import errorcodes
 
 class MerchantProductService:
     def __init__(self, merchant_id: int, product_repo: ProductRepository):
@@ -22,13 +29,351 @@ class MerchantProductService:
         return product
 
 
+    def bulk_upsert_stock(self, stock_id: int, body: bytes, content_type: str):
+        """Массовая загрузка остатков склада из JSON-массива или CSV с отчетом по строкам"""
+        self.check_stock_id(stock_id)
+        report = IngestReport()
+
+        try:
+            result = self.product_repo.bulk_upsert_stock(stock_id, self._valid_stock_rows(body, content_type, report))
+        except ValueError as e:
+            raise HTTPException(
+                status_code=400,
+                detail=str(e)
+            )
+
+        self._reject_staging_lines(report, result)
+        report.inserted = result["inserted"]
+        report.updated = result["updated"]
+
+        return FastJSONResponse({
+            "status": "success",
+            "message": "Остатки загружены",
+            "data": report.as_dict()
+        })
+
+    def replace_stock(self, stock_id: int, body: bytes, content_type: str):
+        """Полная замена склада снимком: чего нет в снимке, обнуляется, отчет - размер разницы"""
+        self.check_stock_id(stock_id)
+        report = IngestReport()
+
+        try:
+            rows = list(self._valid_stock_rows(body, content_type, report))
+        except ValueError as e:
+            raise HTTPException(
+                status_code=400,
+                detail=str(e)
+            )
+
+        if not rows:
+            # Пустой или целиком отклоненный снимок обнулил бы весь склад
+            raise HTTPException(
+                status_code=400,
+                detail="В снимке нет ни одной корректной строки, склад не изменен"
+            )
+
+        try:
+            result = self.product_repo.replace_stock(stock_id, rows)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=400,
+                detail=str(e)
+            )
+        self._reject_staging_lines(report, result)
+
+        return FastJSONResponse({
+            "status": "success",
+            "message": "Склад заменен снимком",
+            "data": {
+                **report.as_dict(),
+                "inserted": result["inserted"],
+                "updated": result["updated"],
+                "zeroed": result["zeroed"],
+                "unchanged": result["unchanged"]
+            }
+        })
+
+    @staticmethod
+    def _valid_stock_rows(body: bytes, content_type: str, report: IngestReport):
+        """Корректные строки остатков одним проходом по мере чтения; остальные - в отчет"""
+        if content_type.startswith("text/csv"):
+            rows = iter_csv_rows(body)
+        else:
+            rows = iter_json_rows(body)
+
+        for line, row in rows:
+            try:
+                yield validate_row(line, row)
+            except ValueError as e:
+                report.reject(line, str(e))
+
+    @staticmethod
+    def _reject_staging_lines(report: IngestReport, result: Dict):
+        for line in result["unknown_lines"]:
+            report.reject(line, "товар с таким EAN не найден")
+        for line in sorted(set(result["duplicate_lines"]) - set(result["unknown_lines"])):
+            report.reject(line, "EAN повторяется ниже, применена последняя строка")
+
+    def bulk_upsert_products(self, body: bytes):
+        """Массовая регистрация товаров каталога из JSON-массива с исходом по каждой строке"""
+        try:
+            rows = list(iter_json_rows(body))
+        except ValueError as e:
+            raise HTTPException(
+                status_code=400,
+                detail=str(e)
+            )
+
+        results = []
+        latest = {}
+        for line, row in rows:
+            try:
+                product = validate_product(line, row)
+            except ValueError as e:
+                results.append({"line": line, "ean": None, "outcome": "rejected", "error": str(e)})
+                continue
+
+            previous = latest.get(product.ean)
+            if previous is not None:
+                results.append({
+                    "line": previous.line, "ean": previous.ean, "outcome": "duplicate",
+                    "error": "EAN повторяется ниже, применена последняя строка"
+                })
+            latest[product.ean] = product
+
+        outcomes = self.product_repo.bulk_upsert_products(list(latest.values()))
+        results += [
+            {"line": product.line, "ean": product.ean, "outcome": outcomes[product.ean], "error": None}
+            for product in latest.values()
+        ]
+        results.sort(key=lambda result: result["line"])
+
+        counts = {outcome: 0 for outcome in ("inserted", "updated", "unchanged", "duplicate", "rejected")}
+        for result in results:
+            counts[result["outcome"]] += 1
+
+        return FastJSONResponse({
+            "status": "success",
+            "message": "Каталог обновлен",
+            "data": {**counts, "rows": results}
+        })
+
     def update_product(self, stock_id: int, sku_id: int, data: ProductToStock):
         self.check_stock_id(stock_id)
 
+        product_stock = self.product_repo.get_product_by_sku_id(sku_id)
+        if not product_stock or product_stock.stock_id != stock_id:
+            raise HTTPException(
+                status_code=404,
+                detail="Товар на складе не найден"
+            )
+
+        try:
+            row = validate_row(0, dict(data))
+        except ValueError as e:
+            raise HTTPException(
+                status_code=400,
+                detail=str(e)
+            )
+
+        if not self.product_repo.product_exists(row.product_ean):
+            raise HTTPException(
+                status_code=404,
+                detail="Товар с таким EAN не найден"
+            )
+
+        try:
+            self.product_repo.update_product(
+                sku_id=sku_id,
+                data={"product_ean": row.product_ean, "price": row.price, "amount": row.amount}
+            )
+        except IntegrityError as e:
+            self.product_repo.session.rollback()
+            # Единственный уникальный ключ, который меняет UPDATE, - (product_ean, stock_id).
+            # Имя ограничения не сравнивается: у секционированной таблицы это имя индекса секции
+            if getattr(e.orig, "pgcode", None) != errorcodes.UNIQUE_VIOLATION:
+                raise
+            raise HTTPException(
+                status_code=409,
+                detail="Этот товар уже есть на складе"
+            )
+
+        return FastJSONResponse({
+            "status": "success",
+            "message": "Товар на складе обновлен",
+            "data": None
+        })
+
+    def create_ingest_job(self, stock_id: int, file_path: str, file_format: str, file_size: int):
+        """Зарегистрировать загруженный файл и отдать его пулу воркеров"""
+        self.check_stock_id(stock_id)
+
+        job = IngestJobRepository(self.product_repo.session).create(dict(
+            merchant_id=self.merchant_id,
+            stock_id=stock_id,
+            file_path=file_path,
+            file_format=file_format,
+            file_size=file_size
+        ))
+        ingest_pool.submit(job.id)
+
+        return FastJSONResponse({
+            "status": "success",
+            "message": "Файл принят в обработку",
+            "data": self._job_data(job)
+        }, status_code=202)
+
+    def get_ingest_job(self, job_id: int):
+        job = IngestJobRepository(self.product_repo.session).get(job_id)
+        if job is None:
+            raise HTTPException(
+                status_code=404,
+                detail="Задача загрузки не найдена"
+            )
+        if job.merchant_id != self.merchant_id:
+            raise HTTPException(
+                status_code=403,
+                detail="Задача загрузки принадлежит другому мерчанту"
+            )
+
+        return FastJSONResponse({
+            "status": "success",
+            "message": "Состояние задачи загрузки",
+            "data": self._job_data(job)
+        })
+
+    @staticmethod
+    def _job_data(job: IngestJob) -> Dict:
+        rows_per_second = None
+        last_progress = job.finished_at or job.heartbeat_at
+        if job.started_at and last_progress:
+            elapsed = (last_progress - job.started_at).total_seconds()
+            if elapsed > 0:
+                rows_per_second = round(job.rows_processed / elapsed, 1)
+
+        return {
+            "id": job.id,
+            "stock_id": job.stock_id,
+            "status": job.status,
+            "file_format": job.file_format,
+            "file_size": job.file_size,
+            "processed_bytes": job.checkpoint_offset,
+            "progress": 1.0 if job.status == 'done' else round(job.checkpoint_offset / job.file_size, 4) if job.file_size else 0.0,
+            "rows_processed": job.rows_processed,
+            "inserted": job.inserted,
+            "updated": job.updated,
+            "rejected": job.rejected,
+            "rows_per_second": rows_per_second,
+            "errors": job.errors,
+            "error": job.error,
+            "created_at": job.created_at,
+            "started_at": job.started_at,
+            "finished_at": job.finished_at
+        }
+
+    def get_stock_inventory(self, stock_id: int, limit: int, cursor: Optional[str] = None, since: Optional[str] = None):
+        """
+        Выгрузка склада страницами; с since - только строки, измененные после выдачи этого токена.
+        Курсор хранит горизонт первой страницы: change_token одинаков на всех страницах одной выгрузки.
+        """
+        self.check_stock_id(stock_id)
+
+        mode, since_seq, horizon, after = "inventory", None, None, None
         try:
-            self.product_repo.update_product(sku_id=sku_id, data=dict(data))
+            if since:
+                mode = "changes"
+                token_stock_id, since_seq = decode_cursor(since, "since", (int, int))
+                if token_stock_id != stock_id:
+                    raise ValueError("token issued for another stock")
+            if cursor:
+                horizon, after = decode_cursor(cursor, mode, (int, list))
+                # Ключ страницы: [sku_id] для выгрузки, [change_seq, sku_id] для изменений
+                if len(after) != (2 if since else 1) or not all(
+                    isinstance(value, int) and not isinstance(value, bool) for value in after
+                ):
+                    raise ValueError("malformed cursor key")
+        except ValueError:
+            raise HTTPException(
+                status_code=400,
+                detail="Некорректный cursor или since"
+            )
+
+        items, next_key, page_horizon = self.product_repo.get_stock_inventory(stock_id, limit, after, since_seq)
+        if horizon is None:
+            horizon = page_horizon
+
+        return FastJSONResponse({
+            "status": "success",
+            "message": "Остатки склада",
+            "data": {
+                "items": items,
+                "next_cursor": encode_cursor(mode, [horizon, next_key]) if next_key is not None else None,
+                "has_more": next_key is not None,
+                "change_token": encode_cursor("since", [stock_id, horizon])
+            }
+        })
+
+    def _check_stock_ids(self, stock_ids):
+        foreign = set(stock_ids) - set(self.product_repo.get_merchant_stock_ids(self.merchant_id))
+        if foreign:
+            raise HTTPException(
+                status_code=403,
+                detail=f"wrong stock id: {', '.join(map(str, sorted(foreign)))}"
+            )
+
+    def queue_stock_updates(self, request: StockUpdatesRequest):
+        """Поставить изменения остатков в очередь: в базу их пачками запишет потребитель"""
+        self._check_stock_ids(change.stock_id for change in request.changes)
+
+        message_ids = stock_queue.publish([
+            {"merchant_id": self.merchant_id, **change.model_dump()} for change in request.changes
+        ])
+
+        return FastJSONResponse({
+            "status": "success",
+            "message": "Изменения остатков поставлены в очередь",
+            "data": {"queued": len(message_ids)}
+        }, status_code=202)
+
+    @staticmethod
+    def get_stock_queue_stats():
+        """Счетчики потребителя очереди остатков и отставание от очереди"""
+        return FastJSONResponse({
+            "status": "success",
+            "message": "Статистика очереди остатков",
+            "data": stock_consumer.stats()
+        })
+
+    def sync_stock(self, request: StockSyncRequest):
+        """Delta-синхронизация остатков: только изменившиеся позиции, версия строго возрастает"""
+        self._check_stock_ids(change.stock_id for change in request.changes)
+
+        result = self.product_repo.sync_stock(
+            self.merchant_id,
+            request.version,
+            [(change.product_ean, change.stock_id, change.price, change.amount) for change in request.changes]
+        )
+
+        if result["status"] == "stale":
+            raise HTTPException(
+                status_code=409,
+                detail=f"Версия {request.version} устарела: уже применена версия {result['version']}"
+            )
 
-        except Exception as e:
-            print(e)
-            raise
+        if result["status"] == "duplicate":
+            return FastJSONResponse({
+                "status": "success",
+                "message": "Версия уже применена",
+                "data": {"version": result["version"], "applied": 0, "duplicate": True, "not_found": []}
+            })
 
+        return FastJSONResponse({
+            "status": "success",
+            "message": "Изменения остатков применены",
+            "data": {
+                "version": result["version"],
+                "applied": result["applied"],
+                "duplicate": False,
+                "not_found": result["not_found"]
+            }
+        })
@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends
 from .service import *
 from .model import *
 from ..dependencies import get_order_service, get_item_service
+from ..responses import FastJSONResponse
 from typing import Dict, Any
 
 
@@ -19,7 +20,7 @@ def add_item_to_order(
     order_id: int,
     request: OrderItemCreateRequest,
     item_service: OrderItemService = Depends(get_item_service)
-) -> OrderItemCreateResponse:
+) -> FastJSONResponse:
     return item_service.add_item_to_order(order_id, request)
 
 @orders_router.put(
@@ -32,7 +33,7 @@ def update_order_item(
     item_id: int,
     request: OrderItemUpdateRequest,
     item_service: OrderItemService = Depends(get_item_service)
-) -> OrderItemUpdateResponse:
+) -> FastJSONResponse:
     return item_service.update_item_quantity(item_id, request)
 
 @orders_router.delete(
@@ -44,7 +45,7 @@ def update_order_item(
 def remove_order_item(
     item_id: int,
     item_service: OrderItemService = Depends(get_item_service)
-) -> OrderItemDeleteResponse:
+) -> FastJSONResponse:
     return item_service.remove_item_from_order(item_id)
 
 @orders_router.get(
@@ -56,7 +57,7 @@ def remove_order_item(
 def get_order_items(
     order_id: int,
     item_service: OrderItemService = Depends(get_item_service)
-) -> OrderItemsListResponse:
+) -> FastJSONResponse:
     return item_service.get_order_items(order_id)
 
 @orders_router.get(
@@ -68,7 +69,7 @@ def get_order_items(
 def get_order(
     order_id: int,
     order_service: OrderService = Depends(get_order_service)
-) -> OrderDetailResponse:
+) -> FastJSONResponse:
     return order_service.get_order(order_id)
 
 @orders_router.get(
@@ -79,7 +80,7 @@ def get_order(
 )
 def get_cart(
     order_service: OrderService = Depends(get_order_service)
-) -> CartResponse:
+) -> FastJSONResponse:
     return order_service.get_cart()
 
 @orders_router.post(
@@ -90,7 +91,7 @@ def get_cart(
 )
 def cart_create(
     order_service: OrderService = Depends(get_order_service)
-) -> OrderCreateResponse:
+) -> FastJSONResponse:
     return order_service.create_cart()
 
 @orders_router.post(
@@ -102,7 +103,7 @@ def cart_create(
 def create_order_from_cart(
     request: OrderCreateInfo,
     order_service: OrderService = Depends(get_order_service)
-) -> OrderResponse:
+) -> FastJSONResponse:
     return order_service.create_order(request)
 
 @orders_router.get(
@@ -115,7 +116,7 @@ def get_user_orders(
     limit: int = 50,
     offset: int = 0,
     order_service: OrderService = Depends(get_order_service)
-) -> OrdersListResponse:
+) -> FastJSONResponse:
     return order_service.get_user_orders(limit, offset)
 
 @orders_router.delete(
@@ -127,5 +128,5 @@ def get_user_orders(
 def delete_order(
     order_id: int,
     order_service: OrderService = Depends(get_order_service)
-) -> OrderDeleteResponse:
+) -> FastJSONResponse:
     return order_service.delete_order(order_id)
\ No newline at end of file
@@ -1,4 +1,5 @@
 from starlette.responses import JSONResponse
+from ..responses import FastJSONResponse
 from ..database.repository import *
 from fastapi import HTTPException, status
 from .model import *
@@ -27,7 +28,7 @@ class OrderItemService:
                 detail='you can not edit this order'
             )
 
-    def add_item_to_order(self, order_id: int, request: OrderItemCreateRequest) -> OrderItemCreateResponse:
+    def add_item_to_order(self, order_id: int, request: OrderItemCreateRequest) -> FastJSONResponse:
         self.check_order(order_id)
         try:
             # Проверяем существование заказа
@@ -56,15 +57,16 @@ class OrderItemService:
             # Добавляем товар в заказ
             item = self.item_repo.add_item(order_id, request.sku_id, request.quantity)
 
-            return OrderItemCreateResponse(
+            return FastJSONResponse(dict(
+                status="success",
                 message="Товар успешно добавлен в заказ",
-                data=OrderItemData(
+                data=dict(
                     item_id=item.id,
                     order_id=item.order_id,
                     sku_id=item.sku_id,
                     quantity=item.quantity
                 )
-            )
+            ), status_code=status.HTTP_201_CREATED)
 
         except HTTPException:
             raise
@@ -74,7 +76,7 @@ class OrderItemService:
                 detail=f"Ошибка при добавлении товара в заказ: {str(e)}"
             )
 
-    def update_item_quantity(self, item_id: int, request: OrderItemUpdateRequest) -> OrderItemUpdateResponse:
+    def update_item_quantity(self, item_id: int, request: OrderItemUpdateRequest) -> FastJSONResponse:
         try:
             # Проверяем существование элемента
             item = self.item_repo.get_item_by_id(item_id)
@@ -97,13 +99,14 @@ class OrderItemService:
             # Обновляем количество
             updated_item = self.item_repo.update_item_quantity(item_id, request.quantity)
 
-            return OrderItemUpdateResponse(
+            return FastJSONResponse(dict(
+                status="success",
                 message="Количество товара обновлено",
-                data=OrderItemUpdateData(
+                data=dict(
                     item_id=updated_item.id,
                     quantity=updated_item.quantity
                 )
-            )
+            ))
 
         except HTTPException:
             raise
@@ -113,7 +116,7 @@ class OrderItemService:
                 detail=f"Ошибка при обновлении товара в заказе: {str(e)}"
             )
 
-    def remove_item_from_order(self, item_id: int) -> OrderItemDeleteResponse:
+    def remove_item_from_order(self, item_id: int) -> FastJSONResponse:
         try:
             item = self.item_repo.get_item_by_id(item_id)
             if not item:
@@ -132,9 +135,10 @@ class OrderItemService:
                     detail="Не удалось удалить товар из заказа"
                 )
 
-            return OrderItemDeleteResponse(
+            return FastJSONResponse(dict(
+                status="success",
                 message="Товар успешно удален из заказа"
-            )
+            ))
 
         except HTTPException:
             raise
@@ -144,7 +148,7 @@ class OrderItemService:
                 detail=f"Ошибка при удалении товара из заказа: {str(e)}"
             )
 
-    def get_order_items(self, order_id: int) -> OrderItemsListResponse:
+    def get_order_items(self, order_id: int) -> FastJSONResponse:
         self.check_order(order_id)
         try:
             items = self.item_repo.get_order_items(order_id)
@@ -158,7 +162,7 @@ class OrderItemService:
                 item_total = product_stock.price * item.quantity
                 total_amount += item_total
 
-                items_data.append(OrderItemResponse(
+                items_data.append(dict(
                     id=item.id,
                     order_id=item.order_id,
                     sku_id=item.sku_id,
@@ -169,15 +173,16 @@ class OrderItemService:
                     total_price=item_total
                 ))
 
-            return OrderItemsListResponse(
+            return FastJSONResponse(dict(
+                status="success",
                 message="Товары заказа успешно получены",
-                data=OrderItemsData(
+                data=dict(
                     order_id=order_id,
                     items=items_data,
                     total_amount=total_amount,
                     total_items=len(items_data)
                 )
-            )
+            ))
 
         except Exception as e:
             raise HTTPException(
@@ -209,7 +214,7 @@ class OrderService:
                 detail="fail to change order status"
             )
 
-    def create_cart(self) -> OrderCreateResponse:
+    def create_cart(self) -> FastJSONResponse:
         cart = self.order_repo.get_cart(self.user_id)
 
         if cart:
@@ -222,15 +227,18 @@ class OrderService:
             # Создаем заказ
             order = self.order_repo.create_cart(self.user_id)
 
-            return OrderCreateResponse(
+            return FastJSONResponse(dict(
+                status="success",
                 message="Корзина успешно создана",
-                data=OrderCreateData(
+                data=dict(
                     order_id=order.id,
                     user_id=self.user_id,
+                    address=order.address,
                     created_at=order.created_at,
+                    delivery_method=order.delivery_method,
                     status="unconfirmed"
                 )
-            )
+            ))
 
         except Exception as e:
             raise HTTPException(
@@ -238,7 +246,7 @@ class OrderService:
                 detail=f"Ошибка при создании заказа: {str(e)}"
             )
 
-    def create_order(self, request: OrderCreateInfo) -> OrderResponse:
+    def create_order(self, request: OrderCreateInfo) -> FastJSONResponse:
         cart = self.order_repo.get_cart(self.user_id)
 
         # проверки на принадлежность и существование корзины
@@ -251,9 +259,9 @@ class OrderService:
             address=request.address
         )
 
-        return self._format_order_response(order)
+        return FastJSONResponse(self._format_order_response(order))
 
-    def get_order(self, order_id: int) -> OrderDetailResponse:
+    def get_order(self, order_id: int) -> FastJSONResponse:
         try:
             order = self.order_repo.get_order_by_id(order_id)
 
@@ -262,10 +270,11 @@ class OrderService:
 
             order_data = self._format_order_response(order)
 
-            return OrderDetailResponse(
+            return FastJSONResponse(dict(
+                status="success",
                 message="Информация о заказе успешно получена",
                 data={"order": order_data}
-            )
+            ))
 
         except HTTPException:
             raise
@@ -275,7 +284,7 @@ class OrderService:
                 detail=f"Ошибка при получении информации о заказе: {str(e)}"
             )
 
-    def get_cart(self) -> CartResponse:
+    def get_cart(self) -> FastJSONResponse:
         try:
             cart = self.order_repo.get_cart(self.user_id)
             if not cart:
@@ -286,7 +295,7 @@ class OrderService:
 
             cart_data = self._format_cart_response(cart)
 
-            return cart_data
+            return FastJSONResponse(cart_data)
 
         except HTTPException:
             raise
@@ -296,7 +305,7 @@ class OrderService:
                 detail=f"Ошибка при получении корзины: {str(e)}"
             )
 
-    def get_user_orders(self, limit: int = 50, offset: int = 0) -> OrdersListResponse:
+    def get_user_orders(self, limit: int = 50, offset: int = 0) -> FastJSONResponse:
         """Получить историю заказов пользователя"""
         try:
             orders, total_count = self.order_repo.get_user_orders(self.user_id, limit, offset)
@@ -305,15 +314,16 @@ class OrderService:
             for order in orders:
                 orders_data.append(self._format_order_response(order))
 
-            return OrdersListResponse(
+            return FastJSONResponse(dict(
+                status="success",
                 message="История заказов успешно получена",
-                data=OrderListData(
+                data=dict(
                     orders=orders_data,
                     total_count=total_count,
                     limit=limit,
                     offset=offset
                 )
-            )
+            ))
 
         except Exception as e:
             raise HTTPException(
@@ -321,7 +331,7 @@ class OrderService:
                 detail=f"Ошибка при получении истории заказов: {str(e)}"
             )
 
-    def delete_order(self, order_id: int) -> OrderDeleteResponse:
+    def delete_order(self, order_id: int) -> FastJSONResponse:
         order = self.order_repo.get_order_by_id(order_id)
 
         self.check_order_found(order)
@@ -337,9 +347,10 @@ class OrderService:
                     detail=f"Delete error"
                 )
 
-            return OrderDeleteResponse(
+            return FastJSONResponse(dict(
+                status="success",
                 message="Заказ успешно удален"
-            )
+            ))
 
         except HTTPException:
             raise
@@ -349,8 +360,8 @@ class OrderService:
                 detail=f"Ошибка при удалении заказа: {str(e)}"
             )
 
-    def _format_order_response(self, order: Orders) -> OrderResponse:
-        """Форматировать ответ с информацией о заказе"""
+    def _format_order_response(self, order: Orders) -> Dict[str, Any]:
+        """Форматировать ответ с информацией о заказе (доверенные данные из БД, без валидации)"""
         items_data = []
         total_amount = 0.0
 
@@ -359,7 +370,7 @@ class OrderService:
             item_total = product_stock.price * item.quantity
             total_amount += item_total
 
-            items_data.append(OrderItemResponse(
+            items_data.append(dict(
                 id=item.id,
                 order_id=item.order_id,
                 sku_id=item.sku_id,
@@ -370,7 +381,7 @@ class OrderService:
                 total_price=item_total
             ))
 
-        return OrderResponse(
+        return dict(
             id=order.id,
             user_id=order.user_id,
             created_at=order.created_at,
@@ -382,7 +393,7 @@ class OrderService:
             status=order.status
         )
 
-    def _format_cart_response(self, order: Orders) -> CartResponse:
+    def _format_cart_response(self, order: Orders) -> Dict[str, Any]:
         """Форматировать ответ с информацией о корзине"""
         items_data = []
         total_amount = 0.0
@@ -392,7 +403,7 @@ class OrderService:
             item_total = product_stock.price * item.quantity
             total_amount += item_total
 
-            items_data.append(OrderItemResponse(
+            items_data.append(dict(
                 id=item.id,
                 order_id=item.order_id,
                 sku_id=item.sku_id,
@@ -403,7 +414,7 @@ class OrderService:
                 total_price=item_total
             ))
 
-        return CartResponse(
+        return dict(
             id=order.id,
             user_id=order.user_id,
             created_at=order.created_at,
@@ -4,11 +4,13 @@ from typing import List, Optional
 from .service import ProductFeedService
 from .model import (
     ProductFeedRequest, ProductFeedResponse, CategoriesListResponse,
-    MerchantsListResponse, ProductOffersListResponse, SortOptions
+    MerchantsListResponse, ProductOffersListResponse, SortOptions, CountModes, ExportFormats,
+    SearchIndexStatsResponse, SuggestionsListResponse, BatchOffersRequest, BatchOffersListResponse
 )
+from .http_cache import CatalogRoute
 from ..database.core import get_db
 
-product_router = APIRouter()
+product_router = APIRouter(route_class=CatalogRoute)
 
 @product_router.get(
     "/products/feed",
@@ -25,6 +27,10 @@ def get_products_feed(
     sort_by: SortOptions = Query(SortOptions.PRICE, description="Поле для сортировки"),
     user_lat: Optional[float] = Query(None, description="Широта пользователя"),
     user_long: Optional[float] = Query(None, description="Долгота пользователя"),
+    max_distance_km: Optional[float] = Query(None, gt=0, description="Только склады в этом радиусе от пользователя, км"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (next_cursor), заменяет offset"),
+    facets: bool = Query(False, description="Вернуть количество товаров по категориям, магазинам и ценам"),
+    count_mode: CountModes = Query(CountModes.EXACT, description="Подсчет total_count: точно, из кэша или оценкой планировщика"),
     db: Session = Depends(get_db)
 ):
     merchant_ids_list = None
@@ -45,7 +51,11 @@ def get_products_feed(
         merchant_ids=merchant_ids_list,
         sort_by=sort_by,
         user_lat=user_lat,
-        user_long=user_long
+        user_long=user_long,
+        max_distance_km=max_distance_km,
+        cursor=cursor,
+        facets=facets,
+        count_mode=count_mode
     )
 
     feed_service = ProductFeedService(db)
@@ -71,6 +81,27 @@ def get_merchants(db: Session = Depends(get_db)):
     feed_service = ProductFeedService(db)
     return feed_service.get_merchants()
 
+@product_router.get(
+    "/products/export",
+    summary="Выгрузка каталога",
+    description="Все товары с предложениями потоком в NDJSON или CSV"
+)
+def export_catalog(
+    format: ExportFormats = Query(ExportFormats.NDJSON, description="Формат выгрузки"),
+    category: Optional[str] = Query(None, description="Фильтр по категории")
+):
+    return ProductFeedService.export_catalog(format, category)
+
+@product_router.post(
+    "/products/offers:batch",
+    response_model=BatchOffersListResponse,
+    summary="Получить предложения для нескольких товаров",
+    description="Предложения с расстояниями для списка EAN (до 100) одним запросом; ненайденные товары помечаются found=false"
+)
+def get_products_offers_batch(request: BatchOffersRequest, db: Session = Depends(get_db)):
+    feed_service = ProductFeedService(db)
+    return feed_service.find_offers_batch(request)
+
 @product_router.get(
     "/products/{ean}/offers",
     response_model=ProductOffersListResponse,
@@ -90,13 +121,47 @@ def get_product_offers(
     "/products/search",
     response_model=ProductFeedResponse,
     summary="Поиск товаров",
-    description="Поиск товаров по названию или категории"
+    description="Полнотекстовый поиск товаров по названию или категории с сортировкой по релевантности"
 )
 def search_products(
     q: str = Query(..., description="Поисковый запрос", min_length=1),
     offset: int = Query(0, ge=0, description="Смещение для пагинации"),
     limit: int = Query(20, ge=1, le=100, description="Лимит товаров на странице"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (next_cursor), заменяет offset"),
+    sort_by: SortOptions = Query(SortOptions.RELEVANCE, description="Поле для сортировки"),
+    db: Session = Depends(get_db)
+):
+    feed_service = ProductFeedService(db)
+    return feed_service.search_products(q, offset, limit, cursor, sort_by)
+
+@product_router.get(
+    "/products/suggest",
+    response_model=SuggestionsListResponse,
+    summary="Подсказки для поиска",
+    description="Названия товаров и категории по префиксу, популярные (в наличии) первыми"
+)
+def suggest_products(
+    q: str = Query(..., description="Начало поискового запроса", min_length=1),
+    limit: int = Query(10, ge=1, le=20, description="Количество подсказок"),
     db: Session = Depends(get_db)
 ):
     feed_service = ProductFeedService(db)
-    return feed_service.search_products(q, offset, limit)
\ No newline at end of file
+    return feed_service.suggest(q, limit)
+
+@product_router.get(
+    "/products/search/stats",
+    response_model=SearchIndexStatsResponse,
+    summary="Статистика поискового индекса",
+    description="Размер инвертированного индекса и время его построения"
+)
+def get_search_stats(db: Session = Depends(get_db)):
+    feed_service = ProductFeedService(db)
+    return feed_service.get_search_stats()
+
+@product_router.get(
+    "/products/cache/stats",
+    summary="Статистика кэша каталога",
+    description="Попадания, промахи и вытеснения L1 (процесс) и L2 (Redis)"
+)
+def get_cache_stats():
+    return ProductFeedService.get_cache_stats()
@@ -0,0 +1,38 @@
+import base64
+import json
+from typing import List, Optional, Tuple
+
+# Типы элементов ключа: число (цена, расстояние, скор, позиция) и строка (название)
+NUMBER = (int, float)
+
+
+def encode_cursor(sort_by: str, key: Optional[List]) -> Optional[str]:
+    """Упаковать ключ сортировки последнего товара страницы в непрозрачный курсор"""
+    if key is None:
+        return None
+
+    payload = json.dumps({"s": sort_by, "k": list(key)}, ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str, key_types: Tuple) -> List:
+    """
+    Распаковать курсор; ValueError если он поврежден, выдан для другой сортировки
+    или элементы ключа не тех типов (key_types - допустимые типы по позициям)
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        key = payload["k"]
+        cursor_sort = payload["s"]
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError("malformed cursor") from e
+
+    if cursor_sort != sort_by or not isinstance(key, list) or len(key) != 2:
+        raise ValueError("cursor does not match sort order")
+
+    for value, types in zip(key, key_types):
+        if isinstance(value, bool) or not isinstance(value, types):
+            raise ValueError("cursor key has wrong type")
+
+    return key
@@ -0,0 +1,66 @@
+import csv
+import io
+from itertools import groupby
+from typing import Iterator, Optional
+
+from ..database.core import SessionLocal
+from ..database.repository import ProductFeedRepository
+from ..responses import dumps
+
+# Строк из курсора за один fetch и в одном куске ответа
+EXPORT_BATCH_SIZE = 1000
+
+PRODUCT_FIELDS = ('ean', 'name', 'category', 'weight')
+OFFER_FIELDS = (
+    'sku_id', 'price', 'amount', 'merchant_id', 'merchant_name',
+    'stock_id', 'stock_address', 'stock_lat', 'stock_long'
+)
+
+
+def _catalog_rows(category: Optional[str]):
+    """
+    Строки каталога из собственной сессии: сессия запроса закрывается
+    раньше, чем StreamingResponse дочитает генератор
+    """
+    with SessionLocal() as session:
+        yield from ProductFeedRepository(session).iter_catalog(category, EXPORT_BATCH_SIZE)
+
+
+def export_ndjson(category: Optional[str] = None) -> Iterator[bytes]:
+    """Одна строка JSON на товар, предложения - массивом offers"""
+    chunk = []
+    for ean, rows in groupby(_catalog_rows(category), key=lambda row: row['ean']):
+        rows = list(rows)
+        product = {field: rows[0][field] for field in PRODUCT_FIELDS}
+        product['offers'] = [
+            {field: row[field] for field in OFFER_FIELDS}
+            for row in rows if row['sku_id'] is not None
+        ]
+        chunk.append(dumps(product))
+
+        if len(chunk) >= EXPORT_BATCH_SIZE:
+            yield b"\n".join(chunk) + b"\n"
+            chunk = []
+
+    if chunk:
+        yield b"\n".join(chunk) + b"\n"
+
+
+def export_csv(category: Optional[str] = None) -> Iterator[bytes]:
+    """Одна строка CSV на предложение; товар без предложений - строка с пустыми полями предложения"""
+    columns = PRODUCT_FIELDS + OFFER_FIELDS
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+
+    rows = 0
+    for row in _catalog_rows(category):
+        writer.writerow([row[column] for column in columns])
+        rows += 1
+
+        if rows % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue().encode()
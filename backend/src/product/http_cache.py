@@ -0,0 +1,66 @@
+import hashlib
+import json
+import os
+from typing import Callable, Dict, Optional
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+
+# Cache-Control по маршрутам каталога; время жизни согласовано с кэшем каталога и справочников.
+# Переопределяется JSON-объектом в CATALOG_CACHE_CONTROL: {"/products/feed": "public, max-age=30"}
+ROUTE_CACHE_CONTROL: Dict[str, str] = {
+    "/products/feed": "public, max-age=5",
+    "/products/search": "public, max-age=5",
+    "/products/{ean}/offers": "public, max-age=5",
+    "/products/suggest": "public, max-age=60",
+    "/products/categories": "public, max-age=300, stale-while-revalidate=3600",
+    "/products/merchants": "public, max-age=300, stale-while-revalidate=3600",
+    **json.loads(os.getenv("CATALOG_CACHE_CONTROL", "{}"))
+}
+DEFAULT_CACHE_CONTROL = "no-store"
+
+
+def make_etag(body: bytes) -> str:
+    """Сильный ETag - хэш тела ответа"""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match сравнивается слабо (RFC 9110): префикс W/ не учитывается"""
+    if not if_none_match:
+        return False
+
+    if if_none_match.strip() == "*":
+        return True
+
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+def conditional_response(request: Request, response: Response, cache_control: str) -> Response:
+    """Проставить ETag и Cache-Control успешному GET; при совпадении If-None-Match - 304 без тела"""
+    if request.method not in ("GET", "HEAD") or response.status_code != 200 or not hasattr(response, "body"):
+        return response
+
+    etag = make_etag(response.body)
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return response
+
+
+class CatalogRoute(APIRoute):
+    """Маршрут каталога с условными запросами: ETag, If-None-Match и Cache-Control по пути"""
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        cache_control = ROUTE_CACHE_CONTROL.get(self.path, DEFAULT_CACHE_CONTROL)
+
+        async def route_handler(request: Request) -> Response:
+            response = await handler(request)
+            return conditional_response(request, response, cache_control)
+
+        return route_handler
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from enum import Enum
 
@@ -6,6 +6,16 @@ class SortOptions(str, Enum):
     PRICE = "price"
     DISTANCE = "distance"
     BEST_VALUE = "best_value"
+    RELEVANCE = "relevance"
+
+class CountModes(str, Enum):
+    EXACT = "exact"
+    CACHED = "cached"
+    ESTIMATE = "estimate"
+
+class ExportFormats(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
 
 class ProductFeedRequest(BaseModel):
     offset: int = 0
@@ -16,6 +26,11 @@ class ProductFeedRequest(BaseModel):
     sort_by: SortOptions = SortOptions.PRICE
     user_lat: Optional[float] = None
     user_long: Optional[float] = None
+    max_distance_km: Optional[float] = None
+    cursor: Optional[str] = None
+    eans: Optional[List[int]] = None
+    facets: bool = False
+    count_mode: CountModes = CountModes.EXACT
 
 class ProductOffer(BaseModel):
     sku_id: int
@@ -49,17 +64,73 @@ class ProductOffersResponse(BaseModel):
     offers: List[ProductOffer]
     best_offer: Optional[ProductOffer] = None
 
+class BatchOffersRequest(BaseModel):
+    eans: List[int] = Field(..., min_length=1, max_length=100)
+    user_lat: float
+    user_long: float
+
+class BatchOffersItem(BaseModel):
+    ean: int
+    found: bool
+    product: Optional[ProductInfo] = None
+    offers: List[ProductOffer] = []
+    best_offer: Optional[ProductOffer] = None
+
+class BatchOffersResponse(BaseModel):
+    results: List[BatchOffersItem]
+
 class CategoriesResponse(BaseModel):
     categories: List[str]
 
 class MerchantsResponse(BaseModel):
     merchants: List[Dict[str, Any]]
 
+class Suggestion(BaseModel):
+    text: str
+    type: str
+    ean: Optional[int] = None
+    offers: int
+
+class SuggestionsResponse(BaseModel):
+    suggestions: List[Suggestion]
+
+class SearchIndexStats(BaseModel):
+    built: bool
+    documents: int
+    terms: int
+    postings: int
+    trigrams: int
+    build_time_ms: float
+    built_at: Optional[float] = None
+    incremental_updates: int
+
+class CategoryFacet(BaseModel):
+    category: Optional[str] = None
+    count: int
+
+class MerchantFacet(BaseModel):
+    merchant_id: int
+    merchant_name: str
+    count: int
+
+class PriceBucketFacet(BaseModel):
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    count: int
+
+class FeedFacets(BaseModel):
+    categories: List[CategoryFacet]
+    merchants: List[MerchantFacet]
+    price_buckets: List[PriceBucketFacet]
+
 class ProductFeedData(BaseModel):
     products: List[ProductFeedItem]
     total_count: int
     offset: int
     limit: int
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+    facets: Optional[FeedFacets] = None
 
 # Main Response Models
 class SuccessResponse(BaseModel):
@@ -76,4 +147,13 @@ class MerchantsListResponse(SuccessResponse):
     data: MerchantsResponse
 
 class ProductOffersListResponse(SuccessResponse):
-    data: ProductOffersResponse
\ No newline at end of file
+    data: ProductOffersResponse
+
+class BatchOffersListResponse(SuccessResponse):
+    data: BatchOffersResponse
+
+class SuggestionsListResponse(SuccessResponse):
+    data: SuggestionsResponse
+
+class SearchIndexStatsResponse(SuccessResponse):
+    data: SearchIndexStats
\ No newline at end of file
@@ -0,0 +1,128 @@
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from pydantic import BaseModel
+
+
+class RankingWeights(BaseModel):
+    """
+    Веса best_value. Цена и расстояние штрафуют, остаток на складе и
+    предпочтение магазина (merchant_scores, 0..1) поощряют. Чем меньше скор, тем лучше.
+    """
+    price: float = 0.7
+    distance: float = 0.3
+    stock: float = 0.0
+    merchant: float = 0.0
+    merchant_scores: Dict[int, float] = {}
+
+
+DEFAULT_WEIGHTS = RankingWeights(
+    price=float(os.getenv("RANKING_WEIGHT_PRICE", "0.7")),
+    distance=float(os.getenv("RANKING_WEIGHT_DISTANCE", "0.3")),
+    stock=float(os.getenv("RANKING_WEIGHT_STOCK", "0")),
+    merchant=float(os.getenv("RANKING_WEIGHT_MERCHANT", "0"))
+)
+
+
+class OfferCandidates(BaseModel):
+    """Все предложения отфильтрованной выдачи в виде столбцов"""
+    model_config = {"arbitrary_types_allowed": True}
+
+    eans: np.ndarray
+    sku_ids: np.ndarray
+    prices: np.ndarray
+    amounts: np.ndarray
+    merchant_ids: np.ndarray
+    distances: np.ndarray
+
+    @classmethod
+    def from_rows(cls, rows: List[Tuple]) -> "OfferCandidates":
+        """rows: (ean, sku_id, price, amount, merchant_id, distance_km)"""
+        columns = list(zip(*rows)) if rows else [()] * 6
+        return cls(
+            eans=np.array(columns[0], dtype=np.int64),
+            sku_ids=np.array(columns[1], dtype=np.int64),
+            prices=np.array(columns[2], dtype=np.float64),
+            amounts=np.array(columns[3], dtype=np.float64),
+            merchant_ids=np.array(columns[4], dtype=np.int64),
+            distances=np.array(columns[5], dtype=np.float64)
+        )
+
+
+def _scaled(values: np.ndarray) -> np.ndarray:
+    """Деление на максимум по набору, максимум считается один раз. Неизвестное значение (NaN) - худшее, 1"""
+    known = ~np.isnan(values)
+    peak = values[known].max() if known.any() else 0.0
+    if peak <= 0:
+        return np.where(known, 0.0, 1.0) if known.any() else np.zeros_like(values)
+    return np.where(known, values / peak, 1.0)
+
+
+def score_offers(candidates: OfferCandidates, weights: RankingWeights = DEFAULT_WEIGHTS) -> np.ndarray:
+    """Скор каждого предложения: нормализация один раз на набор, дальше - векторная арифметика"""
+    scores = weights.price * _scaled(candidates.prices)
+
+    if weights.distance:
+        scores += weights.distance * _scaled(candidates.distances)
+
+    if weights.stock:
+        scores -= weights.stock * _scaled(candidates.amounts)
+
+    if weights.merchant and weights.merchant_scores:
+        preference = np.array(
+            [weights.merchant_scores.get(merchant_id, 0.0) for merchant_id in candidates.merchant_ids.tolist()],
+            dtype=np.float64
+        )
+        scores -= weights.merchant * preference
+
+    return scores
+
+
+def rank_products(candidates: OfferCandidates, scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Лучший (минимальный) скор предложения на товар: (eans, scores) по уникальным EAN"""
+    if not len(scores):
+        return np.empty(0, dtype=np.int64), np.empty(0)
+
+    eans, inverse = np.unique(candidates.eans, return_inverse=True)
+    best = np.full(len(eans), np.inf)
+    np.minimum.at(best, inverse, scores)
+    return eans, best
+
+
+def top_products(eans: np.ndarray, scores: np.ndarray, limit: int,
+                 offset: int = 0, after: Optional[List] = None) -> Tuple[List[int], List[float]]:
+    """
+    Следующие limit товаров в порядке (score, ean): после ключа after (keyset)
+    или после offset. Отбор через np.partition, сортируется только сама страница.
+    """
+    if after is not None:
+        after_score, after_ean = after
+        mask = (scores > after_score) | ((scores == after_score) & (eans > after_ean))
+        eans, scores = eans[mask], scores[mask]
+        offset = 0
+
+    wanted = offset + limit
+    if wanted < len(scores):
+        # При равных скорах граница argpartition может разрезать группу - берем ее целиком
+        threshold = np.partition(scores, wanted - 1)[wanted - 1]
+        selected = np.flatnonzero(scores <= threshold)
+    else:
+        selected = np.arange(len(scores))
+
+    order = selected[np.lexsort((eans[selected], scores[selected]))][offset:wanted]
+    return eans[order].tolist(), scores[order].tolist()
+
+
+def sort_offers(offers: List[Dict], weights: RankingWeights = DEFAULT_WEIGHTS) -> List[Dict]:
+    """Отсортировать предложения одного товара по best_value за один проход нормализации"""
+    if not offers:
+        return []
+
+    candidates = OfferCandidates.from_rows([
+        (0, offer['sku_id'], offer['price'], offer['amount'], offer['merchant_id'],
+         offer['distance_km'] if offer.get('distance_km') is not None else np.nan)
+        for offer in offers
+    ])
+    scores = score_offers(candidates, weights)
+    return [offers[i] for i in np.lexsort((candidates.sku_ids, scores)).tolist()]
@@ -1,16 +1,55 @@
-from fastapi.responses import JSONResponse
+import json
+from typing import Callable, Tuple
+from fastapi.responses import Response, StreamingResponse
 from fastapi import HTTPException, status
 from sqlalchemy.orm import Session
 from .model import *
+from .cursor import encode_cursor, decode_cursor, NUMBER
+from .export import export_ndjson, export_csv
 from ..database.repository import ProductFeedRepository
+from ..responses import FastJSONResponse
+from ..search.engine import search_engine
+from ..search.suggest import suggest_index
+from ..database.core import SessionLocal
+from ..cache.tiered import catalog_cache, ean_tag, merchant_tag
+from ..cache.reference import reference_cache, CATEGORIES, MERCHANTS
+
+# Знаков после запятой в координатах пользователя для ключа кэша (~100 м)
+LOCATION_PRECISION = 3
 
 class ProductFeedService:
     def __init__(self, db: Session):
         self.feed_repo = ProductFeedRepository(db)
 
     def get_products_feed(self, request: ProductFeedRequest):
+        request = self._quantize_location(request)
+
+        return self._cached(
+            self._cache_key("feed", request.model_dump(mode="json", exclude_none=True)),
+            lambda: self._products_feed_content(request),
+            lambda content: self._feed_tags(content, request.merchant_ids)
+        )
+
+    def _products_feed_content(self, request: ProductFeedRequest) -> Dict:
+        if request.max_distance_km is not None and (request.user_lat is None or request.user_long is None):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Для max_distance_km нужны user_lat и user_long"
+            )
+
+        cursor_sort, key_types = self._cursor_sort(request)
+        after = None
+        if request.cursor:
+            try:
+                after = decode_cursor(request.cursor, cursor_sort, key_types)
+            except ValueError:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Некорректный cursor"
+                )
+
         try:
-            products_data, total_count = self.feed_repo.get_products_feed(
+            products_data, total_count, next_key = self.feed_repo.get_products_feed(
                 offset=request.offset,
                 limit=request.limit,
                 search=request.search,
@@ -18,28 +57,38 @@ class ProductFeedService:
                 merchant_ids=request.merchant_ids,
                 sort_by=request.sort_by,
                 user_lat=request.user_lat,
-                user_long=request.user_long
+                user_long=request.user_long,
+                after=after,
+                eans=request.eans,
+                max_distance_km=request.max_distance_km,
+                count_mode=request.count_mode.value
             )
 
-            # Дополнительная сортировка на уровне сервиса для best_value
-            if request.sort_by == "best_value" and request.user_lat and request.user_long:
-                products_data = self._sort_products_by_best_value(products_data)
-
             response_data = {
                 "products": products_data,
                 "total_count": total_count,
                 "offset": request.offset,
-                "limit": request.limit
+                "limit": request.limit,
+                "next_cursor": encode_cursor(cursor_sort, next_key),
+                "has_more": next_key is not None
             }
 
-            return JSONResponse(
-                status_code=status.HTTP_200_OK,
-                content={
-                    "status": "success",
-                    "message": "Лента товаров успешно получена",
-                    "data": response_data
-                }
-            )
+            if request.facets:
+                response_data["facets"] = self.feed_repo.get_feed_facets(
+                    search=request.search,
+                    category=request.category,
+                    merchant_ids=request.merchant_ids,
+                    user_lat=request.user_lat,
+                    user_long=request.user_long,
+                    eans=request.eans,
+                    max_distance_km=request.max_distance_km
+                )
+
+            return {
+                "status": "success",
+                "message": "Лента товаров успешно получена",
+                "data": response_data
+            }
 
         except HTTPException:
             raise
@@ -50,25 +99,67 @@ class ProductFeedService:
             )
 
     @staticmethod
-    def _sort_products_by_best_value(products_data: List[Dict]) -> List[Dict]:
-        """Сортировать товары по лучшему предложению (best value)"""
+    def _cursor_sort(request: ProductFeedRequest) -> Tuple[str, Tuple]:
+        """
+        Имя сортировки для курсора и типы его ключа (значение сортировки, ean). Без координат
+        distance идет по названию, поэтому наличие координат входит в имя: курсор без них
+        не подойдет к запросу с ними.
+        """
+        has_location = bool(request.user_lat and request.user_long)
+        sort_by = request.sort_by.value
+        if sort_by == "distance":
+            value_type = NUMBER if has_location else str
+        elif sort_by == "relevance":
+            value_type = NUMBER if request.eans is not None or request.search else str
+        else:
+            value_type = NUMBER
+
+        return sort_by + (":geo" if has_location else ""), (value_type, int)
+
+    @staticmethod
+    def _cached(key: str, build: Callable[[], Dict], tags: Callable[[Dict], List[str]]) -> Response:
+        """Отдать ответ из кэша каталога или построить, сохранить с тегами и отдать"""
+        body = catalog_cache.get(key)
+        if body is not None:
+            return Response(content=body, media_type="application/json")
 
-        def get_product_score(product: Dict) -> float:
-            """Рассчитать скор для товара на основе лучшего предложения"""
-            if not product.get('best_offer'):
-                return float('inf')
+        content = build()
+        response = FastJSONResponse(status_code=status.HTTP_200_OK, content=content)
+        catalog_cache.set(key, response.body, tags(content))
 
-            best_offer = product['best_offer']
-            return best_offer['price']
+        return response
 
-        return sorted(products_data, key=get_product_score)
+    @staticmethod
+    def _cache_key(kind: str, params: Dict) -> str:
+        return kind + ":" + json.dumps(params, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+
+    @staticmethod
+    def _quantize_location(request: ProductFeedRequest) -> ProductFeedRequest:
+        """Округлить координаты (~100 м), чтобы соседние пользователи попадали в один ключ кэша"""
+        if request.user_lat is None or request.user_long is None:
+            return request
+
+        return request.model_copy(update={
+            "user_lat": round(request.user_lat, LOCATION_PRECISION),
+            "user_long": round(request.user_long, LOCATION_PRECISION)
+        })
+
+    @staticmethod
+    def _feed_tags(content: Dict, merchant_ids: Optional[List[int]]) -> List[str]:
+        """Теги страницы: EAN ее товаров и магазины из фильтра"""
+        tags = [ean_tag(product["ean"]) for product in content["data"]["products"]]
+        tags.extend(merchant_tag(merchant_id) for merchant_id in merchant_ids or ())
+        return tags
 
     def get_categories(self):
         """Получить список категорий"""
         try:
-            categories = self.feed_repo.get_categories()
+            categories = reference_cache.get(
+                CATEGORIES, self.feed_repo.session,
+                lambda session: ProductFeedRepository(session).get_categories()
+            )
 
-            return JSONResponse(
+            return FastJSONResponse(
                 status_code=status.HTTP_200_OK,
                 content={
                     "status": "success",
@@ -88,9 +179,12 @@ class ProductFeedService:
     def get_merchants(self):
         """Получить список мерчантов"""
         try:
-            merchants = self.feed_repo.get_merchants()
+            merchants = reference_cache.get(
+                MERCHANTS, self.feed_repo.session,
+                lambda session: ProductFeedRepository(session).get_merchants()
+            )
 
-            return JSONResponse(
+            return FastJSONResponse(
                 status_code=status.HTTP_200_OK,
                 content={
                     "status": "success",
@@ -108,6 +202,16 @@ class ProductFeedService:
             )
 
     def find_best_offers_for_product(self, ean: int, user_lat: float, user_long: float):
+        user_lat = round(user_lat, LOCATION_PRECISION)
+        user_long = round(user_long, LOCATION_PRECISION)
+
+        return self._cached(
+            self._cache_key("offers", {"ean": ean, "user_lat": user_lat, "user_long": user_long}),
+            lambda: self._product_offers_content(ean, user_lat, user_long),
+            lambda content: [ean_tag(ean)]
+        )
+
+    def _product_offers_content(self, ean: int, user_lat: float, user_long: float) -> Dict:
         try:
             product = self.feed_repo.get_product_with_offers(ean)
 
@@ -120,11 +224,6 @@ class ProductFeedService:
             offers = []
             for stock in product.stocks:
                 if stock.amount > 0:
-                    distance = self.feed_repo.calculate_distance(
-                        user_lat, user_long,
-                        stock.stock.lat, stock.stock.long
-                    )
-
                     offer = {
                         "sku_id": stock.sku_id,
                         "price": stock.price,
@@ -132,13 +231,14 @@ class ProductFeedService:
                         "merchant_id": stock.stock.merchant.id,
                         "merchant_name": stock.stock.merchant.name,
                         "stock_id": stock.stock_id,
-                        "stock_address": stock.address,
-                        "distance_km": round(distance, 2),
+                        "stock_address": stock.stock.address,
                         "stock_lat": stock.stock.lat,
                         "stock_long": stock.stock.long
                     }
                     offers.append(offer)
 
+            self.feed_repo.attach_distances([offers], user_lat, user_long)
+
             # Сортируем предложения по best_value
             sorted_offers = self.feed_repo._sort_product_offers(
                 offers, "best_value", user_lat, user_long
@@ -156,34 +256,100 @@ class ProductFeedService:
                 "best_offer": best_offer
             }
 
-            return JSONResponse(
+            return {
+                "status": "success",
+                "message": "Предложения для товара успешно получены",
+                "data": response_data
+            }
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Ошибка при поиске предложений для товара: {str(e)}"
+            )
+
+    def find_offers_batch(self, request: BatchOffersRequest):
+        """
+        Предложения для многих товаров: один запрос, один векторный расчет
+        расстояний на все предложения, сортировка по best_value внутри товара
+        """
+        # Координаты округляются так же, как в /products/{ean}/offers: расстояния совпадают
+        user_lat = round(request.user_lat, LOCATION_PRECISION)
+        user_long = round(request.user_long, LOCATION_PRECISION)
+
+        try:
+            eans = list(dict.fromkeys(request.eans))
+            products = self.feed_repo.get_products_with_offers(eans)
+
+            self.feed_repo.attach_distances(
+                [product['offers'] for product in products.values()], user_lat, user_long
+            )
+
+            results = []
+            for ean in eans:
+                product = products.get(ean)
+                if product is None:
+                    results.append({"ean": ean, "found": False, "product": None, "offers": [], "best_offer": None})
+                    continue
+
+                offers = self.feed_repo._sort_product_offers(product['offers'], "best_value", user_lat, user_long)
+                results.append({
+                    "ean": ean,
+                    "found": True,
+                    "product": product['product'],
+                    "offers": offers,
+                    "best_offer": offers[0] if offers else None
+                })
+
+            return FastJSONResponse(
                 status_code=status.HTTP_200_OK,
                 content={
                     "status": "success",
-                    "message": "Предложения для товара успешно получены",
-                    "data": response_data
+                    "message": "Предложения для товаров успешно получены",
+                    "data": {"results": results}
                 }
             )
 
-        except HTTPException:
-            raise
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Ошибка при поиске предложений для товара: {str(e)}"
+                detail=f"Ошибка при поиске предложений для товаров: {str(e)}"
             )
 
-    def search_products(self, query: str, offset: int = 0, limit: int = 20):
-        """Поиск товаров по названию или категории"""
+    def search_products(
+            self,
+            query: str,
+            offset: int = 0,
+            limit: int = 20,
+            cursor: Optional[str] = None,
+            sort_by: SortOptions = SortOptions.RELEVANCE
+    ):
+        """Поиск товаров по названию или категории через индекс в памяти процесса"""
         try:
-            request = ProductFeedRequest(
-                offset=offset,
-                limit=limit,
-                search=query,
-                sort_by="price"
-            )
+            params = {"q": query, "offset": offset, "limit": limit, "cursor": cursor, "sort_by": sort_by.value}
+
+            def build():
+                search_engine.ensure_built(self.feed_repo.session)
+                # Все найденные товары: лента сама сортирует и режет страницу, иначе total_count,
+                # курсор и сортировки по цене и расстоянию видели бы только самые релевантные
+                hits = search_engine.search(query)
 
-            return self.get_products_feed(request)
+                request = ProductFeedRequest(
+                    offset=offset,
+                    limit=limit,
+                    sort_by=sort_by,
+                    cursor=cursor,
+                    eans=[ean for ean, _ in hits]
+                )
+                return self._products_feed_content(request)
+
+            return self._cached(
+                self._cache_key("search", params),
+                build,
+                lambda content: self._feed_tags(content, None)
+            )
 
         except HTTPException:
             raise
@@ -191,4 +357,67 @@ class ProductFeedService:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Ошибка при поиске товаров: {str(e)}"
-            )
\ No newline at end of file
+            )
+
+    def suggest(self, query: str, limit: int = 10):
+        """Подсказки по префиксу из индекса в памяти"""
+        try:
+            suggest_index.ensure_fresh(self.feed_repo.session, SessionLocal)
+
+            return FastJSONResponse(
+                status_code=status.HTTP_200_OK,
+                content={
+                    "status": "success",
+                    "message": "Подсказки получены",
+                    "data": {
+                        "suggestions": suggest_index.suggest(query, limit)
+                    }
+                }
+            )
+
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Ошибка при получении подсказок: {str(e)}"
+            )
+
+    @staticmethod
+    def export_catalog(export_format: ExportFormats, category: Optional[str] = None) -> StreamingResponse:
+        """Выгрузка всего каталога потоком: NDJSON (товар на строку) или CSV (предложение на строку)"""
+        if export_format == ExportFormats.CSV:
+            return StreamingResponse(
+                export_csv(category),
+                media_type="text/csv; charset=utf-8",
+                headers={"Content-Disposition": 'attachment; filename="catalog.csv"'}
+            )
+
+        return StreamingResponse(
+            export_ndjson(category),
+            media_type="application/x-ndjson",
+            headers={"Content-Disposition": 'attachment; filename="catalog.ndjson"'}
+        )
+
+    @staticmethod
+    def get_cache_stats():
+        """Счетчики попаданий, промахов и вытеснений кэша каталога и справочников"""
+        return FastJSONResponse(
+            status_code=status.HTTP_200_OK,
+            content={
+                "status": "success",
+                "message": "Статистика кэша получена",
+                "data": {**catalog_cache.stats(), "reference": reference_cache.stats()}
+            }
+        )
+
+    def get_search_stats(self):
+        """Размер и время построения поискового индекса"""
+        search_engine.ensure_built(self.feed_repo.session)
+
+        return FastJSONResponse(
+            status_code=status.HTTP_200_OK,
+            content={
+                "status": "success",
+                "message": "Статистика поискового индекса получена",
+                "data": search_engine.stats()
+            }
+        )
@@ -0,0 +1,28 @@
+from typing import Any
+
+import orjson
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Сериализовать ответ один раз. Доверенные данные из БД собираются словарями
+    и пишутся orjson; pydantic-модели - их собственным сериализатором без валидации.
+    """
+    if isinstance(content, BaseModel):
+        # warnings=False: модель из model_construct не приводит типы, например строку статуса к Enum
+        return content.__pydantic_serializer__.to_json(content, warnings=False)
+
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+class FastJSONResponse(Response):
+    """
+    JSON-ответ, отдаваемый готовыми байтами. FastAPI не валидирует его повторно
+    по response_model: модель в декораторе остается только для документации.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
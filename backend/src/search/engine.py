@@ -0,0 +1,202 @@
+import bisect
+import math
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..database.models import Products
+from .text import analyze, trigrams, edit_distance
+
+# Вес поля в ранжировании: совпадение в названии важнее категории
+FIELD_WEIGHTS = {"name": 2.0, "category": 1.0}
+
+# Множители для неточных совпадений
+PREFIX_FACTOR = 0.8
+FUZZY_FACTOR = 0.6
+
+
+class SearchEngine:
+    """
+    Инвертированный индекс товаров в памяти процесса.
+
+    Индексирует основы слов из названия и категории, ищет по точной основе,
+    по префиксу (набор с клавиатуры) и с опечатками через триграммы и
+    расстояние Дамерау-Левенштейна. Поддерживает инкрементальное обновление.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._documents: Dict[int, Set[str]] = {}
+        self._trigrams: Dict[str, Set[str]] = defaultdict(set)
+        self._sorted_terms: List[str] = []
+        self._built = False
+        self._build_time_ms = 0.0
+        self._built_at: Optional[float] = None
+        self._updates = 0
+
+    @property
+    def built(self) -> bool:
+        return self._built
+
+    def build(self, session: Session):
+        """Полностью перестроить индекс по таблице products"""
+        started = time.perf_counter()
+        rows = session.execute(select(Products.ean, Products.name, Products.category)).all()
+
+        with self._lock:
+            self._postings = {}
+            self._documents = {}
+            self._trigrams = defaultdict(set)
+            self._sorted_terms = []
+            for ean, name, category in rows:
+                self._index_document(ean, name, category, keep_sorted=False)
+            self._sorted_terms = sorted(self._postings)
+            self._built = True
+            self._build_time_ms = (time.perf_counter() - started) * 1000
+            self._built_at = time.time()
+
+    def ensure_built(self, session: Session):
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    self.build(session)
+
+    def add_product(self, ean: int, name: Optional[str], category: Optional[str]):
+        """Добавить или переиндексировать один товар"""
+        with self._lock:
+            if not self._built:
+                # Индекс еще не строился - товар попадет в него при первой сборке
+                return
+            self._remove_document(ean)
+            self._index_document(ean, name, category)
+            self._updates += 1
+
+    def remove_product(self, ean: int):
+        with self._lock:
+            if self._remove_document(ean):
+                self._updates += 1
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        Найти товары, в которых встречаются все слова запроса.
+        Возвращает [(ean, score)] по убыванию релевантности, все или первые limit.
+        """
+        terms = analyze(query)
+        if not terms:
+            return []
+
+        with self._lock:
+            scores: Optional[Dict[int, float]] = None
+            for term in terms:
+                term_scores = self._match_term(term)
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {
+                        ean: score + term_scores[ean]
+                        for ean, score in scores.items()
+                        if ean in term_scores
+                    }
+                if not scores:
+                    return []
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked if limit is None else ranked[:limit]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "built": self._built,
+                "documents": len(self._documents),
+                "terms": len(self._postings),
+                "postings": sum(len(docs) for docs in self._postings.values()),
+                "trigrams": len(self._trigrams),
+                "build_time_ms": round(self._build_time_ms, 3),
+                "built_at": self._built_at,
+                "incremental_updates": self._updates,
+            }
+
+    def _index_document(self, ean: int, name: Optional[str], category: Optional[str], keep_sorted: bool = True):
+        terms = set()
+        for field, text in (("name", name), ("category", category)):
+            for term in analyze(text or ""):
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    for gram in trigrams(term):
+                        self._trigrams[gram].add(term)
+                    if keep_sorted:
+                        bisect.insort(self._sorted_terms, term)
+                postings[ean] = max(postings.get(ean, 0.0), FIELD_WEIGHTS[field])
+                terms.add(term)
+        self._documents[ean] = terms
+
+    def _remove_document(self, ean: int) -> bool:
+        terms = self._documents.pop(ean, None)
+        if terms is None:
+            return False
+
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(ean, None)
+            if not postings:
+                del self._postings[term]
+                del self._sorted_terms[bisect.bisect_left(self._sorted_terms, term)]
+                for gram in trigrams(term):
+                    self._trigrams[gram].discard(term)
+                    if not self._trigrams[gram]:
+                        del self._trigrams[gram]
+        return True
+
+    def _match_term(self, term: str) -> Dict[int, float]:
+        """Оценки документов для одного слова запроса: точно, по префиксу или с опечаткой"""
+        candidates: Dict[str, float] = {}
+
+        if term in self._postings:
+            candidates[term] = 1.0
+
+        terms = self._sorted_terms
+        i = bisect.bisect_left(terms, term)
+        while i < len(terms) and terms[i].startswith(term):
+            candidates.setdefault(terms[i], PREFIX_FACTOR)
+            i += 1
+
+        if not candidates:
+            candidates = {indexed: FUZZY_FACTOR for indexed in self._fuzzy_terms(term)}
+
+        scores: Dict[int, float] = {}
+        total = max(len(self._documents), 1)
+        for indexed, factor in candidates.items():
+            postings = self._postings[indexed]
+            idf = math.log(1 + total / len(postings))
+            for ean, weight in postings.items():
+                score = weight * factor * idf
+                if score > scores.get(ean, 0.0):
+                    scores[ean] = score
+        return scores
+
+    def _fuzzy_terms(self, term: str) -> List[str]:
+        """Индексированные слова в пределах 1-2 правок от term (кандидаты по общим триграммам)"""
+        limit = 1 if len(term) <= 4 else 2
+        grams = trigrams(term)
+
+        shared: Dict[str, int] = defaultdict(int)
+        for gram in grams:
+            for indexed in self._trigrams.get(gram, ()):
+                shared[indexed] += 1
+
+        # Каждая правка портит не больше трех триграмм
+        min_shared = max(1, len(grams) - 3 * limit)
+        return [
+            indexed
+            for indexed, count in shared.items()
+            if count >= min_shared and edit_distance(term, indexed, limit) <= limit
+        ]
+
+
+search_engine = SearchEngine()
@@ -0,0 +1,168 @@
+import bisect
+import heapq
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, func, case
+from sqlalchemy.orm import Session
+
+from ..database.models import Products, ProductsStock
+from .text import normalize, tokenize
+
+# Топ подсказок кэшируется для префиксов с широким диапазоном ключей (короткие, частые слова)
+WIDE_RANGE = 1000
+WIDE_CACHE_SIZE = 10000
+# Через сколько секунд популярность пересчитывается в фоне
+REFRESH_SECONDS = 300
+
+
+class SuggestIndex:
+    """
+    Префиксный индекс для подсказок: отсортированный массив ключей + bisect.
+
+    Ключ - хвост названия, начиная с каждого слова ("молоко" найдет
+    "Простоквашино Молоко"), значение - (популярность, текст, тип, ean).
+    Популярность - число предложений в наличии и суммарный остаток.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._keys: List[str] = []
+        self._entries: List[Tuple[Tuple[int, int], str, str, Optional[int]]] = []
+        self._wide_cache: Dict[str, List[Dict]] = {}
+        self._built_at: Optional[float] = None
+        self._refreshing = False
+
+    def build(self, session: Session):
+        in_stock = case((ProductsStock.amount > 0, 1), else_=0)
+        rows = session.execute(
+            select(
+                Products.ean,
+                Products.name,
+                Products.category,
+                func.coalesce(func.sum(in_stock), 0),
+                func.coalesce(func.sum(func.greatest(ProductsStock.amount, 0)), 0)
+            )
+            .outerjoin(ProductsStock, ProductsStock.product_ean == Products.ean)
+            .group_by(Products.ean)
+        ).all()
+
+        pairs = []
+        categories: Dict[str, List[int]] = {}
+        for ean, name, category, offers, amount in rows:
+            popularity = (int(offers), int(amount))
+            if name:
+                pairs.extend((key, (popularity, name, "product", ean)) for key in self._keys_for(name))
+            if category:
+                total = categories.setdefault(category, [0, 0])
+                total[0] += popularity[0]
+                total[1] += popularity[1]
+
+        for category, (offers, amount) in categories.items():
+            pairs.extend(
+                (key, ((offers, amount), category, "category", None))
+                for key in self._keys_for(category)
+            )
+
+        pairs.sort(key=lambda pair: pair[0])
+
+        with self._lock:
+            self._keys = [key for key, _ in pairs]
+            self._entries = [entry for _, entry in pairs]
+            self._wide_cache = {}
+            self._built_at = time.time()
+
+    def ensure_fresh(self, session: Session, session_factory: Callable[[], Session]):
+        """Первая сборка - синхронно, дальше устаревший индекс обновляется в фоне"""
+        if self._built_at is None:
+            with self._lock:
+                if self._built_at is None:
+                    self.build(session)
+            return
+
+        if time.time() - self._built_at <= REFRESH_SECONDS:
+            return
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, args=(session_factory,), daemon=True).start()
+
+    def _refresh(self, session_factory: Callable[[], Session]):
+        session = session_factory()
+        try:
+            self.build(session)
+        finally:
+            session.close()
+            with self._lock:
+                self._refreshing = False
+
+    def add_product(self, ean: int, name: Optional[str], category: Optional[str]):
+        """Добавить новый товар (без остатков) до следующей пересборки"""
+        with self._lock:
+            if self._built_at is None:
+                return
+            for text, kind, product_ean in ((name, "product", ean), (category, "category", None)):
+                if not text:
+                    continue
+                for key in self._keys_for(text):
+                    position = bisect.bisect_right(self._keys, key)
+                    self._keys.insert(position, key)
+                    self._entries.insert(position, ((0, 0), text, kind, product_ean))
+                    for cached_prefix in [p for p in self._wide_cache if key.startswith(p)]:
+                        del self._wide_cache[cached_prefix]
+
+    def suggest(self, query: str, limit: int = 10) -> List[Dict]:
+        prefix = normalize(query).strip()
+        if not prefix:
+            return []
+
+        with self._lock:
+            start = bisect.bisect_left(self._keys, prefix)
+            end = bisect.bisect_left(self._keys, prefix + "\uffff")
+            if end - start <= WIDE_RANGE:
+                return self._top(start, end, limit)
+
+            cached = self._wide_cache.get(prefix)
+            if cached is None or len(cached) < limit:
+                if len(self._wide_cache) >= WIDE_CACHE_SIZE:
+                    self._wide_cache = {}
+                cached = self._wide_cache[prefix] = self._top(start, end, max(limit, 20))
+            return cached[:limit]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"keys": len(self._keys), "built_at": self._built_at}
+
+    def _top(self, start: int, end: int, limit: int) -> List[Dict]:
+        best = heapq.nlargest(
+            # Одна сущность может попасть в диапазон несколькими словами - берем с запасом
+            limit * 3,
+            self._entries[start:end],
+            key=lambda entry: entry[0]
+        )
+
+        suggestions = []
+        seen = set()
+        for popularity, text, kind, ean in best:
+            if (kind, text) in seen:
+                continue
+            seen.add((kind, text))
+            suggestions.append({"text": text, "type": kind, "ean": ean, "offers": popularity[0]})
+            if len(suggestions) == limit:
+                break
+        return suggestions
+
+    @staticmethod
+    def _keys_for(text: str) -> List[str]:
+        normalized = " ".join(tokenize(text))
+        keys = [normalized]
+        position = normalized.find(" ")
+        while position != -1:
+            keys.append(normalized[position + 1:])
+            position = normalized.find(" ", position + 1)
+        return keys
+
+
+suggest_index = SuggestIndex()
@@ -0,0 +1,100 @@
+import re
+from typing import List
+
+_TOKEN_RE = re.compile(r"[0-9a-zа-я]+")
+
+# Окончания русского стеммера Портера (Snowball). Группы с (?<=[ая]) снимаются только после а/я
+_PERFECTIVE_GERUND = re.compile(r"((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$")
+_REFLEXIVE = re.compile(r"(с[яь])$")
+_ADJECTIVE = re.compile(r"(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|ую|юю|ая|яя|ою|ею)$")
+_PARTICIPLE = re.compile(r"((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$")
+_VERB = re.compile(
+    r"((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)"
+    r"|((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$"
+)
+_NOUN = re.compile(
+    r"(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$"
+)
+_RV = re.compile(r"^(.*?[аеиоуыэюя])(.*)$")
+_DERIVATIONAL = re.compile(r".*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$")
+_DERIVATIONAL_SUFFIX = re.compile(r"ость?$")
+_SUPERLATIVE = re.compile(r"(ейше|ейш)$")
+
+
+def normalize(text: str) -> str:
+    """Нижний регистр и ё -> е"""
+    return text.lower().replace("ё", "е")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(normalize(text))
+
+
+def stem(word: str) -> str:
+    """Русский стеммер Портера; слова без кириллических гласных возвращаются как есть"""
+    match = _RV.match(word)
+    if not match:
+        return word
+
+    prefix, rv = match.groups()
+
+    stripped = _PERFECTIVE_GERUND.sub("", rv, 1)
+    if stripped == rv:
+        rv = _REFLEXIVE.sub("", rv, 1)
+        stripped = _ADJECTIVE.sub("", rv, 1)
+        if stripped != rv:
+            rv = _PARTICIPLE.sub("", stripped, 1)
+        else:
+            stripped = _VERB.sub("", rv, 1)
+            rv = _NOUN.sub("", rv, 1) if stripped == rv else stripped
+    else:
+        rv = stripped
+
+    if rv.endswith("и"):
+        rv = rv[:-1]
+
+    if _DERIVATIONAL.match(rv):
+        rv = _DERIVATIONAL_SUFFIX.sub("", rv, 1)
+
+    if rv.endswith("ь"):
+        rv = rv[:-1]
+    else:
+        rv = _SUPERLATIVE.sub("", rv, 1)
+        if rv.endswith("нн"):
+            rv = rv[:-1]
+
+    return prefix + rv
+
+
+def analyze(text: str) -> List[str]:
+    """Текст -> список основ слов"""
+    return [stem(token) for token in tokenize(text)]
+
+
+def trigrams(term: str) -> List[str]:
+    padded = f"  {term} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Расстояние Дамерау-Левенштейна с отсечкой: limit + 1, если больше limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = current[0]
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous_previous is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+            row_min = min(row_min, current[j])
+        if row_min > limit:
+            return limit + 1
+        previous_previous, previous = previous, current
+
+    return previous[-1] if previous[-1] <= limit else limit + 1
@@ -66,4 +66,18 @@ def merchant_headers(auth_merchant):
 def cart_order(client, auth_headers):
     """Фикстура для создания корзины/заказа"""
     response = client.post("/cart", headers=auth_headers)
-    return response.json()
\ No newline at end of file
+    return response.json()
+
+@pytest.fixture
+def stock_merchant(client):
+    """Мерчант из заполненной базы и его склад: токен выписывается напрямую, пароль в fill не хэширован"""
+    from ..src.auth.utils import create_access_token
+    from ..src.database.core import SessionLocal
+    from ..src.database.models import Stocks
+
+    with SessionLocal() as session:
+        stock = session.query(Stocks).order_by(Stocks.id).first()
+        stock_id, merchant_id = stock.id, stock.merchant_id
+
+    token = create_access_token({"sub": str(merchant_id), "role": "merchant"})
+    return {"headers": {"Authorization": f"Bearer {token}"}, "stock_id": stock_id, "merchant_id": merchant_id}
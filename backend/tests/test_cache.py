@@ -0,0 +1,160 @@
+import time
+from contextlib import nullcontext
+import pytest
+from ..src.cache.reference import ReferenceCache
+from ..src.product.http_cache import etag_matches
+from ..src.cache.tiered import LRUCache, RedisCache, TieredCache, ean_tag, merchant_tag, COUNTS_TAG
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def cache():
+    return TieredCache(LRUCache(maxsize=2, ttl=60), RedisCache(fakeredis.FakeRedis(), ttl=60))
+
+
+class TestTieredCache:
+    def test_hit_and_miss(self, cache):
+        """Тест: промах, затем попадание в L1"""
+        assert cache.get("a") is None
+        cache.set("a", b"1", [ean_tag(1)])
+        assert cache.get("a") == b"1"
+        stats = cache.stats()
+        assert stats["l1"]["hits"] == 1
+        assert stats["l1"]["misses"] == 1
+
+    def test_lru_eviction_falls_back_to_redis(self, cache):
+        """Тест: вытесненная из L1 запись читается из Redis"""
+        cache.set("a", b"1", [ean_tag(1)])
+        cache.set("b", b"2", [ean_tag(2)])
+        cache.set("c", b"3", [ean_tag(3)])
+        assert cache.stats()["l1"]["evictions"] == 1
+        assert cache.get("a") == b"1"
+        assert cache.stats()["l2"]["hits"] == 1
+
+    def test_invalidate_by_ean(self, cache):
+        """Тест: инвалидация снимает только записи с этим EAN в обоих уровнях"""
+        cache.set("a", b"1", [ean_tag(1), ean_tag(2)])
+        cache.set("b", b"2", [ean_tag(3)])
+        cache.invalidate(eans=[2])
+        assert cache.get("a") is None
+        assert cache.get("b") == b"2"
+
+    def test_invalidate_by_merchant(self, cache):
+        """Тест: инвалидация лент с фильтром по магазину"""
+        cache.set("a", b"1", [merchant_tag(7)])
+        cache.invalidate(merchant_ids=[7])
+        assert cache.get("a") is None
+
+    def test_invalidate_counts(self, cache):
+        """Тест: запись в остатки снимает закэшированные total_count"""
+        cache.set("count:a", b"10", [COUNTS_TAG])
+        cache.set("b", b"2", [ean_tag(3)])
+        cache.invalidate(eans=[1], tags=[COUNTS_TAG])
+        assert cache.get("count:a") is None
+        assert cache.get("b") == b"2"
+
+    def test_tags_restored_from_redis(self, cache):
+        """Тест: запись, поднятая из Redis в L1, сохраняет теги"""
+        cache.set("a", b"1", [ean_tag(1)])
+        cache.l1.clear()
+        assert cache.get("a") == b"1"
+        cache.l2.client.flushall()
+        cache.invalidate(eans=[1])
+        assert cache.get("a") is None
+
+    def test_feed_response_cached(self, client):
+        """Тест: повторный запрос ленты отдается из кэша"""
+        url = "/products/feed?limit=3&user_lat=55.75581&user_long=37.61731"
+        first = client.get(url)
+        hits = client.get("/products/cache/stats").json()["data"]["l1"]["hits"]
+        second = client.get("/products/feed?limit=3&user_lat=55.75579&user_long=37.61729")
+        assert second.status_code == 200
+        assert second.json() == first.json()
+        assert client.get("/products/cache/stats").json()["data"]["l1"]["hits"] == hits + 1
+
+
+class TestReferenceCache:
+    def make_loader(self, values):
+        calls = []
+
+        def loader(session):
+            calls.append(session)
+            return values[min(len(calls), len(values)) - 1]
+
+        return loader, calls
+
+    def test_fresh_value_served_from_memory(self):
+        """Тест: в пределах TTL загрузчик не вызывается"""
+        cache = ReferenceCache(ttl=60, max_stale=60, session_factory=nullcontext)
+        loader, calls = self.make_loader([["a"]])
+        assert cache.get("categories", "session", loader) == ["a"]
+        assert cache.get("categories", "session", loader) == ["a"]
+        assert calls == ["session"]
+
+    def test_stale_value_refreshed_in_background(self):
+        """Тест: устаревший список отдается сразу, обновление идет в фоне"""
+        cache = ReferenceCache(ttl=0, max_stale=60, session_factory=nullcontext)
+        loader, calls = self.make_loader([["a"], ["a", "b"]])
+        assert cache.get("categories", "session", loader) == ["a"]
+        assert cache.get("categories", "session", loader) == ["a"]
+
+        deadline = time.monotonic() + 2
+        while cache.stats()["loads"] < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert calls == ["session", None]
+        assert cache._entries["categories"][0] == ["a", "b"]
+
+    def test_invalidate(self):
+        """Тест: после сброса список загружается заново"""
+        cache = ReferenceCache(ttl=60, max_stale=60, session_factory=nullcontext)
+        loader, calls = self.make_loader([["a"], ["a", "b"]])
+        cache.get("merchants", "session", loader)
+        cache.invalidate("merchants")
+        assert cache.get("merchants", "session", loader) == ["a", "b"]
+
+    def test_merchant_registration_invalidates(self, client):
+        """Тест: новый магазин сразу виден в списке"""
+        client.get("/products/merchants")
+        response = client.post("/merchant/register", json={
+            "name": "Новый магазин", "email": f"new-{time.time()}@example.com", "password": "merchantpass123"
+        })
+        merchant_id = response.json()["merchant_id"]
+        merchants = client.get("/products/merchants").json()["data"]["merchants"]
+        assert {"id": merchant_id, "name": "Новый магазин"} in merchants
+
+
+class TestConditionalRequests:
+    def test_etag_matches(self):
+        """Тест: сравнение If-None-Match со списком, * и слабыми тегами"""
+        assert etag_matches('"a"', '"a"')
+        assert etag_matches('"b", W/"a"', '"a"')
+        assert etag_matches("*", '"a"')
+        assert not etag_matches('"b"', '"a"')
+        assert not etag_matches(None, '"a"')
+
+    def test_feed_not_modified(self, client):
+        """Тест: повторный запрос ленты с If-None-Match получает 304 без тела"""
+        first = client.get("/products/feed?limit=2")
+        etag = first.headers["ETag"]
+        assert first.headers["Cache-Control"] == "public, max-age=5"
+
+        second = client.get("/products/feed?limit=2", headers={"If-None-Match": etag})
+        assert second.status_code == 304
+        assert second.content == b""
+        assert second.headers["ETag"] == etag
+
+        other = client.get("/products/feed?limit=3", headers={"If-None-Match": etag})
+        assert other.status_code == 200
+        assert other.headers["ETag"] != etag
+
+    def test_reference_and_stats_cache_control(self, client):
+        """Тест: Cache-Control задается по маршруту"""
+        assert "max-age=300" in client.get("/products/categories").headers["Cache-Control"]
+        assert client.get("/products/cache/stats").headers["Cache-Control"] == "no-store"
+
+    def test_error_without_etag(self, client):
+        """Тест: ошибки не получают ETag"""
+        response = client.get("/products/feed?cursor=bad")
+        assert response.status_code == 400
+        assert "ETag" not in response.headers
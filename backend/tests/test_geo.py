@@ -0,0 +1,99 @@
+import time
+import numpy as np
+from sqlalchemy import func, select, text
+from ..src.database.core import SessionLocal
+from ..src.database.models import Stocks
+from ..src.geo.stocks import StockLocations, StockArrays, stock_locations
+
+
+def make_locations(points):
+    locations = StockLocations()
+    lat = np.radians(np.array([p[1] for p in points], dtype=np.float64))
+    lon = np.radians(np.array([p[2] for p in points], dtype=np.float64))
+    locations._arrays = StockArrays(
+        ids=np.array([p[0] for p in points], dtype=np.int64), lat=lat, lon=lon, cos_lat=np.cos(lat),
+        grid=StockLocations._build_grid(
+            np.array([p[1] for p in points], dtype=np.float64),
+            np.array([p[2] for p in points], dtype=np.float64)
+        )
+    )
+    locations._loaded_at = time.monotonic()
+    return locations
+
+
+class TestStockLocations:
+    def test_distances(self):
+        """Тест: векторный haversine совпадает с известными расстояниями"""
+        locations = make_locations([(1, 55.7558, 37.6173), (2, 59.9343, 30.3351)])
+        distances = locations.offer_distances(None, 55.7558, 37.6173, [2, 1, 2])
+        assert distances[1] == 0.0
+        assert distances[0] == distances[2]
+        assert abs(distances[0] - 634.0) < 5
+
+    def test_unknown_and_missing_coordinates(self):
+        """Тест: склад без координат получает None"""
+        locations = make_locations([(1, 55.7558, 37.6173), (3, None, None)])
+        assert locations.offer_distances(None, 55.0, 37.0, [3]) == [None]
+
+    def test_stocks_within(self):
+        """Тест: поиск складов в радиусе через сетку"""
+        locations = make_locations([
+            (1, 55.7558, 37.6173), (2, 55.80, 37.70), (3, 59.9343, 30.3351), (4, None, None)
+        ])
+        assert locations.stocks_within(None, 55.7558, 37.6173, 1) == [1]
+        assert locations.stocks_within(None, 55.7558, 37.6173, 10) == [1, 2]
+        assert locations.stocks_within(None, 55.7558, 37.6173, 1000) == [1, 2, 3]
+        assert locations.stocks_within(None, 0, 0, 10) == []
+
+    def test_new_and_moved_stocks_visible(self):
+        """Тест: склад, добавленный через ORM, виден сразу, перенесенный в обход - после TTL"""
+        with SessionLocal() as session:
+            assert stock_locations.stocks_within(session, 10.0, 10.0, 5) == []
+            merchant_id, last_id = session.execute(select(func.min(Stocks.merchant_id), func.max(Stocks.id))).one()
+            stock = Stocks(id=last_id + 1, address="Тестовый склад", lat=10.0, long=10.0, merchant_id=merchant_id)
+            session.add(stock)
+            session.commit()
+            try:
+                assert stock_locations.stocks_within(session, 10.0, 10.0, 5) == [stock.id]
+
+                session.execute(text("UPDATE stocks SET lat = 20.0 WHERE id = :id"), {"id": stock.id})
+                session.commit()
+                assert StockLocations(ttl=0).stocks_within(session, 20.0, 10.0, 5) == [stock.id]
+            finally:
+                session.delete(stock)
+                session.commit()
+            assert stock_locations.stocks_within(session, 20.0, 10.0, 5) == []
+
+    def test_feed_max_distance(self, client):
+        """Тест: фильтр по радиусу оставляет только близкие предложения"""
+        response = client.get("/products/feed?user_lat=55.7558&user_long=37.6173&max_distance_km=20&limit=100")
+        assert response.status_code == 200
+        for product in response.json()["data"]["products"]:
+            assert all(offer["distance_km"] <= 20 for offer in product["offers"])
+
+    def test_feed_max_distance_without_location(self, client):
+        """Тест: радиус без координат пользователя"""
+        response = client.get("/products/feed?max_distance_km=5")
+        assert response.status_code == 400
+
+    def test_feed_distances(self, client):
+        """Тест: в ленте с координатами у каждого предложения есть расстояние"""
+        response = client.get("/products/feed?user_lat=55.7558&user_long=37.6173&limit=100")
+        assert response.status_code == 200
+        for product in response.json()["data"]["products"]:
+            assert all(offer["distance_km"] is not None for offer in product["offers"])
+
+    def test_feed_nearest_first(self, client):
+        """Тест: sort_by=distance упорядочивает товары по ближайшему предложению"""
+        url = "/products/feed?sort_by=distance&user_lat=55.7558&user_long=37.6173"
+        products = client.get(f"{url}&limit=100").json()["data"]["products"]
+        nearest = [product["best_offer"]["distance_km"] for product in products]
+        assert nearest == sorted(nearest)
+
+        seen = []
+        response = client.get(f"{url}&limit=4").json()["data"]
+        seen.extend(product["ean"] for product in response["products"])
+        while response["next_cursor"]:
+            response = client.get(f"{url}&limit=4&cursor={response['next_cursor']}").json()["data"]
+            seen.extend(product["ean"] for product in response["products"])
+        assert seen == [product["ean"] for product in products]
@@ -0,0 +1,665 @@
+import time
+import pytest
+from sqlalchemy import select, func, update
+from ..src.database.core import SessionLocal
+from ..src.database.models import ProductsStock, Products, IngestJob, MerchantSyncState
+from ..src.database.repository import IngestJobRepository
+from ..src.merchant_api import jobs
+from ..src.merchant_api.queue import MemoryStockQueue, RedisStockQueue
+from ..src.merchant_api.consumer import StockUpdateConsumer
+
+
+def catalog_eans(limit=3):
+    with SessionLocal() as session:
+        return session.scalars(select(Products.ean).order_by(Products.ean).limit(limit)).all()
+
+
+def stock_rows(stock_id):
+    with SessionLocal() as session:
+        return {
+            row.product_ean: (row.price, row.amount)
+            for row in session.scalars(select(ProductsStock).where(ProductsStock.stock_id == stock_id))
+        }
+
+
+def sync_version(merchant_id):
+    with SessionLocal() as session:
+        return session.scalar(
+            select(MerchantSyncState.version).where(MerchantSyncState.merchant_id == merchant_id)
+        ) or 0
+
+
+def wait_job(client, job_id, headers, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        data = client.get(f"/merchant/jobs/{job_id}", headers=headers).json()["data"]
+        if data["status"] in ("done", "failed") or time.monotonic() > deadline:
+            return data
+        time.sleep(0.05)
+
+
+class TestBulkStock:
+    def test_bulk_json_upsert(self, client, stock_merchant):
+        """Тест: JSON-массив вставляет новые строки и обновляет существующие без дублей"""
+        stock_id, headers = stock_merchant["stock_id"], stock_merchant["headers"]
+        eans = catalog_eans()
+        before = stock_rows(stock_id)
+
+        rows = [{"product_ean": str(ean), "price": 10.5 + i, "amount": 7} for i, ean in enumerate(eans)]
+        response = client.post(f"/merchant/bulk/product/stock/{stock_id}", json=rows, headers=headers)
+        assert response.status_code == 200
+        data = response.json()["data"]
+        expected_updates = len(set(eans) & set(before))
+        assert data["updated"] == expected_updates
+        assert data["inserted"] == len(eans) - expected_updates
+        assert data["rejected"] == 0
+
+        again = client.post(f"/merchant/bulk/product/stock/{stock_id}", json=rows, headers=headers).json()["data"]
+        assert again["inserted"] == 0
+        assert again["updated"] == len(eans)
+
+        after = stock_rows(stock_id)
+        assert all(after[ean] == (10.5 + i, 7) for i, ean in enumerate(eans))
+        with SessionLocal() as session:
+            assert session.scalar(
+                select(func.count()).select_from(ProductsStock).where(ProductsStock.stock_id == stock_id)
+            ) == len(after)
+
+    def test_bulk_csv_rejects(self, client, stock_merchant):
+        """Тест: CSV с некорректными, неизвестными и повторными строками"""
+        stock_id, headers = stock_merchant["stock_id"], stock_merchant["headers"]
+        ean = catalog_eans(1)[0]
+        body = (
+            "product_ean,price,amount\n"
+            f"{ean},20,5\n"
+            "abc,1,1\n"
+            f"{ean},-1,1\n"
+            "1,5,5\n"
+            f"{ean},30,6\n"
+        )
+        response = client.post(
+            f"/merchant/bulk/product/stock/{stock_id}",
+            content=body.encode(),
+            headers={**headers, "Content-Type": "text/csv"}
+        )
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert data["inserted"] + data["updated"] == 1
+        assert data["rejected"] == 4
+        assert [error["line"] for error in data["errors"]] == [2, 3, 4, 5]
+        assert stock_rows(stock_id)[ean] == (30.0, 6)
+
+    def test_bulk_out_of_range_rows(self, client, stock_merchant):
+        """Тест: EAN и остаток вне диапазона колонок отклоняются построчно, остальные строки применяются"""
+        stock_id, headers = stock_merchant["stock_id"], stock_merchant["headers"]
+        ean = catalog_eans(1)[0]
+        rows = [
+            {"product_ean": "99999999999999999999", "price": 1, "amount": 1},
+            {"product_ean": ean, "price": 1, "amount": 3000000000},
+            {"product_ean": ean, "price": 21, "amount": 4},
+        ]
+        response = client.post(f"/merchant/bulk/product/stock/{stock_id}", json=rows, headers=headers)
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert [error["line"] for error in data["errors"]] == [1, 2]
+        assert stock_rows(stock_id)[ean] == (21.0, 4)
+
+        response = client.post("/merchant/stock/updates", headers=headers, json={"changes": [
+            {"product_ean": ean, "stock_id": stock_id, "price": 1, "amount": 3000000000}
+        ]})
+        assert response.status_code == 422
+
+    def test_bulk_bad_payload(self, client, stock_merchant):
+        """Тест: тело не JSON-массив и CSV без нужных колонок"""
+        stock_id, headers = stock_merchant["stock_id"], stock_merchant["headers"]
+        url = f"/merchant/bulk/product/stock/{stock_id}"
+        assert client.post(url, json={"product_ean": "1"}, headers=headers).status_code == 400
+        assert client.post(
+            url, content=b"ean,price\n1,2\n", headers={**headers, "Content-Type": "text/csv"}
+        ).status_code == 400
+
+    def test_bulk_foreign_stock(self, client, stock_merchant):
+        """Тест: чужой склад"""
+        with SessionLocal() as session:
+            from ..src.database.models import Stocks
+            foreign = session.scalar(select(Stocks.id).where(Stocks.merchant_id != stock_merchant["merchant_id"]))
+        response = client.post(f"/merchant/bulk/product/stock/{foreign}", json=[], headers=stock_merchant["headers"])
+        assert response.status_code == 403
+
+    def test_add_product_twice_updates(self, client, stock_merchant):
+        """Тест: повторное добавление товара на склад обновляет строку, а не создает дубль"""
+        stock_id, headers = stock_merchant["stock_id"], stock_merchant["headers"]
+        ean = catalog_eans(2)[1]
+        url = f"/merchant/add/product/stock/{stock_id}"
+        assert client.post(url, json={"product_ean": str(ean), "price": 11, "amount": 1}, headers=headers).status_code == 200
+        assert client.post(url, json={"product_ean": str(ean), "price": 12, "amount": 2}, headers=headers).status_code == 200
+        assert stock_rows(stock_id)[ean] == (12.0, 2)
+
+
+class TestIngestJobs:
+    def test_csv_job(self, client, stock_merchant, tmp_path, monkeypatch):
+        """Тест: файл принимается с 202, обрабатывается воркером, отчет с прогрессом и ошибками"""
+        monkeypatch.setattr(jobs, "INGEST_DIR", str(tmp_path))
+        stock_id, headers = stock_merchant["stock_id"], stock_merchant["headers"]
+        eans = catalog_eans(3)
+        body = "product_ean,price,amount\n" + "".join(f"{ean},{40 + i},3\n" for i, ean in enumerate(eans)) + "1,1,1\n"
+
+        response = client.post(
+            f"/merchant/jobs/stock/{stock_id}", content=body.encode(), headers={**headers, "Content-Type": "text/csv"}
+        )
+        assert response.status_code == 202
+        job_id = response.json()["data"]["id"]
+
+        data = wait_job(client, job_id, headers)
+        assert data["status"] == "done"
+        assert data["progress"] == 1.0
+        assert data["processed_bytes"] == data["file_size"] == len(body)
+        assert data["rows_processed"] == 4
+        assert data["inserted"] + data["updated"] == 3
+        assert data["errors"] == [{"line": 5, "error": "товар с таким EAN не найден"}]
+        assert all(stock_rows(stock_id)[ean] == (40.0 + i, 3) for i, ean in enumerate(eans))
+        assert list(tmp_path.iterdir()) == []
+
+    def test_resume_from_checkpoint(self, stock_merchant, tmp_path):
+        """Тест: брошенная задача продолжается с checkpoint, уже обработанные строки не читаются"""
+        stock_id = stock_merchant["stock_id"]
+        eans = catalog_eans(4)
+        lines = [f'{{"product_ean": {ean}, "price": {50 + i}, "amount": 9}}\n'.encode() for i, ean in enumerate(eans)]
+        path = tmp_path / "stock.ndjson"
+        path.write_bytes(b"".join(lines))
+
+        with SessionLocal() as session:
+            job = IngestJobRepository(session).create(dict(
+                merchant_id=stock_merchant["merchant_id"], stock_id=stock_id, file_path=str(path),
+                file_format="ndjson", file_size=path.stat().st_size
+            ))
+            job_id = job.id
+            # Воркер упал после первых двух строк: checkpoint сохранен, heartbeat давно не обновлялся
+            session.execute(update(IngestJob).where(IngestJob.id == job_id).values(
+                status="running", started_at=func.now(), heartbeat_at=func.now() - func.make_interval(0, 0, 0, 1),
+                checkpoint_offset=len(lines[0]) + len(lines[1]), checkpoint_line=2, rows_processed=2
+            ))
+            session.commit()
+
+        before = stock_rows(stock_id)
+        jobs.run_ingest_job(job_id, chunk_rows=1)
+
+        with SessionLocal() as session:
+            job = session.get(IngestJob, job_id)
+            assert job.status == "done"
+            assert job.rows_processed == 4
+            assert job.inserted + job.updated == 2
+            assert job.checkpoint_line == 4
+
+        after = stock_rows(stock_id)
+        assert after[eans[2]] == (52.0, 9) and after[eans[3]] == (53.0, 9)
+        assert after.get(eans[0]) == before.get(eans[0])
+        assert not path.exists()
+
+    def test_running_job_not_claimed_twice(self, stock_merchant, tmp_path):
+        """Тест: живую задачу другой воркер не берет"""
+        path = tmp_path / "stock.ndjson"
+        path.write_bytes(b"")
+        with SessionLocal() as session:
+            repo = IngestJobRepository(session)
+            job = repo.create(dict(
+                merchant_id=stock_merchant["merchant_id"], stock_id=stock_merchant["stock_id"],
+                file_path=str(path), file_format="ndjson", file_size=0
+            ))
+            assert repo.claim(job.id, jobs.INGEST_LEASE_SECONDS) is not None
+            assert repo.claim(job.id, jobs.INGEST_LEASE_SECONDS) is None
+
+    def test_transient_error_requeues_job(self, stock_merchant, tmp_path, monkeypatch):
+        """Тест: после временной ошибки базы задача возвращается в очередь и продолжается с checkpoint"""
+        from sqlalchemy.exc import OperationalError
+        from ..src.database.repository import ProductRepository
+
+        stock_id = stock_merchant["stock_id"]
+        eans = catalog_eans(2)
+        path = tmp_path / "stock.ndjson"
+        path.write_bytes(b"".join(
+            f'{{"product_ean": {ean}, "price": {60 + i}, "amount": 2}}\n'.encode() for i, ean in enumerate(eans)
+        ))
+        with SessionLocal() as session:
+            job_id = IngestJobRepository(session).create(dict(
+                merchant_id=stock_merchant["merchant_id"], stock_id=stock_id, file_path=str(path),
+                file_format="ndjson", file_size=path.stat().st_size
+            )).id
+
+        upsert = ProductRepository.upsert_stock_rows
+        calls = []
+
+        def deadlock_on_second_chunk(self, *args):
+            calls.append(1)
+            if len(calls) == 2:
+                raise OperationalError("upsert", {}, Exception("deadlock detected"))
+            return upsert(self, *args)
+
+        monkeypatch.setattr(ProductRepository, "upsert_stock_rows", deadlock_on_second_chunk)
+        assert jobs.run_ingest_job(job_id, chunk_rows=1) is False
+        with SessionLocal() as session:
+            job = session.get(IngestJob, job_id)
+            assert (job.status, job.rows_processed, job.checkpoint_line) == ("queued", 1, 1)
+        assert path.exists()
+
+        assert jobs.run_ingest_job(job_id, chunk_rows=1) is True
+        with SessionLocal() as session:
+            job = session.get(IngestJob, job_id)
+            assert (job.status, job.rows_processed) == ("done", 2)
+        assert stock_rows(stock_id)[eans[1]] == (61.0, 2)
+
+    def test_failed_job_keeps_file_until_sweep(self, stock_merchant, tmp_path):
+        """Тест: файл упавшей задачи остается для разбора и удаляется по истечении срока хранения"""
+        path = tmp_path / "stock.csv"
+        path.write_bytes(b"ean,price\n1,2\n")
+        with SessionLocal() as session:
+            job_id = IngestJobRepository(session).create(dict(
+                merchant_id=stock_merchant["merchant_id"], stock_id=stock_merchant["stock_id"],
+                file_path=str(path), file_format="csv", file_size=path.stat().st_size
+            )).id
+
+        assert jobs.run_ingest_job(job_id) is True
+        with SessionLocal() as session:
+            assert session.get(IngestJob, job_id).status == "failed"
+        assert path.exists()
+
+        jobs.sweep_failed_uploads(retention_seconds=3600)
+        assert path.exists()
+        with SessionLocal() as session:
+            session.execute(update(IngestJob).where(IngestJob.id == job_id).values(
+                finished_at=func.now() - func.make_interval(0, 0, 0, 0, 2)
+            ))
+            session.commit()
+        assert jobs.sweep_failed_uploads(retention_seconds=3600) >= 1
+        assert not path.exists()
+        with SessionLocal() as session:
+            assert session.get(IngestJob, job_id).file_path is None
+
+    def test_job_errors(self, client, stock_merchant, merchant_headers):
+        """Тест: неподдерживаемый формат и чужая задача"""
+        stock_id, headers = stock_merchant["stock_id"], stock_merchant["headers"]
+        response = client.post(f"/merchant/jobs/stock/{stock_id}", content=b"[]", headers={**headers, "Content-Type": "application/json"})
+        assert response.status_code == 415
+
+        with SessionLocal() as session:
+            job_id = session.scalar(select(func.max(IngestJob.id)))
+        if job_id is not None:
+            assert client.get(f"/merchant/jobs/{job_id}", headers=merchant_headers).status_code == 403
+        assert client.get("/merchant/jobs/999999999", headers=headers).status_code == 404
+
+
+class TestDeltaSync:
+    def test_sync_applies_and_is_idempotent(self, client, stock_merchant):
+        """Тест: изменения применяются, повтор версии ничего не меняет, старая версия - 409"""
+        stock_id, headers = stock_merchant["stock_id"], stock_merchant["headers"]
+        ean = sorted(stock_rows(stock_id))[0]
+        version = sync_version(stock_merchant["merchant_id"]) + 1
+        body = {"version": version, "changes": [
+            {"product_ean": ean, "stock_id": stock_id, "price": 1, "amount": 1},
+            {"product_ean": ean, "stock_id": stock_id, "price": 77.5, "amount": 4},
+            {"product_ean": 1, "stock_id": stock_id, "price": 1, "amount": 1},
+        ]}
+
+        response = client.post("/merchant/sync", json=body, headers=headers)
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert data["applied"] == 1
+        assert data["not_found"] == [{"product_ean": 1, "stock_id": stock_id}]
+        assert stock_rows(stock_id)[ean] == (77.5, 4)
+
+        body["changes"] = [{"product_ean": ean, "stock_id": stock_id, "price": 5, "amount": 5}]
+        again = client.post("/merchant/sync", json=body, headers=headers)
+        assert again.status_code == 200
+        assert again.json()["data"]["duplicate"] is True
+        assert stock_rows(stock_id)[ean] == (77.5, 4)
+
+        body["version"] = version - 1
+        assert client.post("/merchant/sync", json=body, headers=headers).status_code == (409 if version > 1 else 422)
+        assert sync_version(stock_merchant["merchant_id"]) == version
+
+    def test_sync_foreign_stock(self, client, stock_merchant):
+        """Тест: изменение чужого склада отклоняется целиком"""
+        with SessionLocal() as session:
+            from ..src.database.models import Stocks
+            foreign = session.scalar(select(Stocks.id).where(Stocks.merchant_id != stock_merchant["merchant_id"]))
+        version = sync_version(stock_merchant["merchant_id"]) + 1
+        body = {"version": version, "changes": [{"product_ean": 1, "stock_id": foreign, "price": 1, "amount": 1}]}
+        assert client.post("/merchant/sync", json=body, headers=stock_merchant["headers"]).status_code == 403
+        assert sync_version(stock_merchant["merchant_id"]) == version - 1
+
+    def test_update_product_route(self, client, stock_merchant):
+        """Тест: изменение одной позиции склада по sku_id"""
+        stock_id, headers = stock_merchant["stock_id"], stock_merchant["headers"]
+        with SessionLocal() as session:
+            sku = session.scalars(select(ProductsStock).where(ProductsStock.stock_id == stock_id)).first()
+            sku_id, ean = sku.sku_id, sku.product_ean
+            foreign_sku = session.scalar(select(ProductsStock.sku_id).where(ProductsStock.stock_id != stock_id))
+
+        url = f"/merchant/stock/{stock_id}/product/{sku_id}"
+        response = client.put(url, json={"product_ean": str(ean), "price": 33, "amount": 2}, headers=headers)
+        assert response.status_code == 200
+        assert stock_rows(stock_id)[ean] == (33.0, 2)
+
+        response = client.put(
+            f"/merchant/stock/{stock_id}/product/{foreign_sku}",
+            json={"product_ean": str(ean), "price": 1, "amount": 1}, headers=headers
+        )
+        assert response.status_code == 404
+
+    def test_update_product_errors(self, client, stock_merchant):
+        """Тест: некорректный EAN - 400, неизвестный - 404, EAN другой позиции этого склада - 409"""
+        stock_id, headers = stock_merchant["stock_id"], stock_merchant["headers"]
+        with SessionLocal() as session:
+            first, second = session.scalars(
+                select(ProductsStock).where(ProductsStock.stock_id == stock_id).order_by(ProductsStock.sku_id).limit(2)
+            ).all()
+            sku_id, other_ean = first.sku_id, second.product_ean
+        url = f"/merchant/stock/{stock_id}/product/{sku_id}"
+
+        assert client.put(url, json={"product_ean": "abc", "price": 1, "amount": 1}, headers=headers).status_code == 400
+        assert client.put(url, json={"product_ean": "1", "price": 1, "amount": 1}, headers=headers).status_code == 404
+        response = client.put(url, json={"product_ean": str(other_ean), "price": 1, "amount": 1}, headers=headers)
+        assert response.status_code == 409
+
+
+class TestInventory:
+    def fetch_all(self, client, url, headers, **params):
+        items, cursor = [], None
+        while True:
+            page = client.get(url, params={**params, "cursor": cursor} if cursor else params, headers=headers)
+            assert page.status_code == 200
+            data = page.json()["data"]
+            items += data["items"]
+            cursor = data["next_cursor"]
+            if not data["has_more"]:
+                return items, data["change_token"]
+
+    def test_snapshot_pages(self, client, stock_merchant):
+        """Тест: постраничная выгрузка склада совпадает с таблицей, без пропусков и повторов"""
+        stock_id, headers = stock_merchant["stock_id"], stock_merchant["headers"]
+        items, token = self.fetch_all(client, f"/merchant/stocks/{stock_id}/inventory", headers, limit=2)
+
+        sku_ids = [item["sku_id"] for item in items]
+        assert sku_ids == sorted(set(sku_ids))
+        assert {item["product_ean"]: (item["price"], item["amount"]) for item in items} == stock_rows(stock_id)
+        assert token
+
+    def test_changes_since_token(self, client, stock_merchant):
+        """Тест: после изменения по токену приходит измененная строка"""
+        stock_id, headers = stock_merchant["stock_id"], stock_merchant["headers"]
+        url = f"/merchant/stocks/{stock_id}/inventory"
+        _, token = self.fetch_all(client, url, headers, limit=100)
+
+        ean = sorted(stock_rows(stock_id))[-1]
+        version = sync_version(stock_merchant["merchant_id"]) + 1
+        client.post("/merchant/sync", headers=headers, json={"version": version, "changes": [
+            {"product_ean": ean, "stock_id": stock_id, "price": 61.5, "amount": 8}
+        ]})
+
+        changes, next_token = self.fetch_all(client, url, headers, limit=1, since=token)
+        assert [(item["price"], item["amount"]) for item in changes if item["product_ean"] == ean] == [(61.5, 8)]
+
+        later, _ = self.fetch_all(client, url, headers, since=next_token)
+        assert ean not in {item["product_ean"] for item in later}
+
+    def test_inventory_errors(self, client, stock_merchant):
+        """Тест: чужой склад, поврежденный курсор и токен другого склада"""
+        stock_id, headers = stock_merchant["stock_id"], stock_merchant["headers"]
+        with SessionLocal() as session:
+            from ..src.database.models import Stocks
+            foreign = session.scalar(select(Stocks.id).where(Stocks.merchant_id != stock_merchant["merchant_id"]))
+            own_other = session.scalar(select(Stocks.id).where(
+                Stocks.merchant_id == stock_merchant["merchant_id"], Stocks.id != stock_id
+            ))
+
+        assert client.get(f"/merchant/stocks/{foreign}/inventory", headers=headers).status_code == 403
+        url = f"/merchant/stocks/{stock_id}/inventory"
+        assert client.get(url, params={"cursor": "bad"}, headers=headers).status_code == 400
+        from ..src.product.cursor import encode_cursor
+        forged = [
+            {"since": encode_cursor("since", [stock_id, "x"])},
+            {"cursor": encode_cursor("inventory", [1, ["x"]])},
+            {"cursor": encode_cursor("inventory", ["x", [1]])},
+        ]
+        for params in forged:
+            assert client.get(url, params=params, headers=headers).status_code == 400
+        if own_other is not None:
+            token = client.get(f"/merchant/stocks/{own_other}/inventory", headers=headers).json()["data"]["change_token"]
+            assert client.get(url, params={"since": token}, headers=headers).status_code == 400
+
+
+class TestBulkCatalog:
+    def test_catalog_upsert_outcomes(self, client, stock_merchant):
+        """Тест: вставка, обновление, без изменений, повтор EAN и некорректные строки"""
+        headers = stock_merchant["headers"]
+        existing = catalog_eans(1)[0]
+        with SessionLocal() as session:
+            current = session.get(Products, existing)
+            same = {"ean": existing, "name": current.name, "category": current.category, "weight": current.weight}
+
+        rows = [
+            {"ean": 9900000000017, "name": "Сыр тестовый", "category": "Сыры", "weight": 0.2},
+            {"ean": 9900000000024, "name": "Кефир черновик", "category": "Молочные продукты"},
+            same,
+            {"ean": "abc", "name": "Брак", "category": "Сыры"},
+            {"ean": 9900000000024, "name": "Кефир тестовый", "category": "Молочные продукты", "weight": 1},
+            {"ean": 9900000000031, "name": "", "category": "Сыры"},
+        ]
+        response = client.post("/merchant/bulk/products", json=rows, headers=headers)
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert [row["outcome"] for row in data["rows"]] == [
+            "inserted", "duplicate", "unchanged", "rejected", "inserted", "rejected"
+        ]
+        assert (data["inserted"], data["unchanged"], data["duplicate"], data["rejected"]) == (2, 1, 1, 2)
+
+        with SessionLocal() as session:
+            assert session.get(Products, 9900000000024).name == "Кефир тестовый"
+
+        renamed = dict(rows[0], name="Сыр тестовый выдержанный")
+        again = client.post("/merchant/bulk/products", json=[renamed], headers=headers).json()["data"]
+        assert again["rows"][0]["outcome"] == "updated"
+
+        stock_id = stock_merchant["stock_id"]
+        stocked = client.post(
+            f"/merchant/bulk/product/stock/{stock_id}",
+            json=[{"product_ean": 9900000000017, "price": 150, "amount": 3}], headers=headers
+        ).json()["data"]
+        assert stocked["rejected"] == 0
+
+        found = client.get("/products/search", params={"q": "выдержанный"}).json()
+        assert 9900000000017 in [product["ean"] for product in found["data"]["products"]]
+
+    def test_catalog_bad_payload(self, client, stock_merchant):
+        """Тест: тело не JSON-массив"""
+        response = client.post("/merchant/bulk/products", json={"ean": 1}, headers=stock_merchant["headers"])
+        assert response.status_code == 400
+
+
+class TestStockQueue:
+    def test_coalesce_and_ack(self, stock_merchant):
+        """Тест: изменения одного SKU склеиваются, пачка пишется и подтверждается"""
+        stock_id, merchant_id = stock_merchant["stock_id"], stock_merchant["merchant_id"]
+        first, second = catalog_eans(2)
+        queue = MemoryStockQueue()
+        consumer = StockUpdateConsumer(queue, window_ms=20)
+
+        queue.publish([
+            {"merchant_id": merchant_id, "stock_id": stock_id, "product_ean": first, "price": 1, "amount": 1},
+            {"merchant_id": merchant_id, "stock_id": stock_id, "product_ean": second, "price": 2, "amount": 2},
+            {"merchant_id": merchant_id, "stock_id": stock_id, "product_ean": first, "price": 71, "amount": 7},
+            {"merchant_id": merchant_id, "stock_id": stock_id, "product_ean": "abc", "price": 1, "amount": 1},
+        ])
+        assert queue.lag() == 4
+
+        assert consumer.poll_once() == 4
+        stats = consumer.stats()
+        assert (stats["rows_applied"], stats["coalesced"], stats["rejected"]) == (2, 1, 1)
+        assert (stats["lag"], stats["pending"]) == (0, 0)
+        rows = stock_rows(stock_id)
+        assert rows[first] == (71.0, 7) and rows[second] == (2.0, 2)
+
+    def test_failed_batch_redelivered(self, stock_merchant):
+        """Тест: при ошибке записи ack не отправляется и пачка приходит снова"""
+        stock_id, merchant_id = stock_merchant["stock_id"], stock_merchant["merchant_id"]
+        ean = catalog_eans(3)[2]
+        queue = MemoryStockQueue(claim_idle_ms=50)
+
+        def broken_session():
+            raise RuntimeError("database is down")
+
+        queue.publish([{"merchant_id": merchant_id, "stock_id": stock_id, "product_ean": ean, "price": 72, "amount": 2}])
+        broken = StockUpdateConsumer(queue, session_factory=broken_session, window_ms=20)
+        assert broken.poll_once() == 1
+        assert broken.stats()["failures"] == 1
+        assert queue.pending() == 1
+
+        time.sleep(0.06)
+        consumer = StockUpdateConsumer(queue, window_ms=20)
+        assert consumer.poll_once() == 1
+        assert queue.pending() == 0
+        assert stock_rows(stock_id)[ean] == (72.0, 2)
+
+    def test_redelivered_old_batch_does_not_roll_back(self, stock_merchant):
+        """Тест: старая пачка, пришедшая повторно после более нового изменения, его не перезаписывает"""
+        stock_id, merchant_id = stock_merchant["stock_id"], stock_merchant["merchant_id"]
+        ean = catalog_eans(4)[3]
+        queue = MemoryStockQueue(claim_idle_ms=50)
+
+        def broken_session():
+            raise RuntimeError("database is down")
+
+        queue.publish([{"merchant_id": merchant_id, "stock_id": stock_id, "product_ean": ean, "price": 74, "amount": 4}])
+        broken = StockUpdateConsumer(queue, session_factory=broken_session, window_ms=20)
+        assert broken.poll_once() == 1
+
+        queue.publish([{"merchant_id": merchant_id, "stock_id": stock_id, "product_ean": ean, "price": 75, "amount": 5}])
+        consumer = StockUpdateConsumer(queue, window_ms=20)
+        assert consumer.poll_once() == 1
+        assert stock_rows(stock_id)[ean] == (75.0, 5)
+
+        time.sleep(0.06)
+        assert consumer.poll_once() == 1
+        assert consumer.stats()["stale"] == 1
+        assert queue.pending() == 0
+        assert stock_rows(stock_id)[ean] == (75.0, 5)
+
+    def test_database_rejected_message_does_not_block_batch(self, stock_merchant):
+        """Тест: строку, которую не принимает база, пачка подтверждает как отклоненную, соседние применяются"""
+        stock_id, merchant_id = stock_merchant["stock_id"], stock_merchant["merchant_id"]
+        bad, good = catalog_eans(6)[4:]
+        queue = MemoryStockQueue(claim_idle_ms=50)
+        consumer = StockUpdateConsumer(queue, window_ms=20)
+        before = stock_rows(stock_id).get(bad)
+
+        queue.publish([
+            {"merchant_id": merchant_id, "stock_id": stock_id, "product_ean": bad, "price": 1, "amount": 3000000000},
+            {"merchant_id": merchant_id, "stock_id": stock_id, "product_ean": good, "price": 76, "amount": 6},
+        ])
+        assert consumer.poll_once() == 2
+        assert queue.pending() == 0
+        stats = consumer.stats()
+        assert (stats["failures"], stats["rejected"], stats["rows_applied"]) == (0, 1, 1)
+        assert stock_rows(stock_id)[good] == (76.0, 6)
+        assert stock_rows(stock_id).get(bad) == before
+
+    def test_foreign_stock_message_rejected(self, stock_merchant):
+        """Тест: сообщение со складом другого мерчанта не применяется"""
+        with SessionLocal() as session:
+            from ..src.database.models import Stocks
+            foreign = session.scalar(select(Stocks.id).where(Stocks.merchant_id != stock_merchant["merchant_id"]))
+        queue = MemoryStockQueue()
+        consumer = StockUpdateConsumer(queue, window_ms=20)
+        before = stock_rows(foreign)
+
+        queue.publish([{"merchant_id": stock_merchant["merchant_id"], "stock_id": foreign,
+                        "product_ean": catalog_eans(1)[0], "price": 1, "amount": 1}])
+        consumer.poll_once()
+        assert consumer.stats()["rejected"] == 1
+        assert stock_rows(foreign) == before
+
+    def test_redis_stream_queue(self):
+        """Тест: Redis Stream выдает сообщения группе, неподтвержденные забираются повторно"""
+        fakeredis = pytest.importorskip("fakeredis")
+        queue = RedisStockQueue(fakeredis.FakeRedis(), claim_idle_ms=0)
+        queue.publish([{"n": 1}, {"n": 2}])
+
+        messages = queue.read(10, block_ms=10)
+        assert [message for _, message in messages] == [{"n": 1}, {"n": 2}]
+        assert queue.lag() == 0 and queue.pending() == 2
+
+        queue.ack([messages[0][0]])
+        assert [message for _, message in queue.read(10, block_ms=10)] == [{"n": 2}]
+
+    def test_http_updates_go_through_queue(self, client, stock_merchant):
+        """Тест: POST /merchant/stock/updates отвечает 202, запись делает фоновый потребитель"""
+        stock_id, headers = stock_merchant["stock_id"], stock_merchant["headers"]
+        ean = catalog_eans(1)[0]
+        response = client.post("/merchant/stock/updates", headers=headers, json={"changes": [
+            {"product_ean": ean, "stock_id": stock_id, "price": 73, "amount": 3}
+        ]})
+        assert response.status_code == 202
+        assert response.json()["data"]["queued"] == 1
+
+        deadline = time.monotonic() + 10
+        while stock_rows(stock_id)[ean] != (73.0, 3) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert stock_rows(stock_id)[ean] == (73.0, 3)
+        assert client.get("/merchant/stock/updates/stats", headers=headers).json()["data"]["running"] is True
+        assert client.get("/merchant/stock/updates/stats").status_code == 401
+
+
+class TestReplaceStock:
+    def test_replace_applies_diff(self, client, stock_merchant):
+        """Тест: снимок вставляет, обновляет и обнуляет только отличающиеся строки"""
+        stock_id, headers = stock_merchant["stock_id"], stock_merchant["headers"]
+        with SessionLocal() as session:
+            current = {
+                row.product_ean: row for row in
+                session.scalars(select(ProductsStock).where(ProductsStock.stock_id == stock_id))
+            }
+            new_ean = session.scalar(select(Products.ean).where(Products.ean.notin_(list(current))))
+        eans = sorted(current)
+        changed, dropped, kept = eans[0], eans[1], eans[2:]
+
+        snapshot = [{"product_ean": ean, "price": current[ean].price, "amount": current[ean].amount} for ean in kept]
+        snapshot += [
+            {"product_ean": changed, "price": current[changed].price + 1, "amount": 5},
+            {"product_ean": new_ean, "price": 80, "amount": 8},
+            {"product_ean": 1, "price": 1, "amount": 1},
+        ]
+
+        response = client.put(f"/merchant/stocks/{stock_id}/inventory", json=snapshot, headers=headers)
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert (data["inserted"], data["updated"], data["unchanged"]) == (1, 1, len(kept))
+        assert data["zeroed"] == (1 if current[dropped].amount else 0)
+        assert [error["line"] for error in data["errors"]] == [len(snapshot)]
+
+        with SessionLocal() as session:
+            after = {
+                row.product_ean: row for row in
+                session.scalars(select(ProductsStock).where(ProductsStock.stock_id == stock_id))
+            }
+        assert after[dropped].amount == 0
+        assert (after[changed].price, after[changed].amount) == (current[changed].price + 1, 5)
+        assert (after[new_ean].price, after[new_ean].amount) == (80.0, 8)
+        # Совпадающие со снимком строки не переписывались
+        assert all(after[ean].change_seq == current[ean].change_seq for ean in kept)
+
+    def test_replace_rejects_empty_snapshot(self, client, stock_merchant):
+        """Тест: пустой снимок не обнуляет склад"""
+        stock_id, headers = stock_merchant["stock_id"], stock_merchant["headers"]
+        before = stock_rows(stock_id)
+        response = client.put(f"/merchant/stocks/{stock_id}/inventory", json=[{"product_ean": "x"}], headers=headers)
+        assert response.status_code == 400
+        assert stock_rows(stock_id) == before
+
+    def test_replace_rejects_unknown_only_snapshot(self, client, stock_merchant):
+        """Тест: снимок из корректных строк с неизвестными EAN не обнуляет склад"""
+        stock_id, headers = stock_merchant["stock_id"], stock_merchant["headers"]
+        before = stock_rows(stock_id)
+        snapshot = [{"product_ean": ean, "price": 1, "amount": 1} for ean in (1, 2, 3)]
+        response = client.put(f"/merchant/stocks/{stock_id}/inventory", json=snapshot, headers=headers)
+        assert response.status_code == 400
+        assert stock_rows(stock_id) == before
@@ -0,0 +1,32 @@
+from datetime import date
+from sqlalchemy import select
+from ..src.database.core import SessionLocal
+from ..src.database.models import Orders, ProductsStock, User
+from ..src.database.partitions import _add_months
+from ..src.database.repository import ItemRepository, OrderRepository
+
+
+class TestPartitions:
+    def test_add_months(self):
+        """Тест: границы месячных секций переходят через год"""
+        assert _add_months(date(2025, 11, 1), 3) == date(2026, 2, 1)
+        assert _add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+        assert _add_months(date(2026, 1, 1), -13) == date(2024, 12, 1)
+
+    def test_item_copies_order_created_at(self):
+        """Тест: позиция заказа получает дату заказа, по ней находятся позиции заказа"""
+        with SessionLocal() as session:
+            user = User(username="partition", email="partition@example.com", password="-")
+            session.add(user)
+            session.commit()
+            order = OrderRepository(session).create_cart(user.id)
+            sku_id = session.scalar(select(ProductsStock.sku_id).order_by(ProductsStock.sku_id))
+
+            items = ItemRepository(session)
+            item = items.add_item(order.id, sku_id, 2)
+
+            assert item.order_created_at == session.get(Orders, order.id).created_at
+            assert [found.id for found in items.get_order_items(order.id)] == [item.id]
+            assert [found.id for found in items.get_items_by_sku(order.id, sku_id)] == [item.id]
+            assert items.clear_order_items(order.id)
+            assert items.get_order_items(order.id) == []
@@ -1,3 +1,6 @@
+import csv
+import io
+import json
 import pytest
 
 class TestProducts:
@@ -84,4 +87,254 @@ class TestProducts:
     def test_search_products_with_pagination(self, client):
         """Тест поиска с пагинацией"""
         response = client.get("/products/search?q=test&offset=5&limit=10")
-        assert response.status_code == 200
\ No newline at end of file
+        assert response.status_code == 200
+
+    def test_get_products_feed_offers_aggregated(self, client):
+        """Тест агрегированных предложений: в наличии, по цене, с min/max"""
+        response = client.get("/products/feed?limit=100")
+        assert response.status_code == 200
+        for product in response.json()["data"]["products"]:
+            prices = [offer["price"] for offer in product["offers"]]
+            assert prices == sorted(prices)
+            assert all(offer["amount"] > 0 for offer in product["offers"])
+            assert product["min_price"] == prices[0]
+            assert product["max_price"] == prices[-1]
+            assert product["best_offer"] == product["offers"][0]
+
+    def test_get_products_feed_total_count_beyond_last_page(self, client):
+        """Тест: total_count возвращается и для пустой страницы"""
+        first = client.get("/products/feed").json()["data"]
+        response = client.get("/products/feed?offset=10000")
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert data["products"] == []
+        assert data["total_count"] == first["total_count"]
+
+    def test_get_products_feed_cursor_pagination(self, client):
+        """Тест keyset-пагинации: курсор проходит ту же ленту, что и offset"""
+        full = client.get("/products/feed?limit=100&sort_by=price").json()["data"]
+        expected = [product["ean"] for product in full["products"]]
+        assert full["next_cursor"] is None
+
+        seen = []
+        url = "/products/feed?limit=4&sort_by=price"
+        response = client.get(url).json()["data"]
+        seen.extend(product["ean"] for product in response["products"])
+        while response["next_cursor"]:
+            response = client.get(f"{url}&cursor={response['next_cursor']}").json()["data"]
+            seen.extend(product["ean"] for product in response["products"])
+
+        assert seen == expected
+
+    def test_get_products_feed_invalid_cursor(self, client):
+        """Тест с поврежденным курсором"""
+        response = client.get("/products/feed?cursor=not-a-cursor")
+        assert response.status_code == 400
+
+    def test_get_products_feed_cursor_other_sort(self, client):
+        """Тест: курсор от другой сортировки не принимается"""
+        response = client.get("/products/feed?limit=1&sort_by=price").json()["data"]
+        if response["next_cursor"]:
+            response = client.get(f"/products/feed?sort_by=distance&cursor={response['next_cursor']}")
+            assert response.status_code == 400
+
+    def test_get_products_feed_forged_cursor(self, client):
+        """Тест: курсор правильной формы с ключом не того типа отклоняется с 400"""
+        from ..src.product.cursor import encode_cursor
+        assert client.get(f"/products/feed?sort_by=price&cursor={encode_cursor('price', ['x', 1])}").status_code == 400
+        assert client.get(f"/products/feed?sort_by=price&cursor={encode_cursor('price', [1, 'x'])}").status_code == 400
+        cursor = encode_cursor('best_value', ['x', 1])
+        assert client.get(f"/products/feed?sort_by=best_value&cursor={cursor}").status_code == 400
+
+    def test_get_products_feed_distance_cursor_without_location(self, client):
+        """Тест: курсор distance без координат (ключ - название) не принимается в запросе с координатами"""
+        response = client.get("/products/feed?limit=1&sort_by=distance").json()["data"]
+        if response["next_cursor"]:
+            location = "user_lat=55.7558&user_long=37.6173"
+            response = client.get(f"/products/feed?sort_by=distance&{location}&cursor={response['next_cursor']}")
+            assert response.status_code == 400
+
+    def test_search_products_relevance(self, client):
+        """Тест полнотекстового поиска с сортировкой по релевантности"""
+        feed = client.get("/products/feed?limit=1").json()["data"]["products"]
+        if feed:
+            word = feed[0]["name"].split()[-1]
+            response = client.get(f"/products/search?q={word}&sort_by=relevance")
+            assert response.status_code == 200
+            eans = [product["ean"] for product in response.json()["data"]["products"]]
+            assert feed[0]["ean"] in eans
+
+    def test_search_products_word_form(self, client):
+        """Тест: поиск находит другую словоформу (русская морфология)"""
+        response = client.get("/products/search?q=продуктов")
+        assert response.status_code == 200
+
+    def test_search_products_typo(self, client):
+        """Тест: поиск по индексу в памяти находит товар с опечаткой в запросе"""
+        feed = client.get("/products/feed?limit=1").json()["data"]["products"]
+        if feed:
+            word = max(feed[0]["name"].split(), key=len)
+            if len(word) > 4:
+                typo = word[:2] + word[3] + word[2] + word[4:]
+                response = client.get(f"/products/search?q={typo}")
+                assert response.status_code == 200
+                eans = [product["ean"] for product in response.json()["data"]["products"]]
+                assert feed[0]["ean"] in eans
+
+    def test_search_products_uses_all_hits(self, client):
+        """Тест: поиск по цене сортирует и считает все найденные товары, а не только самые релевантные"""
+        from sqlalchemy import func, select
+        from ..src.database.core import SessionLocal
+        from ..src.database.models import ProductOfferSummary
+        from ..src.search.engine import search_engine
+
+        feed = client.get("/products/feed?limit=1").json()["data"]["products"]
+        if not feed:
+            return
+        word = feed[0]["category"].split()[0]
+        data = client.get(f"/products/search?q={word}&sort_by=price&limit=1").json()["data"]
+
+        hits = [ean for ean, _ in search_engine.search(word)]
+        with SessionLocal() as session:
+            total, cheapest = session.execute(
+                select(func.count(), func.min(ProductOfferSummary.min_price))
+                .where(ProductOfferSummary.ean.in_(hits))
+            ).one()
+        assert data["total_count"] == total
+        assert data["products"][0]["min_price"] == cheapest
+
+    def test_search_products_no_match(self, client):
+        """Тест поиска без совпадений"""
+        response = client.get("/products/search?q=zzzqqqxxx")
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert data["products"] == []
+        assert data["total_count"] == 0
+
+    def test_search_stats(self, client):
+        """Тест статистики поискового индекса"""
+        client.get("/products/search?q=test")
+        response = client.get("/products/search/stats")
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert data["built"] is True
+        assert data["documents"] > 0
+        assert data["terms"] > 0
+
+    def test_suggest_products(self, client):
+        """Тест подсказок по префиксу"""
+        feed = client.get("/products/feed?limit=1").json()["data"]["products"]
+        if feed:
+            prefix = feed[0]["name"].split()[-1][:3]
+            response = client.get(f"/products/suggest?q={prefix}")
+            assert response.status_code == 200
+            suggestions = response.json()["data"]["suggestions"]
+            assert 0 < len(suggestions) <= 10
+            assert all(prefix.lower() in s["text"].lower() for s in suggestions)
+
+    def test_suggest_products_empty_query(self, client):
+        """Тест подсказок с пустым запросом"""
+        response = client.get("/products/suggest?q=")
+        assert response.status_code == 422
+
+    def test_get_products_feed_facets(self, client):
+        """Тест фасетов ленты: суммы по ценам и категориям сходятся с total_count"""
+        response = client.get("/products/feed?facets=true&limit=1")
+        assert response.status_code == 200
+        data = response.json()["data"]
+        facets = data["facets"]
+        total = data["total_count"]
+        assert sum(item["count"] for item in facets["categories"]) == total
+        assert sum(item["count"] for item in facets["price_buckets"]) >= total
+        assert all(0 < item["count"] <= total for item in facets["merchants"])
+
+        category = facets["categories"][0]
+        filtered = client.get(f"/products/feed?facets=true&category={category['category']}").json()["data"]
+        assert {item["category"] for item in filtered["facets"]["categories"]} >= {category["category"]}
+
+    def test_feed_facets_skip_offers_without_price(self, client):
+        """Тест: предложение без цены не ломает гистограмму цен"""
+        from sqlalchemy import select, update
+        from ..src.database.core import SessionLocal
+        from ..src.database.models import ProductsStock
+        from ..src.database.repository import ProductFeedRepository
+
+        with SessionLocal() as session:
+            offer = session.scalars(select(ProductsStock).where(ProductsStock.amount > 0).limit(1)).first()
+            session.execute(update(ProductsStock).where(ProductsStock.sku_id == offer.sku_id).values(price=None))
+            facets = ProductFeedRepository(session).get_feed_facets(eans=[offer.product_ean])
+            session.rollback()
+
+        assert all(item["min_price"] is not None or item["max_price"] is not None for item in facets["price_buckets"])
+        assert sum(item["count"] for item in facets["categories"]) == 1
+
+    def test_get_products_feed_without_facets(self, client):
+        """Тест: без facets фасеты не считаются"""
+        response = client.get("/products/feed?limit=1")
+        assert response.json()["data"].get("facets") is None
+
+    def test_get_products_feed_count_modes(self, client):
+        """Тест режимов подсчета total_count"""
+        exact = client.get("/products/feed?limit=2&count_mode=exact").json()["data"]
+        cached = client.get("/products/feed?limit=2&offset=2&count_mode=cached").json()["data"]
+        cached_again = client.get("/products/feed?limit=3&count_mode=cached").json()["data"]
+        assert exact["total_count"] == cached["total_count"] == cached_again["total_count"]
+        assert exact["has_more"] == (exact["total_count"] > 2)
+
+        estimate = client.get("/products/feed?limit=2&count_mode=estimate")
+        assert estimate.status_code == 200
+        data = estimate.json()["data"]
+        assert data["total_count"] >= len(data["products"])
+        assert data["has_more"] == exact["has_more"]
+
+    def test_get_products_feed_invalid_count_mode(self, client):
+        """Тест неизвестного режима подсчета"""
+        response = client.get("/products/feed?count_mode=fast")
+        assert response.status_code == 422
+
+    def test_export_ndjson(self, client):
+        """Тест выгрузки каталога в NDJSON: товар на строку"""
+        response = client.get("/products/export")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        products = [json.loads(line) for line in response.text.splitlines()]
+        eans = [product["ean"] for product in products]
+        assert eans == sorted(set(eans))
+        assert any(product["offers"] for product in products)
+
+        feed = client.get("/products/feed?limit=100").json()["data"]
+        in_stock = {p["ean"]: len(p["offers"]) for p in feed["products"]}
+        exported = {p["ean"]: len([o for o in p["offers"] if o["amount"] > 0]) for p in products}
+        assert {ean: count for ean, count in exported.items() if count} == in_stock
+
+    def test_export_csv(self, client):
+        """Тест выгрузки каталога в CSV: предложение на строку"""
+        ndjson = [json.loads(line) for line in client.get("/products/export").text.splitlines()]
+        response = client.get("/products/export?format=csv")
+        assert response.status_code == 200
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert len(rows) == sum(max(len(product["offers"]), 1) for product in ndjson)
+        assert set(rows[0]) >= {"ean", "sku_id", "price", "merchant_name"}
+
+    def test_get_products_offers_batch(self, client):
+        """Тест пакетного получения предложений, включая ненайденный EAN"""
+        feed = client.get("/products/feed?limit=3").json()["data"]["products"]
+        eans = [product["ean"] for product in feed] + [1]
+        location = {"user_lat": 55.7558, "user_long": 37.6173}
+
+        response = client.post("/products/offers:batch", json={"eans": eans, **location})
+        assert response.status_code == 200
+        results = response.json()["data"]["results"]
+        assert [result["ean"] for result in results] == eans
+        assert results[-1]["found"] is False
+
+        for result in results[:-1]:
+            single = client.get(f"/products/{result['ean']}/offers", params=location).json()["data"]
+            assert result["found"] is True
+            assert result["offers"] == single["offers"]
+            assert result["best_offer"] == single["best_offer"]
+
+    def test_get_products_offers_batch_validation(self, client):
+        """Тест пакетного запроса без EAN и без координат"""
+        assert client.post("/products/offers:batch", json={"eans": [], "user_lat": 55.0, "user_long": 37.0}).status_code == 422
+        assert client.post("/products/offers:batch", json={"eans": [1]}).status_code == 422
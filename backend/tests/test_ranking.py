@@ -0,0 +1,72 @@
+import numpy as np
+from ..src.product.ranking import (
+    RankingWeights, OfferCandidates, score_offers, rank_products, top_products, sort_offers
+)
+
+
+def make_candidates(rows):
+    return OfferCandidates.from_rows(rows)
+
+
+class TestRanking:
+    def test_score_normalization(self):
+        """Тест: цена и расстояние нормализуются делением на максимум по набору"""
+        candidates = make_candidates([(1, 10, 100.0, 5, 1, 10.0), (1, 11, 50.0, 5, 1, 20.0)])
+        scores = score_offers(candidates, RankingWeights())
+        assert np.allclose(scores, [0.7 + 0.15, 0.35 + 0.3])
+
+    def test_unknown_distance_is_worst(self):
+        """Тест: предложение без расстояния проигрывает при равной цене"""
+        candidates = make_candidates([
+            (1, 10, 100.0, 5, 1, np.nan), (1, 11, 100.0, 5, 1, 10.0), (1, 12, 100.0, 5, 1, 30.0)
+        ])
+        scores = score_offers(candidates)
+        assert scores[1] < scores[0]
+        assert scores[0] == scores.max()
+
+    def test_stock_and_merchant_weights(self):
+        """Тест: остаток и предпочтение магазина улучшают скор"""
+        candidates = make_candidates([(1, 10, 100.0, 1, 1, np.nan), (1, 11, 100.0, 50, 2, np.nan)])
+        assert score_offers(candidates, RankingWeights(stock=0.5))[1] < score_offers(candidates)[1]
+
+        weights = RankingWeights(merchant=0.5, merchant_scores={1: 1.0})
+        scores = score_offers(candidates, weights)
+        assert scores[0] < scores[1]
+
+    def test_rank_and_top_products(self):
+        """Тест: лучший скор на товар и keyset-страницы по (score, ean)"""
+        candidates = make_candidates([
+            (3, 1, 30.0, 1, 1, np.nan), (1, 2, 10.0, 1, 1, np.nan),
+            (2, 3, 20.0, 1, 1, np.nan), (3, 4, 5.0, 1, 1, np.nan), (4, 5, 20.0, 1, 1, np.nan)
+        ])
+        eans, scores = rank_products(candidates, score_offers(candidates))
+        assert eans.tolist() == [1, 2, 3, 4]
+
+        page, page_scores = top_products(eans, scores, 2)
+        assert page == [3, 1]
+
+        rest, _ = top_products(eans, scores, 10, after=[page_scores[-1], page[-1]])
+        assert rest == [2, 4]
+        assert top_products(eans, scores, 2, offset=2)[0] == [2, 4]
+
+    def test_sort_offers(self):
+        """Тест: сортировка предложений одного товара"""
+        offers = [
+            {"sku_id": 1, "price": 100, "amount": 1, "merchant_id": 1, "distance_km": 1.0},
+            {"sku_id": 2, "price": 90, "amount": 1, "merchant_id": 1, "distance_km": 50.0},
+            {"sku_id": 3, "price": 100, "amount": 1, "merchant_id": 1, "distance_km": None}
+        ]
+        assert [offer["sku_id"] for offer in sort_offers(offers)] == [1, 2, 3]
+        assert sort_offers([]) == []
+
+    def test_feed_best_value_pages(self, client):
+        """Тест: best_value ранжируется по всей выдаче, страницы по cursor не пересекаются"""
+        url = "/products/feed?sort_by=best_value&user_lat=55.7558&user_long=37.6173&limit=5"
+        full = client.get(url.replace("limit=5", "limit=100")).json()["data"]
+        first = client.get(url).json()["data"]
+        assert first["total_count"] == full["total_count"]
+        assert [p["ean"] for p in first["products"]] == [p["ean"] for p in full["products"][:5]]
+
+        if first["next_cursor"]:
+            second = client.get(url + f"&cursor={first['next_cursor']}").json()["data"]
+            assert [p["ean"] for p in second["products"]] == [p["ean"] for p in full["products"][5:10]]
@@ -0,0 +1,31 @@
+import json
+from datetime import datetime
+from ..src.responses import dumps, FastJSONResponse
+from ..src.orders.model import OrderItemData, DeliveryMethod
+
+
+class TestResponses:
+    def test_dumps_dict(self):
+        """Тест: словари с датами, Enum и кириллицей сериализуются как в JSONResponse"""
+        content = {"created_at": datetime(2025, 1, 2, 3, 4, 5), "method": DeliveryMethod.COURIER, "name": "Молоко"}
+        assert dumps(content) == '{"created_at":"2025-01-02T03:04:05","method":"courier","name":"Молоко"}'.encode()
+
+    def test_dumps_model(self):
+        """Тест: модель из model_construct пишется без валидации"""
+        data = OrderItemData.model_construct(item_id=1, order_id=2, sku_id=3, quantity=4)
+        assert json.loads(dumps(data)) == {"item_id": 1, "order_id": 2, "sku_id": 3, "quantity": 4}
+
+    def test_response(self):
+        """Тест: FastJSONResponse отдает готовые байты с типом application/json"""
+        response = FastJSONResponse({"status": "success"}, status_code=201)
+        assert response.body == b'{"status":"success"}'
+        assert response.status_code == 201
+        assert response.media_type == "application/json"
+
+    def test_order_routes_document_response_models(self, client):
+        """Тест: ручки заказов отдают FastJSONResponse, а схема OpenAPI берется из response_model"""
+        paths = client.get("/openapi.json").json()["paths"]
+        schema = paths["/cart"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+        assert schema == {"$ref": "#/components/schemas/CartResponse"}
+        schema = paths["/orders/{order_id}/items"]["post"]["responses"]["201"]["content"]["application/json"]["schema"]
+        assert schema == {"$ref": "#/components/schemas/OrderItemCreateResponse"}
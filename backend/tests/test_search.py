@@ -0,0 +1,50 @@
+import pytest
+from ..src.search.engine import SearchEngine
+from ..src.search.text import analyze, edit_distance
+
+
+@pytest.fixture
+def engine():
+    engine = SearchEngine()
+    engine._built = True  # индекс без базы: документы добавляются инкрементально
+    engine.add_product(1, "Простоквашино Молоко", "Молочные продукты")
+    engine.add_product(2, "Красный Октябрь Шоколад", "Сладости и снеки")
+    engine.add_product(3, "Ёлочка Мёд", "Бакалея")
+    return engine
+
+
+class TestSearchEngine:
+    def test_word_forms(self, engine):
+        """Тест: разные словоформы сводятся к одной основе"""
+        assert analyze("молока") == analyze("Молоко")
+        assert [ean for ean, _ in engine.search("молока")] == [1]
+
+    def test_yo_normalization(self, engine):
+        """Тест: ё и е не различаются"""
+        assert [ean for ean, _ in engine.search("мед елочка")] == [3]
+
+    def test_prefix(self, engine):
+        """Тест: незаконченное слово находит товар"""
+        assert [ean for ean, _ in engine.search("шок")] == [2]
+
+    def test_typo(self, engine):
+        """Тест: опечатка в запросе"""
+        assert [ean for ean, _ in engine.search("шакалад")] == [2]
+
+    def test_all_terms_required(self, engine):
+        """Тест: все слова запроса должны встречаться в товаре"""
+        assert engine.search("молоко шоколад") == []
+
+    def test_incremental_update(self, engine):
+        """Тест: переиндексация и удаление товара"""
+        engine.add_product(1, "Домик в деревне Кефир", "Молочные продукты")
+        assert engine.search("простоквашино") == []
+        assert [ean for ean, _ in engine.search("кефир")] == [1]
+
+        engine.remove_product(1)
+        assert engine.search("кефир") == []
+        assert engine.stats()["documents"] == 2
+
+    def test_edit_distance(self):
+        assert edit_distance("молок", "молко", 2) == 1
+        assert edit_distance("abc", "xyz", 1) == 2
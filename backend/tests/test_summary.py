@@ -0,0 +1,66 @@
+from sqlalchemy import select, func
+from ..src.database.core import SessionLocal
+from ..src.database.models import ProductsStock, ProductOfferSummary
+from ..src.database.repository import ProductRepository
+
+
+def in_stock_summary(session):
+    rows = session.execute(
+        select(
+            ProductsStock.product_ean,
+            func.count(),
+            func.min(ProductsStock.price),
+            func.max(ProductsStock.price)
+        )
+        .where(ProductsStock.amount > 0)
+        .group_by(ProductsStock.product_ean)
+    ).all()
+    return {ean: (count, min_price, max_price) for ean, count, min_price, max_price in rows}
+
+
+def stored_summary(session):
+    return {
+        row.ean: (row.offer_count, row.min_price, row.max_price)
+        for row in session.scalars(select(ProductOfferSummary))
+    }
+
+
+class TestOfferSummary:
+    def test_summary_matches_stock(self, client):
+        """Тест: сводка совпадает с предложениями в наличии"""
+        with SessionLocal() as session:
+            assert stored_summary(session) == in_stock_summary(session)
+
+    def test_update_product_refreshes_summary(self, client):
+        """Тест: изменение цены и остатка пересчитывает сводку товара"""
+        with SessionLocal() as session:
+            offer = session.scalars(select(ProductsStock).where(ProductsStock.amount > 0).limit(1)).one()
+            sku_id, ean, price, amount = offer.sku_id, offer.product_ean, offer.price, offer.amount
+            repository = ProductRepository(session)
+
+            try:
+                repository.update_product(sku_id, {"price": 0.5})
+                summary = session.get(ProductOfferSummary, ean, populate_existing=True)
+                assert summary.min_price == 0.5
+                assert summary.cheapest_sku_id == sku_id
+
+                repository.update_product(sku_id, {"amount": 0})
+                assert stored_summary(session) == in_stock_summary(session)
+            finally:
+                repository.update_product(sku_id, {"price": price, "amount": amount})
+
+            assert stored_summary(session) == in_stock_summary(session)
+
+    def test_feed_reads_summary(self, client):
+        """Тест: лента по сводке и лента по предложениям дают одинаковые товары и цены"""
+        merchants = client.get("/products/merchants").json()["data"]["merchants"]
+        merchant_ids = ",".join(str(merchant["id"]) for merchant in merchants)
+
+        summary_feed = client.get("/products/feed?limit=100").json()["data"]
+        offers_feed = client.get(f"/products/feed?limit=100&merchant_ids={merchant_ids}").json()["data"]
+
+        def prices(feed):
+            return [(p["ean"], p["min_price"], p["max_price"]) for p in feed["products"]]
+
+        assert summary_feed["total_count"] == offers_feed["total_count"]
+        assert prices(summary_feed) == prices(offers_feed)
@@ -58,10 +58,18 @@ export const productsAPI = {
     api.get(`/products/${ean}/offers`, { 
       params: { user_lat: userLat, user_long: userLong } 
     }),
+  getProductsOffers: (eans, userLat, userLong) =>
+    api.post('/products/offers:batch', {
+      eans, user_lat: userLat, user_long: userLong
+    }),
   searchProducts: (query, params = {}) => 
     api.get('/products/search', { 
       params: { q: query, ...params } 
     }),
+  suggest: (query, limit = 10) =>
+    api.get('/products/suggest', {
+      params: { q: query, limit }
+    }),
 };
 
 export const ordersAPI = {
@@ -86,6 +94,17 @@ export const ordersAPI = {
 export const merchantAPI = {
   addProductToStock: (stockId, productData) => 
     api.post(`/merchant/add/product/stock/${stockId}`, productData),
+  updateStockProduct: (stockId, skuId, productData) =>
+    api.put(`/merchant/stock/${stockId}/product/${skuId}`, productData),
+  replaceStockInventory: (stockId, snapshot) => api.put(`/merchant/stocks/${stockId}/inventory`, snapshot),
+  addProductsToCatalog: (products) => api.post('/merchant/bulk/products', products),
+  queueStockUpdates: (changes) => api.post('/merchant/stock/updates', { changes }),
+  syncStock: (version, changes) => api.post('/merchant/sync', { version, changes }),
+  uploadStockFile: (stockId, file, contentType = 'text/csv') =>
+    api.post(`/merchant/jobs/stock/${stockId}`, file, {
+      headers: { 'Content-Type': contentType }
+    }),
+  getIngestJob: (jobId) => api.get(`/merchant/jobs/${jobId}`),
 };
 
 export default api;
\ No newline at end of file